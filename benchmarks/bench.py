@@ -0,0 +1,422 @@
+#!/usr/bin/env python3
+# SPDX-FileCopyrightText: (c) 2021 Artëm IG <github.com/rtmigo>
+# SPDX-License-Identifier: BSD-3-Clause
+
+"""Measuring the latency of the vien commands.
+
+    python -m benchmarks.bench run -o before.json
+    (change the code)
+    python -m benchmarks.bench run -o after.json
+    python -m benchmarks.bench compare before.json after.json
+
+`run` measures vien from this source tree, not the installed one. It works
+offline, in temporary VIENDIR and project dirs. Each command is run as a
+new process, the same way the user runs it:
+
+  path, run true, call noop.py, shell with the input piped to it
+      "cold": the caches of vien (VIENDIR/.cache and the activation
+      manifest of the environment) are removed before each run
+      "warm": the caches are filled by the previous runs
+      "daemon": the vien daemon is running (POSIX)
+
+  create, delete, delete --wait
+      the time of creating and deleting one environment. `delete` only
+      renames the environment and removes the files in the background, so
+      `delete --wait` measures the full removal. The background removal
+      is finished before each `create`
+
+The results are compared with the baselines that do the same work without
+vien: the interpreter running an empty program, the interpreter of the
+environment running noop.py directly, bash reading the same input, and
+`python -m venv` with removing the dir.
+
+`compare` exits with code 1 if a median got slower than the threshold in
+both percents and milliseconds. The percents can be set for each benchmark:
+
+    python -m benchmarks.bench compare a.json b.json --max-slowdown 10 \\
+        --max-slowdown "create=25" --min-delta-ms 2
+"""
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+
+SOURCE_ROOT = Path(__file__).resolve().parent.parent
+
+FORMAT = 1
+
+NOOP = "pass\n"
+SHELL_INPUT = "true\nexit\n"
+
+
+class Result(NamedTuple):
+    name: str
+    samples_ms: List[float]
+    baseline: Optional[str]
+
+    def to_json(self) -> Dict:
+        return {"samples_ms": self.samples_ms,
+                "baseline": self.baseline,
+                **summary(self.samples_ms)}
+
+
+def summary(samples_ms: List[float]) -> Dict[str, float]:
+    return {"min_ms": min(samples_ms),
+            "median_ms": statistics.median(samples_ms),
+            "mean_ms": statistics.mean(samples_ms),
+            "max_ms": max(samples_ms)}
+
+
+def measure(func: Callable[[], None], samples: int,
+            before: Optional[Callable[[], None]] = None) -> List[float]:
+    """Calls `func` the number of times and returns the durations. The
+    `before` is called before each sample, and not counted."""
+    result = []
+    for _ in range(samples):
+        if before is not None:
+            before()
+        started = time.perf_counter()
+        func()
+        result.append((time.perf_counter() - started) * 1000)
+    return result
+
+
+class Bench:
+    """The temporary VIENDIR and project with the environment."""
+
+    def __init__(self, temp: Path):
+        self.vien_dir = temp / "vien"
+        self.project_dir = temp / "benchProject"
+        self.project_dir.mkdir()
+        (self.project_dir / "noop.py").write_text(NOOP)
+        self.env = {**os.environ,
+                    "VIENDIR": str(self.vien_dir),
+                    "PYTHONPATH": str(SOURCE_ROOT),
+                    "VIEN_NO_DAEMON": "1"}
+        for name in ("VIEN_TIMINGS", "VIEN_NO_EXEC"):
+            self.env.pop(name, None)
+
+    @property
+    def venv_dir(self) -> Path:
+        return self.vien_dir / (self.project_dir.name + "_venv")
+
+    @property
+    def venv_python(self) -> Path:
+        bin_dir = self.venv_dir / ("Scripts" if os.name == "nt" else "bin")
+        return bin_dir / ("python.exe" if os.name == "nt" else "python")
+
+    def run(self, args: List[str], input: Optional[str] = None,
+            env: Optional[Dict[str, str]] = None):
+        cp = subprocess.run(args, cwd=str(self.project_dir),
+                            env=env or self.env,
+                            input=input, universal_newlines=True,
+                            stdout=subprocess.DEVNULL,
+                            stderr=subprocess.PIPE)
+        if cp.returncode != 0:
+            raise RuntimeError(f"{args} failed with code {cp.returncode}: "
+                               f"{cp.stderr}")
+
+    def vien(self, args: List[str], input: Optional[str] = None,
+             env: Optional[Dict[str, str]] = None):
+        self.run([sys.executable, "-m", "vien"] + args, input=input, env=env)
+
+    def wait_for_trash(self, timeout: float = 120.0):
+        """Waits until the environments deleted in the background are
+        removed, so they do not slow down the next sample."""
+        trash = self.vien_dir / ".trash"
+        deadline = time.monotonic() + timeout
+        while trash.exists() and any(trash.iterdir()):
+            if time.monotonic() > deadline:
+                raise RuntimeError(f"{trash} is not emptied in {timeout} s")
+            time.sleep(0.05)
+
+    def clear_caches(self):
+        shutil.rmtree(str(self.vien_dir / ".cache"), ignore_errors=True)
+        try:
+            (self.venv_dir / "vien_activation.json").unlink()
+        except FileNotFoundError:
+            pass
+
+
+def selector(only: Optional[List[str]]) -> Callable[[str], bool]:
+    """Returns whether to run the benchmark with the name: with `only`,
+    the name must contain one of the substrings."""
+    return lambda name: not only or any(o in name for o in only)
+
+
+def latency_benchmarks(bench: Bench, samples: int, daemon: bool,
+                       selected: Callable[[str], bool]) -> List[Result]:
+    commands = [
+        ("path", ["path"], None, "python -c pass"),
+        ("call noop.py", ["call", "noop.py"], None, "venv python noop.py"),
+    ]
+    if os.name == "posix":
+        commands.extend([
+            ("run true", ["run", "true"], None, "true"),
+            ("shell", ["shell"], SHELL_INPUT, "bash < input")])
+
+    baselines = [
+        ("python -c pass", [sys.executable, "-c", "pass"], None),
+        ("venv python noop.py", [str(bench.venv_python), "noop.py"], None),
+    ]
+    if os.name == "posix":
+        baselines.extend([
+            ("true", [shutil.which("true") or "/bin/true"], None),
+            ("bash < input", ["/bin/bash"], SHELL_INPUT)])
+
+    results = []
+    for name, args, input in baselines:
+        if not selected(name):
+            continue
+        bench.run(args, input=input)  # warming up the file cache
+        results.append(Result(
+            name,
+            measure(lambda: bench.run(args, input=input), samples),
+            None))
+
+    for name, vien_args, input, baseline in commands:
+        def run_vien():
+            bench.vien(vien_args, input=input)
+
+        if selected(f"{name} cold"):
+            results.append(Result(f"{name} cold",
+                                  measure(run_vien, samples,
+                                          before=bench.clear_caches),
+                                  baseline))
+        if selected(f"{name} warm"):
+            run_vien()
+            results.append(Result(f"{name} warm",
+                                  measure(run_vien, samples), baseline))
+
+    commands = [c for c in commands if selected(f"{c[0]} daemon")]
+    if daemon and commands and os.name == "posix":
+        daemon_env = {**bench.env}
+        del daemon_env["VIEN_NO_DAEMON"]
+        bench.vien(["daemon", "start"], env=daemon_env)
+        try:
+            for name, vien_args, input, baseline in commands:
+                def run_in_daemon():
+                    bench.vien(vien_args, input=input, env=daemon_env)
+
+                run_in_daemon()
+                results.append(Result(f"{name} daemon",
+                                      measure(run_in_daemon, samples),
+                                      baseline))
+        finally:
+            bench.vien(["daemon", "stop"], env=daemon_env)
+    return results
+
+
+def create_delete_benchmarks(bench: Bench, count: int,
+                             selected: Callable[[str], bool]) \
+        -> List[Result]:
+    raw_dir = bench.vien_dir / "raw_venv"
+    results = []
+    if selected("python -m venv"):
+        results.append(Result("python -m venv", measure(
+            lambda: bench.run([sys.executable, "-m", "venv", str(raw_dir)]),
+            count,
+            before=lambda: shutil.rmtree(str(raw_dir), ignore_errors=True)),
+            None))
+    shutil.rmtree(str(raw_dir), ignore_errors=True)
+    if selected("rmtree venv"):
+        results.append(Result("rmtree venv", measure(
+            lambda: shutil.rmtree(str(raw_dir)), count,
+            before=lambda: bench.run([sys.executable, "-m", "venv",
+                                      "--without-pip", str(raw_dir)])),
+            None))
+
+    def delete_before_create():
+        if bench.venv_dir.exists():
+            bench.vien(["delete", "--wait"])
+        bench.wait_for_trash()
+
+    def create_before_delete():
+        bench.wait_for_trash()
+        if not bench.venv_dir.exists():
+            bench.vien(["create", "--shared-pip", sys.executable])
+
+    if selected("create"):
+        results.append(Result("create", measure(
+            lambda: bench.vien(["create", sys.executable]), count,
+            before=delete_before_create), "python -m venv"))
+    for delete_args in (["delete"], ["delete", "--wait"]):
+        name = " ".join(delete_args)
+        if not selected(name):
+            continue
+        results.append(Result(name, measure(
+            lambda args=delete_args: bench.vien(args), count,
+            before=create_before_delete), "rmtree venv"))
+
+    # leaving the environment for the other benchmarks
+    bench.wait_for_trash()
+    if not bench.venv_dir.exists():
+        bench.vien(["create", sys.executable])
+    return results
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "HEAD"], cwd=str(SOURCE_ROOT),
+            stderr=subprocess.DEVNULL, universal_newlines=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_all(samples: int, create_count: int, daemon: bool,
+            only: Optional[List[str]] = None) -> Dict:
+    sys.path.insert(0, str(SOURCE_ROOT))
+    from vien._constants import __version__
+
+    with TemporaryDirectory() as td:
+        bench = Bench(Path(td))
+        bench.vien(["create", sys.executable])
+        selected = selector(only)
+        results = create_delete_benchmarks(bench, create_count, selected) \
+            if create_count > 0 else []
+        results.extend(latency_benchmarks(bench, samples, daemon, selected))
+
+    return {"format": FORMAT,
+            "vien_version": __version__,
+            "commit": git_commit(),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "results": {r.name: r.to_json() for r in results}}
+
+
+def print_results(data: Dict):
+    results = data["results"]
+    width = max(len(name) for name in results)
+    print(f"{'':{width}}  {'median':>9}  {'min':>9}  {'overhead':>9}")
+    for name, r in results.items():
+        base = results.get(r["baseline"] or "")
+        overhead = f"{r['median_ms'] - base['median_ms']:+9.2f}" \
+            if base else ""
+        print(f"{name:{width}}  {r['median_ms']:9.2f}  {r['min_ms']:9.2f}"
+              f"  {overhead:>9}")
+    print("(ms; the overhead is over the baseline without vien)")
+
+
+class Change(NamedTuple):
+    name: str
+    old_ms: float
+    new_ms: float
+    regressed: bool
+
+    @property
+    def percent(self) -> float:
+        return (self.new_ms / self.old_ms - 1) * 100
+
+
+def compare_results(old: Dict, new: Dict,
+                    max_slowdown: Dict[str, float],
+                    default_slowdown: float,
+                    min_delta_ms: float) -> List[Change]:
+    """Compares the medians of the benchmarks present in both results.
+    A benchmark regressed if it is slower by more than its percent and by
+    more than `min_delta_ms`. The percents are taken from `max_slowdown`
+    by the benchmark name, or `default_slowdown`."""
+    result = []
+    for name, new_r in new["results"].items():
+        old_r = old["results"].get(name)
+        if old_r is None:
+            continue
+        old_ms, new_ms = old_r["median_ms"], new_r["median_ms"]
+        limit = max_slowdown.get(name, default_slowdown)
+        regressed = new_ms > old_ms * (1 + limit / 100) \
+            and new_ms - old_ms > min_delta_ms
+        result.append(Change(name, old_ms, new_ms, regressed))
+    return result
+
+
+def parse_slowdowns(values: List[str]) -> Tuple[float, Dict[str, float]]:
+    """Parses the --max-slowdown values like "10" and "create=25"."""
+    default = 10.0
+    per_name: Dict[str, float] = dict()
+    for value in values:
+        name, sep, percent = value.rpartition("=")
+        if sep:
+            per_name[name] = float(percent)
+        else:
+            default = float(percent)
+    return default, per_name
+
+
+def main_compare(old_file: str, new_file: str, slowdowns: List[str],
+                 min_delta_ms: float) -> int:
+    old = json.loads(Path(old_file).read_text(encoding="utf-8"))
+    new = json.loads(Path(new_file).read_text(encoding="utf-8"))
+    default, per_name = parse_slowdowns(slowdowns)
+    changes = compare_results(old, new, per_name, default, min_delta_ms)
+    width = max((len(c.name) for c in changes), default=0)
+    for c in changes:
+        mark = "  REGRESSED" if c.regressed else ""
+        print(f"{c.name:{width}}  {c.old_ms:9.2f} -> {c.new_ms:9.2f} ms "
+              f"{c.percent:+7.1f}%{mark}")
+    regressed = [c.name for c in changes if c.regressed]
+    if regressed:
+        print(f"Regressed: {', '.join(regressed)}", file=sys.stderr)
+        return 1
+    return 0
+
+
+def main(args: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Benchmarks of the vien commands")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    parser_run = subparsers.add_parser("run", help="run the benchmarks")
+    parser_run.add_argument("-o", "--output", default=None,
+                            help="write the results to this JSON file")
+    parser_run.add_argument("-n", "--samples", type=int, default=20,
+                            help="runs of each command (default: 20)")
+    parser_run.add_argument("--create-count", type=int, default=3,
+                            help="environments to create and delete "
+                                 "(default: 3, 0 to skip)")
+    parser_run.add_argument("--no-daemon", action="store_true",
+                            help="do not measure the commands with the "
+                                 "daemon")
+    parser_run.add_argument("--only", action="append", default=None,
+                            help="run only the benchmarks with this "
+                                 "substring in the name")
+
+    parser_compare = subparsers.add_parser(
+        "compare", help="compare two results, exit with 1 on regression")
+    parser_compare.add_argument("old")
+    parser_compare.add_argument("new")
+    parser_compare.add_argument(
+        "--max-slowdown", action="append", default=[],
+        metavar="[NAME=]PERCENT",
+        help="the allowed slowdown of the median in percents, for all the "
+             "benchmarks or for NAME (default: 10)")
+    parser_compare.add_argument(
+        "--min-delta-ms", type=float, default=1.0,
+        help="slowdowns smaller than this are noise (default: 1.0)")
+
+    ns = parser.parse_args(args)
+    if ns.command == "compare":
+        return main_compare(ns.old, ns.new, ns.max_slowdown,
+                            ns.min_delta_ms)
+
+    data = run_all(ns.samples, ns.create_count, daemon=not ns.no_daemon,
+                   only=ns.only)
+    print_results(data)
+    if ns.output:
+        Path(ns.output).write_text(json.dumps(data, indent=2),
+                                   encoding="utf-8")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,81 @@
+# SPDX-FileCopyrightText: (c) 2021 Artëm IG <github.com/rtmigo>
+# SPDX-License-Identifier: BSD-3-Clause
+
+import json
+import os
+import unittest
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+from tests.common import is_posix
+from vien._activation import load_activation, manifest_file, \
+    write_activation
+
+
+@unittest.skipUnless(is_posix, "not POSIX")
+class TestActivation(unittest.TestCase):
+    def setUp(self):
+        self.temp = TemporaryDirectory()
+        self.venv_dir = Path(self.temp.name) / "project_venv"
+        (self.venv_dir / "bin").mkdir(parents=True)
+        (self.venv_dir / "bin" / "python3").write_text("")
+        (self.venv_dir / "lib" / "python3.11" / "site-packages").mkdir(
+            parents=True)
+        (self.venv_dir / "pyvenv.cfg").write_text(
+            "home = /usr/bin\nversion = 3.11.7\n")
+
+    def tearDown(self):
+        self.temp.cleanup()
+
+    def test_write_and_load(self):
+        written = write_activation(self.venv_dir)
+        self.assertEqual(written.python, self.venv_dir / "bin" / "python3")
+        self.assertEqual(written.bin_dir, self.venv_dir / "bin")
+        self.assertEqual(written.virtual_env, str(self.venv_dir))
+        self.assertEqual(written.base_version, "3.11.7")
+        self.assertEqual(written.module_roots,
+                         [self.venv_dir / "lib" / "python3.11"
+                          / "site-packages"])
+        self.assertEqual(load_activation(self.venv_dir), written)
+
+    def test_loaded_from_file(self):
+        write_activation(self.venv_dir)
+        file = manifest_file(self.venv_dir)
+        data = json.loads(file.read_text())
+        data["base_version"] = "from the file"
+        file.write_text(json.dumps(data))
+        self.assertEqual(load_activation(self.venv_dir).base_version,
+                         "from the file")
+
+    def test_missing_manifest_is_rebuilt(self):
+        self.assertFalse(manifest_file(self.venv_dir).exists())
+        self.assertEqual(load_activation(self.venv_dir).base_version,
+                         "3.11.7")
+        self.assertTrue(manifest_file(self.venv_dir).exists())
+
+    def test_stale_manifest_is_rebuilt(self):
+        write_activation(self.venv_dir)
+        # the interpreter changed, as if the environment was recreated
+        (self.venv_dir / "bin" / "python").write_text("")
+        cfg = self.venv_dir / "pyvenv.cfg"
+        cfg.write_text("home = /usr/bin\nversion = 3.12.1\n")
+        st = cfg.stat()
+        os.utime(str(cfg), ns=(st.st_atime_ns, st.st_mtime_ns + 10 ** 9))
+        activation = load_activation(self.venv_dir)
+        self.assertEqual(activation.base_version, "3.12.1")
+        self.assertEqual(activation.python, self.venv_dir / "bin" / "python")
+
+    def test_moved_environment(self):
+        write_activation(self.venv_dir)
+        moved = self.venv_dir.with_name("other_venv")
+        self.venv_dir.rename(moved)
+        self.assertEqual(load_activation(moved).python,
+                         moved / "bin" / "python3")
+
+    def test_no_environment(self):
+        self.assertIsNone(
+            load_activation(Path(self.temp.name) / "missing_venv"))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,163 @@
+# SPDX-FileCopyrightText: (c) 2021 Artëm IG <github.com/rtmigo>
+# SPDX-License-Identifier: BSD-3-Clause
+
+import asyncio
+import os
+import sys
+import threading
+import unittest
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest import mock
+
+from vien.api import Env, VienError
+
+
+class TestEnv(unittest.TestCase):
+    # one environment is created for all the tests
+
+    @classmethod
+    def setUpClass(cls):
+        cls.temp = TemporaryDirectory()
+        cls.old_vien_dir = os.environ.get("VIENDIR")
+        os.environ["VIENDIR"] = os.path.join(cls.temp.name, "vien")
+        cls.project_dir = Path(cls.temp.name) / "apiProject"
+        (cls.project_dir / "pkg").mkdir(parents=True)
+        (cls.project_dir / "pkg" / "__init__.py").write_text("")
+        (cls.project_dir / "pkg" / "main.py").write_text(
+            "import sys\n"
+            "print(sys.prefix, __name__, sys.argv[1:])\n"
+            "sys.exit(int(sys.argv[1]) if len(sys.argv) > 1 else 0)\n")
+        cls.env = Env(cls.project_dir).create(sys.executable)
+
+    @classmethod
+    def tearDownClass(cls):
+        if cls.old_vien_dir is None:
+            del os.environ["VIENDIR"]
+        else:
+            os.environ["VIENDIR"] = cls.old_vien_dir
+        cls.temp.cleanup()
+
+    def test_paths(self):
+        self.assertTrue(self.env.exists())
+        self.assertEqual(self.env.path,
+                         Path(os.environ["VIENDIR"]) / "apiProject_venv")
+        self.assertTrue(self.env.python.exists())
+        self.assertTrue(str(self.env.python).startswith(str(self.env.path)))
+        self.assertTrue((self.env.path / "vien_activation.json").exists())
+
+    def test_create_existing(self):
+        with self.assertRaises(VienError) as cm:
+            Env(self.project_dir).create(sys.executable)
+        self.assertIn("already exists", str(cm.exception))
+
+    def test_missing(self):
+        env = Env(Path(self.temp.name) / "noSuchProject")
+        self.assertFalse(env.exists())
+        with self.assertRaises(VienError):
+            _ = env.python
+        with self.assertRaises(VienError):
+            env.run(["python", "--version"])
+        with self.assertRaises(VienError):
+            env.delete()
+
+    def test_run(self):
+        result = self.env.run(
+            ["python", "-c", "import os; print(os.environ['VIRTUAL_ENV'])"],
+            capture_output=True)
+        self.assertEqual(result.returncode, 0)
+        self.assertEqual(result.stdout.decode().strip(), str(self.env.path))
+
+    def test_run_in_thread(self):
+        # Python 3.7 runs the subprocesses of asyncio only in the main
+        # thread
+        results = []
+        thread = threading.Thread(target=lambda: results.append(
+            self.env.run(["python", "-c", "print(42)"],
+                         capture_output=True)))
+        thread.start()
+        thread.join()
+        self.assertEqual(len(results), 1)
+        self.assertEqual(results[0].stdout.strip(), b"42")
+
+    def test_run_command_not_found(self):
+        with self.assertRaises(VienError):
+            self.env.run(["no_such_command_really"])
+
+    def test_call(self):
+        result = self.env.call(self.project_dir / "pkg" / "main.py", ["3"],
+                               capture_output=True)
+        self.assertEqual(result.returncode, 3)
+        self.assertIn("__main__ ['3']", result.stdout.decode())
+
+    def test_call_module(self):
+        result = self.env.call(self.project_dir / "pkg" / "main.py",
+                               module=True, capture_output=True,
+                               env={"PYTHONDONTWRITEBYTECODE": "1"})
+        self.assertEqual(result.returncode, 0)
+        prefix, name, _ = result.stdout.decode().split(" ", 2)
+        self.assertEqual(os.path.realpath(prefix),
+                         os.path.realpath(str(self.env.path)))
+        self.assertEqual(name, "__main__")
+
+    def test_async(self):
+        async def query():
+            envs = [Env(self.project_dir) for _ in range(20)]
+            exist = await asyncio.gather(*(e.exists_async() for e in envs))
+            results = await asyncio.gather(*(
+                e.call_async(self.project_dir / "pkg" / "main.py", [str(i)],
+                             capture_output=True)
+                for i, e in enumerate(envs[:3])))
+            return exist, [r.returncode for r in results]
+
+        exist, codes = asyncio.run(query())
+        self.assertEqual(exist, [True] * 20)
+        self.assertEqual(codes, [0, 1, 2])
+
+    def test_async_activation_in_thread(self):
+        # the lock of the environment may wait, that must not block the loop
+        threads = []
+        activation = Env._activation
+
+        def recording(env):
+            threads.append(threading.current_thread())
+            return activation(env)
+
+        with mock.patch.object(Env, "_activation", recording):
+            asyncio.run(self.env.run_async(["python", "-c", "pass"]))
+            asyncio.run(self.env.call_async(
+                self.project_dir / "pkg" / "main.py"))
+        self.assertEqual(len(threads), 2)
+        self.assertNotIn(threading.main_thread(), threads)
+
+    def test_wrapped_metadata(self):
+        self.assertEqual(Env.create.__name__, "create")
+        self.assertIn("Creates the environment", Env.create.__doc__)
+        self.assertTrue(hasattr(Env.create, "__wrapped__"))
+
+    def test_async_error(self):
+        env = Env(Path(self.temp.name) / "noSuchProject")
+        with self.assertRaises(VienError):
+            asyncio.run(env.run_async(["python"]))
+
+
+class TestCreateDelete(unittest.TestCase):
+    def test_create_delete(self):
+        with TemporaryDirectory() as td:
+            old = os.environ.get("VIENDIR")
+            os.environ["VIENDIR"] = os.path.join(td, "vien")
+            try:
+                env = Env(Path(td) / "deleteMe")
+                asyncio.run(env.create_async(sys.executable))
+                self.assertTrue(env.exists())
+                env.delete()
+                self.assertFalse(env.exists())
+            finally:
+                if old is None:
+                    del os.environ["VIENDIR"]
+                else:
+                    os.environ["VIENDIR"] = old
+
+
+if __name__ == '__main__':
+    unittest.main()
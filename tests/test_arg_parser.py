@@ -1,15 +1,19 @@
 # SPDX-FileCopyrightText: (c) 2021 Artëm IG <github.com/rtmigo>
 # SPDX-License-Identifier: BSD-3-Clause
 
+import os
 import unittest
 from pathlib import Path
+from tempfile import TemporaryDirectory
 from typing import List
 
 from vien._common import is_windows
+from vien._exceptions import MultipleProjectsExit
 
 from tests.common import is_posix
 from vien._main import get_project_dir
-from vien._parsed_args import ParsedArgs, Commands, _iter_after
+from vien._parsed_args import ParsedArgs, Commands, _iter_after, \
+    _fast_namespace
 
 
 def windows_too(args: List[str]) -> List[str]:
@@ -77,6 +81,35 @@ class TestProjectDir(unittest.TestCase):
         pd = ParsedArgs('-p a/b/c call -p d/e/f myfile.py'.split())
         self.assertEqual(pd.project_dir_arg, 'd/e/f')
 
+    def test_single(self):
+        pd = ParsedArgs('-p a/b/c run ls'.split())
+        self.assertFalse(pd.multiple_projects)
+
+    def test_repeated(self):
+        pd = ParsedArgs('-p a -p b run ls'.split())
+        self.assertEqual(pd.project_dir_args, ['a', 'b'])
+        self.assertTrue(pd.multiple_projects)
+        with self.assertRaises(MultipleProjectsExit):
+            _ = pd.project_dir_arg
+
+    def test_glob_and_list(self):
+        self.assertTrue(ParsedArgs(['-p', 'services/*', 'run', 'ls'])
+                        .multiple_projects)
+        self.assertTrue(ParsedArgs(['-p', '@projects.txt', 'run', 'ls'])
+                        .multiple_projects)
+
+    def test_existing_dir_like_pattern(self):
+        with TemporaryDirectory() as td:
+            (Path(td) / "odd[1]").mkdir()
+            pattern = os.path.join(td, "odd[1]")
+            self.assertFalse(ParsedArgs(['-p', pattern, 'path'])
+                             .multiple_projects)
+            self.assertFalse(ParsedArgs(['-p', pattern, 'run', 'ls'])
+                             .multiple_projects)
+            # no such dir, so it is a pattern
+            self.assertTrue(ParsedArgs(['-p', pattern + "x", 'run', 'ls'])
+                            .multiple_projects)
+
 
 class TestParseCall(unittest.TestCase):
 
@@ -100,6 +133,29 @@ class TestParseCall(unittest.TestCase):
         self.assertEqual(pd.call.filename, "myfile.py")
         self.assertEqual(pd.call.before_filename, "-m")
 
+    def test_warm(self):
+        pd = ParsedArgs('call --warm -m myfile.py --warm'.split())
+        self.assertTrue(pd.call_warm)
+        self.assertEqual(pd.args_to_python, ['-m', 'myfile.py', '--warm'])
+        self.assertEqual(pd.call.filename, "myfile.py")
+
+    def test_not_warm(self):
+        pd = ParsedArgs('call myfile.py --warm'.split())
+        self.assertFalse(pd.call_warm)
+        self.assertEqual(pd.args_to_python, ['myfile.py', '--warm'])
+
+    def test_warm_after_p(self):
+        pd = ParsedArgs('-p --warm call --warm myfile.py'.split())
+        self.assertTrue(pd.call_warm)
+        self.assertEqual(pd.project_dir_arg, '--warm')
+        self.assertEqual(pd.args_to_python, ['myfile.py'])
+
+    def test_call_in_other_command(self):
+        # 'call --warm' is a part of the command to run
+        pd = ParsedArgs('run echo call --warm x'.split())
+        self.assertEqual(pd.call_options, [])
+        self.assertEqual(pd.run_args, ['echo', 'call', '--warm', 'x'])
+
 
 class TestParseShell(unittest.TestCase):
     def test_no_args(self):
@@ -127,6 +183,13 @@ class TestParseRun(unittest.TestCase):
         pd = ParsedArgs(windows_too(['run', 'python3', '-OO', 'file.py']))
         self.assertEqual(pd.command, Commands.run)
         self.assertEqual(pd.run_args, ['python3', '-OO', 'file.py'])
+        self.assertEqual(pd.run_source_activate, False)
+
+    def test_source_activate(self):
+        pd = ParsedArgs(windows_too(['run', '--source-activate',
+                                     'python3', '--source-activate']))
+        self.assertEqual(pd.run_args, ['python3', '--source-activate'])
+        self.assertEqual(pd.run_source_activate, True)
 
 
 class TestParseCreate(unittest.TestCase):
@@ -153,5 +216,68 @@ class TestParseRecreate(unittest.TestCase):
         self.assertEqual(pd.python_executable, None)
 
 
+class TestFastNamespace(unittest.TestCase):
+    """The fast dispatcher must give the same results as the ArgumentParser,
+    or refuse to parse the arguments."""
+
+    def assertSameAsArgparse(self, args: List[str]):
+        fast = ParsedArgs(args)
+        self.assertIsNotNone(_fast_namespace(args))
+
+        slow = ParsedArgs.__new__(ParsedArgs)
+        slow._parse_with_argparse(args)
+        slow.command = Commands(slow._ns.command)
+        self.assertEqual(vars(fast._ns),
+                         {k: v for k, v in vars(slow._ns).items()
+                          if k in vars(fast._ns)})
+        self.assertEqual(fast.command.value, slow._ns.command)
+        if fast.command == Commands.call:
+            self.assertEqual(fast.args_to_python, slow.args_to_python)
+            self.assertEqual(fast.call.filename, slow.call.filename)
+            self.assertEqual(fast.call.filename_idx, slow.call.filename_idx)
+
+    def test_path(self):
+        self.assertSameAsArgparse(['path'])
+        self.assertSameAsArgparse(['-p', 'a/b', 'path'])
+        self.assertSameAsArgparse(['--project-dir=a/b', 'path'])
+
+    def test_call(self):
+        self.assertSameAsArgparse(['call', 'file.py'])
+        self.assertSameAsArgparse(['-p', '..', 'call', '-m', 'file.py', '-h'])
+        self.assertSameAsArgparse(['--project-dir', '..', 'call', '-B', '-OO',
+                                   '-m', 'file.py', 'arg1', '--arg2'])
+
+    @unittest.skipUnless(is_posix, "posix-only")
+    def test_run(self):
+        self.assertSameAsArgparse(['run', 'python3', '--version'])
+        self.assertSameAsArgparse(['-p', 'a/b', 'run', '--source-activate',
+                                   'ls', '-la'])
+
+    def test_pip(self):
+        self.assertSameAsArgparse(['pip', 'install', 'requests'])
+        self.assertSameAsArgparse(['-p', 'a/b', 'pip', 'list'])
+        # argparse cannot parse this one, but the fast dispatcher can
+        self.assertEqual(ParsedArgs(['pip', '--version']).pip_args,
+                         ['--version'])
+
+    def test_refused(self):
+        for args in [[],
+                     ['-h'],
+                     ['-p'],
+                     ['-p', 'a/b'],
+                     ['path', 'extra'],
+                     ['create'],
+                     ['shell'],
+                     ['run'],
+                     ['run', '-h'],
+                     ['call', '-h', 'file.py'],
+                     ['call', '--help', 'file.py'],
+                     ['call', '-p', '..', 'file.py'],
+                     ['call', '--project-dir=..', 'file.py'],
+                     ['-labuda', 'call', 'file.py'],
+                     [ParsedArgs.PARAM_WINDOWS_ALL_ARGS, 'path']]:
+            self.assertIsNone(_fast_namespace(args), args)
+
+
 if __name__ == "__main__":
     unittest.main()
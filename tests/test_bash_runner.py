@@ -2,8 +2,13 @@
 # SPDX-License-Identifier: BSD-3-Clause
 
 
+import asyncio
+import gc
+import logging
+import time
 import unittest
 from pathlib import Path
+from subprocess import TimeoutExpired
 from tempfile import TemporaryDirectory
 from timeit import default_timer as timer
 
@@ -57,3 +62,88 @@ class TestRunAsBash(unittest.TestCase):
         end = timer()
         self.assertGreater(end - start, 0.9)
         self.assertLess(end - start, 5)
+
+
+def _is_running(pid: int) -> bool:
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            # a zombie is not running
+            return f.read().split()[2] != "Z"
+    except FileNotFoundError:
+        return False
+
+
+def _stops(pid: int, seconds: float = 1) -> bool:
+    # a killed process may still be exiting when its pipes are closed
+    deadline = timer() + seconds
+    while _is_running(pid):
+        if timer() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+@unittest.skipUnless(is_posix, "not POSIX")
+class TestRunAsync(unittest.TestCase):
+
+    def test_output_is_streamed(self):
+        start = timer()
+        times = []
+        cp = run_as_bash_script("echo first; sleep 1; echo second",
+                                on_stdout=lambda data: times.append(
+                                    (timer() - start, data)))
+        self.assertEqual(cp.returncode, 0)
+        self.assertEqual(b"".join(data for _, data in times),
+                         b"first\nsecond\n")
+        # the first line was received before the process exited
+        self.assertLess(times[0][0], 0.9)
+
+    def test_input_as_stream(self):
+        cp = run_with_input(["cat"], input=iter([b"a\n", b"b\n"]),
+                            capture_output=True)
+        self.assertEqual(cp.stdout, b"a\nb\n")
+
+    def test_stderr_captured(self):
+        cp = run_as_bash_script("echo out; echo err >&2; exit 3",
+                                capture_output=True)
+        self.assertEqual((cp.returncode, cp.stdout, cp.stderr),
+                         (3, b"out\n", b"err\n"))
+
+    @unittest.skipUnless(Path("/proc").exists(), "no /proc")
+    def test_timeout_kills_process_group(self):
+        # with a callback the process is run by the event loop
+        for kwargs in [dict(), dict(on_start=lambda: None)]:
+            with self.subTest(kwargs=kwargs):
+                with self.assertRaises(TimeoutExpired) as ce:
+                    run_as_bash_script("sleep 30 & echo $!; wait",
+                                       capture_output=True, timeout=1,
+                                       **kwargs)
+                grandchild = int(ce.exception.output)
+                self.assertTrue(_stops(grandchild))
+
+    def test_timeout_retrieves_errors(self):
+        # Python 3.7 and 3.8 logged that the exception of the cancelled
+        # gather was never retrieved
+        records = []
+        handler = logging.Handler()
+        handler.emit = records.append  # type: ignore
+        logger = logging.getLogger("asyncio")
+        logger.addHandler(handler)
+        try:
+            with self.assertRaises(TimeoutExpired):
+                run_loop(run_async(["sleep", "5"], capture_output=True,
+                                   timeout=0.3))
+            gc.collect()
+        finally:
+            logger.removeHandler(handler)
+        self.assertEqual([r.getMessage() for r in records], [])
+
+    def test_concurrent(self):
+        async def run_all():
+            return await asyncio.gather(
+                *[run_async(["sleep", "0.5"]) for _ in range(5)])
+
+        start = timer()
+        results = run_loop(run_all())
+        self.assertLess(timer() - start, 2)
+        self.assertEqual([r.returncode for r in results], [0] * 5)
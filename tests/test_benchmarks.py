@@ -0,0 +1,59 @@
+# SPDX-FileCopyrightText: (c) 2021 Artëm IG <github.com/rtmigo>
+# SPDX-License-Identifier: BSD-3-Clause
+
+import json
+import unittest
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from typing import Dict
+
+from benchmarks.bench import compare_results, main, parse_slowdowns, \
+    selector
+
+
+def results(**medians: float) -> Dict:
+    return {"results": {name.replace("_", " "): {"median_ms": ms}
+                        for name, ms in medians.items()}}
+
+
+class TestCompare(unittest.TestCase):
+    def test_thresholds(self):
+        old = results(path_warm=50.0, create=1000.0, removed=1.0)
+        new = results(path_warm=60.0, create=1200.0, added=1.0)
+        changes = compare_results(old, new, {"create": 25.0},
+                                  default_slowdown=10.0, min_delta_ms=1.0)
+        self.assertEqual([(c.name, c.regressed) for c in changes],
+                         [("path warm", True), ("create", False)])
+        self.assertAlmostEqual(changes[0].percent, 20.0)
+
+    def test_min_delta(self):
+        # +50% of a tiny number is noise
+        changes = compare_results(results(path=2.0), results(path=3.0), {},
+                                  default_slowdown=10.0, min_delta_ms=1.5)
+        self.assertFalse(changes[0].regressed)
+
+    def test_parse_slowdowns(self):
+        self.assertEqual(parse_slowdowns([]), (10.0, {}))
+        self.assertEqual(parse_slowdowns(["5", "call noop.py cold=30"]),
+                         (5.0, {"call noop.py cold": 30.0}))
+
+    def test_selector(self):
+        self.assertTrue(selector(None)("path cold"))
+        selected = selector(["delete", "warm"])
+        self.assertEqual([n for n in ["create", "delete", "delete --wait",
+                                      "path cold", "path warm"]
+                          if selected(n)],
+                         ["delete", "delete --wait", "path warm"])
+
+    def test_exit_code(self):
+        with TemporaryDirectory() as td:
+            old, new = Path(td) / "old.json", Path(td) / "new.json"
+            old.write_text(json.dumps(results(path=50.0)))
+            new.write_text(json.dumps(results(path=60.0)))
+            self.assertEqual(main(["compare", str(old), str(new)]), 1)
+            self.assertEqual(main(["compare", str(old), str(new),
+                                   "--max-slowdown", "path=25"]), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
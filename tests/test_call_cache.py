@@ -0,0 +1,82 @@
+# SPDX-FileCopyrightText: (c) 2021 Artëm IG <github.com/rtmigo>
+# SPDX-License-Identifier: BSD-3-Clause
+
+import os
+import unittest
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+from vien._call_cache import CallCache, ResolvedCall
+
+
+class TestCallCache(unittest.TestCase):
+    def setUp(self):
+        self._td = TemporaryDirectory()
+        temp = Path(self._td.name)
+        self.cache_file = temp / "cache" / "call.json"
+        self.script = temp / "project" / "pkg" / "main.py"
+        self.script.parent.mkdir(parents=True)
+        self.script.touch()
+        self.python_exe = temp / "project_venv" / "bin" / "python"
+        self.python_exe.parent.mkdir(parents=True)
+        self.python_exe.touch()
+        self.resolved = ResolvedCall(project_dir=temp / "project",
+                                     venv_dir=temp / "project_venv",
+                                     python_exe=self.python_exe,
+                                     module_name="pkg.main")
+        self.key = CallCache.key(str(self.script), "..", temp)
+
+    def tearDown(self):
+        self._td.cleanup()
+
+    def test_miss(self):
+        self.assertIsNone(CallCache(self.cache_file).get(self.key))
+
+    def test_hit_from_other_instance(self):
+        CallCache(self.cache_file).put(self.key, self.resolved)
+        self.assertEqual(CallCache(self.cache_file).get(self.key),
+                         self.resolved)
+
+    def test_key_depends_on_args(self):
+        temp = Path(self._td.name)
+        keys = {CallCache.key(str(self.script), "..", temp),
+                CallCache.key(str(self.script), "../..", temp),
+                CallCache.key(str(self.script), None, temp),
+                CallCache.key(str(self.script), "..", temp / "other"),
+                CallCache.key(str(self.script), "..", temp, module=True)}
+        self.assertEqual(len(keys), 5)
+
+    def test_relative_script_path(self):
+        old_cwd = os.getcwd()
+        os.chdir(str(self.script.parent))
+        try:
+            self.assertEqual(CallCache.key("main.py", "..", Path("/x")),
+                             CallCache.key(str(self.script), "..",
+                                           Path("/x")))
+        finally:
+            os.chdir(old_cwd)
+
+    def test_invalid_when_script_removed(self):
+        CallCache(self.cache_file).put(self.key, self.resolved)
+        self.script.unlink()
+        self.assertIsNone(CallCache(self.cache_file).get(self.key))
+
+    def test_invalid_when_interpreter_replaced(self):
+        CallCache(self.cache_file).put(self.key, self.resolved)
+        self.python_exe.unlink()
+        self.assertIsNone(CallCache(self.cache_file).get(self.key))
+        self.python_exe.touch()
+        self.assertIsNone(CallCache(self.cache_file).get(self.key))
+
+    def test_size_limited(self):
+        cache = CallCache(self.cache_file)
+        cache.MAX_ENTRIES = 5
+        for i in range(10):
+            cache.put(f"{self.key}{i}", self.resolved)
+        entries = CallCache(self.cache_file).entries
+        self.assertEqual(len(entries), 5)
+        self.assertIn(f"{self.key}9", entries)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -3,7 +3,7 @@
 
 import unittest
 
-from vien._parsed_call import ParsedCall
+from vien._parsed_call import ParsedCall, parse_call_sequence, CallTarget
 
 from vien._exceptions import PyFileArgNotFoundExit
 
@@ -31,5 +31,24 @@ class TestNew(unittest.TestCase):
         self.assertEqual(psr.before_filename, None)
 
 
+class TestSequence(unittest.TestCase):
+
+    def test_sequence(self):
+        targets = parse_call_sequence(
+            "a.py x y -- -m pkg/b.py -- c.py -m".split())
+        self.assertEqual(targets,
+                         [CallTarget("a.py", False, ["x", "y"]),
+                          CallTarget("pkg/b.py", True, []),
+                          CallTarget("c.py", False, ["-m"])])
+
+    def test_not_a_file(self):
+        with self.assertRaises(PyFileArgNotFoundExit):
+            parse_call_sequence("a.py -- -B b.py".split())
+
+    def test_empty_segment(self):
+        with self.assertRaises(PyFileArgNotFoundExit):
+            parse_call_sequence("a.py --".split())
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,100 @@
+# SPDX-FileCopyrightText: (c) 2021 Artëm IG <github.com/rtmigo>
+# SPDX-License-Identifier: BSD-3-Clause
+
+import os
+import subprocess
+import sys
+import unittest
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+from tests.common import is_posix
+from vien._clone import clone_tree, relocate_venv, clone_from_template, \
+    interpreter_key
+
+
+class TestRelocate(unittest.TestCase):
+    def test_paths_and_prompt_replaced(self):
+        with TemporaryDirectory() as td:
+            old_dir = Path(td) / "old_venv"
+            new_dir = Path(td) / "new_venv"
+            (new_dir / "bin").mkdir(parents=True)
+            (new_dir / "pyvenv.cfg").write_text(f"home = /usr/bin\n")
+            activate = new_dir / "bin" / "activate"
+            activate.write_text(f'VIRTUAL_ENV="{old_dir}"\n'
+                                f'PS1="(old_venv) ${{PS1:-}}"\n')
+            pip = new_dir / "bin" / "pip"
+            pip.write_text(f"#!{old_dir}/bin/python\n")
+            os.chmod(str(pip), 0o755)
+            inode = pip.stat().st_ino
+
+            relocate_venv(new_dir, old_dir=old_dir)
+
+            self.assertEqual(activate.read_text(),
+                             f'VIRTUAL_ENV="{new_dir}"\n'
+                             f'PS1="(new_venv) ${{PS1:-}}"\n')
+            self.assertEqual(pip.read_text(), f"#!{new_dir}/bin/python\n")
+            # the file is replaced, not modified in place
+            self.assertNotEqual(pip.stat().st_ino, inode)
+            self.assertTrue(os.access(str(pip), os.X_OK))
+            self.assertEqual((new_dir / "pyvenv.cfg").read_text(),
+                             "home = /usr/bin\n")
+
+
+class TestCloneTree(unittest.TestCase):
+    @unittest.skipUnless(is_posix, "symlinks")
+    def test_clone_tree(self):
+        with TemporaryDirectory() as td:
+            src = Path(td) / "src"
+            package = src / "lib" / "site-packages" / "pkg"
+            package.mkdir(parents=True)
+            (package / "__init__.py").write_text("x = 1")
+            (src / "bin").mkdir()
+            (src / "bin" / "tool").write_text("tool")
+            os.symlink("lib", str(src / "lib64"))
+
+            dst = Path(td) / "dst"
+            clone_tree(src, dst)
+
+            self.assertEqual(
+                (dst / "lib" / "site-packages" / "pkg" / "__init__.py")
+                    .read_text(), "x = 1")
+            self.assertEqual((dst / "bin" / "tool").read_text(), "tool")
+            self.assertTrue((dst / "lib64").is_symlink())
+            self.assertEqual(os.readlink(str(dst / "lib64")), "lib")
+
+
+class TestCloneFromTemplate(unittest.TestCase):
+    def test_clone_works_in_new_location(self):
+        with TemporaryDirectory() as td:
+            templates = Path(td) / "templates"
+            venv_dir = Path(td) / "project_venv"
+
+            self.assertTrue(
+                clone_from_template(sys.executable, templates, venv_dir))
+            self.assertTrue(
+                (templates / interpreter_key(sys.executable)).exists())
+
+            bin_dir = venv_dir / ("bin" if is_posix else "Scripts")
+            python = bin_dir / ("python" if is_posix else "python.exe")
+            prefix = subprocess.check_output(
+                [str(python), "-c", "import sys; print(sys.prefix)"],
+                universal_newlines=True).strip()
+            self.assertEqual(os.path.realpath(prefix),
+                             os.path.realpath(str(venv_dir)))
+
+            self.assertIn(str(venv_dir), (bin_dir / "activate").read_text()
+                          if is_posix else
+                          (bin_dir / "activate.bat").read_text())
+            self.assertNotIn(str(templates),
+                             (venv_dir / "pyvenv.cfg").read_text())
+
+            # the second clone uses the same template
+            other_dir = Path(td) / "other_venv"
+            self.assertTrue(
+                clone_from_template(sys.executable, templates, other_dir))
+            self.assertEqual(len(os.listdir(str(templates))), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,126 @@
+# SPDX-FileCopyrightText: (c) 2021 Artëm IG <github.com/rtmigo>
+# SPDX-License-Identifier: BSD-3-Clause
+
+import os
+import socket
+import stat
+import subprocess
+import sys
+import unittest
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from typing import List
+from unittest import mock
+
+from tests.common import is_posix
+from vien._client import daemon_socket_path
+from vien._main import main_entry_point
+from vien._warm_server import peer_uid
+
+
+@unittest.skipUnless(is_posix, "not POSIX")
+class TestDaemon(unittest.TestCase):
+    def setUp(self):
+        self._td = TemporaryDirectory()
+        temp = Path(self._td.name)
+        self.vien_dir = temp / "vd"
+        self.project_dir = temp / "project"
+        self.project_dir.mkdir()
+        self.venv_dir = self.vien_dir / "project_venv"
+        patcher = mock.patch.dict(os.environ, {
+            "VIENDIR": str(self.vien_dir),
+            "VIEN_DAEMON_IDLE": "30"})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self._old_cwd = os.getcwd()
+        os.chdir(str(self.project_dir))
+
+    def tearDown(self):
+        main_entry_point(["daemon", "stop"])
+        os.chdir(self._old_cwd)
+        self._td.cleanup()
+
+    def vien(self, *args: str, python: str = sys.executable) \
+            -> subprocess.CompletedProcess:
+        env = {**os.environ,
+               "PYTHONPATH": str(Path(__file__).parent.parent)}
+        return subprocess.run(
+            [python, "-X", "importtime", "-m", "vien"] + list(args),
+            env=env, cwd=str(self.project_dir),
+            stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+            universal_newlines=True)
+
+    def test_served_by_daemon(self):
+        main_entry_point(["create"])
+        main_entry_point(["daemon", "start"])
+
+        cp = self.vien("path")
+        self.assertEqual(cp.returncode, 0, cp.stderr)
+        self.assertEqual(cp.stdout.strip(), str(self.venv_dir))
+        # the client did not import the command line machinery, nor the
+        # modules that take longer to import than the daemon takes to run
+        # the command
+        imported = imported_modules(cp.stderr)
+        for name in ["vien._main", "typing", "pathlib", "socket", "signal"]:
+            self.assertNotIn(name, imported)
+
+        # the program is run by the client itself
+        cp = self.vien("run", "sh", "-c", "echo $VIRTUAL_ENV; exit 3")
+        self.assertEqual(cp.returncode, 3, cp.stderr)
+        self.assertEqual(cp.stdout.strip(), str(self.venv_dir))
+
+        cp = self.vien("run", "command_that_does_not_exist")
+        self.assertEqual(cp.returncode, 1)
+        self.assertIn("command_that_does_not_exist", cp.stderr)
+
+    def test_fallback_without_daemon(self):
+        main_entry_point(["daemon", "start"])
+        main_entry_point(["daemon", "stop"])
+        cp = self.vien("path")
+        self.assertEqual(cp.returncode, 0, cp.stderr)
+        self.assertEqual(cp.stdout.strip(), str(self.venv_dir))
+        self.assertIn("vien._main", imported_modules(cp.stderr))
+
+    def test_fallback_with_stale_socket(self):
+        path = Path(daemon_socket_path(str(self.vien_dir)))
+        path.parent.mkdir(parents=True)
+        path.write_text("")
+        cp = self.vien("path")
+        self.assertEqual(cp.returncode, 0, cp.stderr)
+        self.assertEqual(cp.stdout.strip(), str(self.venv_dir))
+
+    def test_fallback_with_other_interpreter(self):
+        main_entry_point(["daemon", "start"])
+        # the same interpreter, but sys.executable is another path
+        other_python = Path(self._td.name) / "python3"
+        other_python.symlink_to(sys.executable)
+        cp = self.vien("path", python=str(other_python))
+        self.assertEqual(cp.returncode, 0, cp.stderr)
+        self.assertEqual(cp.stdout.strip(), str(self.venv_dir))
+        self.assertIn("vien._main", imported_modules(cp.stderr))
+        # the daemon still serves its own interpreter
+        cp = self.vien("path")
+        self.assertEqual(cp.returncode, 0, cp.stderr)
+        self.assertNotIn("vien._main", imported_modules(cp.stderr))
+
+    def test_private_socket(self):
+        main_entry_point(["daemon", "start"])
+        path = Path(daemon_socket_path(str(self.vien_dir)))
+        self.assertEqual(stat.S_IMODE(path.parent.stat().st_mode), 0o700)
+        self.assertEqual(stat.S_IMODE(path.stat().st_mode), 0o600)
+
+    @unittest.skipUnless(hasattr(socket, "SO_PEERCRED"), "no SO_PEERCRED")
+    def test_peer_uid(self):
+        a, b = socket.socketpair()
+        with a, b:
+            self.assertEqual(peer_uid(a), os.getuid())
+
+
+def imported_modules(importtime_stderr: str) -> List[str]:
+    return [line.split("|")[-1].strip()
+            for line in importtime_stderr.splitlines()
+            if line.startswith("import time:")]
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,80 @@
+# SPDX-FileCopyrightText: (c) 2021 Artëm IG <github.com/rtmigo>
+# SPDX-License-Identifier: BSD-3-Clause
+
+import os
+import subprocess
+import sys
+import unittest
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from typing import Dict, List
+
+# Each vien command, including the shebang scripts, pays for importing
+# the package. These limits protect the startup time from regressions.
+#
+# The values are counted over the modules imported by `vien path`, but not
+# imported by a Python interpreter running an empty program. The count has
+# headroom for the modules that new Python versions import transitively
+# (`vien path` imports 50 on Python 3.11).
+MAX_EXTRA_MODULES = 70
+
+# The import time depends on the machine, so its limit is only checked when
+# the milliseconds are set in this variable
+IMPORT_TIME_VAR = "VIEN_TEST_MAX_IMPORT_MS"
+
+# modules that are not needed to resolve the environment path
+HEAVY_MODULES = ['argparse', 'subprocess', 'json', 'shlex', 'unittest',
+                 'platform', 'vien._bash_runner', 'vien._colors']
+
+
+def imported_modules(args: List[str]) -> Dict[str, int]:
+    """Runs Python with `-X importtime` and returns a dict where keys are
+    the names of imported modules and values are their self import times
+    in microseconds."""
+    with TemporaryDirectory() as temp_dir:
+        env = {**os.environ,
+               "VIENDIR": temp_dir,
+               "PYTHONPATH": str(Path(__file__).parent.parent)}
+        cp = subprocess.run([sys.executable, "-X", "importtime"] + args,
+                            env=env, cwd=temp_dir,
+                            stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                            universal_newlines=True)
+    assert cp.returncode == 0, cp.stderr
+
+    result: Dict[str, int] = dict()
+    for line in cp.stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        self_us, _, name = line[len("import time:"):].split("|")
+        name = name.strip()
+        if name == "imported package":  # header
+            continue
+        result[name] = result.get(name, 0) + int(self_us)
+    return result
+
+
+class TestImportBudget(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        baseline = imported_modules(["-c", "pass"])
+        imported = imported_modules(["-m", "vien", "path"])
+        cls.extra = {name: us for name, us in imported.items()
+                     if name not in baseline}
+
+    def test_no_heavy_modules(self):
+        for name in HEAVY_MODULES:
+            self.assertNotIn(name, self.extra)
+
+    def test_module_count(self):
+        self.assertLessEqual(len(self.extra), MAX_EXTRA_MODULES,
+                             sorted(self.extra))
+
+    @unittest.skipUnless(os.environ.get(IMPORT_TIME_VAR),
+                         f"{IMPORT_TIME_VAR} is not set")
+    def test_import_time(self):
+        total_ms = sum(self.extra.values()) / 1000
+        self.assertLessEqual(total_ms, float(os.environ[IMPORT_TIME_VAR]))
+
+
+if __name__ == "__main__":
+    unittest.main()
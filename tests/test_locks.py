@@ -0,0 +1,52 @@
+# SPDX-FileCopyrightText: (c) 2021 Artëm IG <github.com/rtmigo>
+# SPDX-License-Identifier: BSD-3-Clause
+
+import threading
+import unittest
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+from tests.common import is_posix
+from vien._exceptions import LockTimeoutExit
+from vien._locks import VenvLock
+
+
+@unittest.skipUnless(is_posix, "not POSIX")
+class TestVenvLock(unittest.TestCase):
+    # flock locks of different open files conflict even in one process
+
+    def test_shared_locks_do_not_conflict(self):
+        with TemporaryDirectory() as td:
+            venv_dir = Path(td) / "project_venv"
+            with VenvLock(venv_dir, exclusive=False, timeout=0):
+                with VenvLock(venv_dir, exclusive=False, timeout=0) as lock:
+                    self.assertEqual(lock.waited, 0)
+
+    def test_timeout(self):
+        with TemporaryDirectory() as td:
+            venv_dir = Path(td) / "project_venv"
+            with VenvLock(venv_dir, exclusive=True):
+                with self.assertRaises(LockTimeoutExit):
+                    with VenvLock(venv_dir, exclusive=False, timeout=0.1):
+                        pass
+                # other environments are not locked
+                with VenvLock(Path(td) / "other_venv", exclusive=True,
+                              timeout=0):
+                    pass
+
+    def test_waits_for_release(self):
+        with TemporaryDirectory() as td:
+            venv_dir = Path(td) / "project_venv"
+            exclusive = VenvLock(venv_dir, exclusive=True).__enter__()
+            timer = threading.Timer(0.2, exclusive.__exit__,
+                                    (None, None, None))
+            timer.start()
+            try:
+                with VenvLock(venv_dir, exclusive=True, timeout=10) as lock:
+                    self.assertGreater(lock.waited, 0.1)
+            finally:
+                timer.join()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -6,8 +6,10 @@ from __future__ import annotations
 import json
 import os
 import shutil
+import subprocess
 import sys
 import tempfile
+import time
 import unittest
 from io import StringIO
 from pathlib import Path
@@ -24,7 +26,9 @@ from tests.common import is_posix
 from tests.time_limited import TimeLimited
 from vien import main_entry_point
 from vien._exceptions import ChildExit, VenvExistsExit, VenvDoesNotExistExit, \
-    PyFileNotFoundExit, FailedToCreateVenvExit, CannotFindExecutableExit
+    PyFileNotFoundExit, FailedToCreateVenvExit, CannotFindExecutableExit, \
+    CommandNotFoundExit, LauncherOutdatedExit, BatchFileNotFoundExit, \
+    LauncherReplacesFileExit, MultipleProjectsExit
 
 
 class CapturedOutput:
@@ -257,6 +261,76 @@ class TestsInsideTempProjectDir(unittest.TestCase):
             main_entry_point(["create"])
         self.assertIsErrorExit(ce.exception)
 
+    def test_create_from_template(self):
+        self.assertVenvNotExists()
+        main_entry_point(["create", "--template"])
+        self.assertVenvExists()
+        self.assertTrue((self.svetDir / ".templates").exists())
+
+        with self.assertRaises(ChildExit):
+            main_entry_point(["run", "python", "-c",
+                              "import pip, sys; "
+                              "print(sys.prefix, "
+                              "file=open('prefix.txt', 'w'))"])
+        self.assertEqual(
+            os.path.realpath(Path("prefix.txt").read_text().strip()),
+            os.path.realpath(str(self.expectedVenvDir)))
+
+    def test_create_from_pool(self):
+        main_entry_point(["pool", "fill", "--size", "1", sys.executable])
+        self.assertVenvNotExists()
+        main_entry_point(["create", sys.executable])
+        self.assertVenvExists()
+        with CapturedOutput() as output:
+            main_entry_point(["pool", "status"])
+        self.assertIn("HITS    1", output.std)
+        self.assertIn(f"0  {sys.executable}", output.std)
+
+    def test_create_with_shared_pip(self):
+        main_entry_point(["create", "--shared-pip"])
+        self.assertVenvExists()
+
+        # the environment has no pip of its own
+        with self.assertRaises(ChildExit) as ce:
+            main_entry_point(["run", "python", "-c", "import pip"])
+        self.assertEqual(ce.exception.code, 1)
+
+        with self.assertRaises(ChildExit) as ce:
+            main_entry_point(["pip", "--version"])
+        self.assertEqual(ce.exception.code, 0)
+
+        if is_posix:
+            # the wrapper script in bin
+            with self.assertRaises(ChildExit) as ce:
+                main_entry_point(["run", "pip", "--version"])
+            self.assertEqual(ce.exception.code, 0)
+
+    @unittest.skipUnless(is_posix, "not POSIX")
+    def test_failed_create_leaves_nothing(self):
+        # 'false -m venv ...' fails like a broken interpreter would
+        with self.assertRaises(FailedToCreateVenvExit):
+            main_entry_point(["create", "false"])
+        self.assertVenvNotExists()
+        self.assertEqual([n for n in os.listdir(str(self.svetDir))
+                          if n.endswith(".staging")], [])
+
+    def test_create_removes_abandoned_staging(self):
+        # a process with such PID is unlikely to exist
+        abandoned = self.svetDir / ".project_venv.999999999.staging"
+        (abandoned / "bin").mkdir(parents=True)
+        main_entry_point(["create"])
+        self.assertVenvExists()
+        self.assertFalse(abandoned.exists())
+
+    def test_create_with_version(self):
+        version = "{}.{}".format(*sys.version_info[:2])
+        main_entry_point(["create", version])
+        self.assertVenvExists()
+        self.assertTrue(
+            (self.svetDir / ".cache" / "pythons.json").exists())
+        with self.assertRaises(CannotFindExecutableExit):
+            main_entry_point(["recreate", "1.2"])
+
     @unittest.skipUnless(is_posix, "not sure what to resolve in windows")
     def test_create_resolves_python3(self):
         self.assertVenvNotExists()
@@ -272,6 +346,34 @@ class TestsInsideTempProjectDir(unittest.TestCase):
         main_entry_point(["delete"])
         self.assertVenvNotExists()
 
+    def test_delete_leaves_no_trash(self):
+        main_entry_point(["create"])
+        main_entry_point(["delete"])
+        self.assertVenvNotExists()
+        self.assertEqual(os.listdir(str(self.svetDir / ".trash")), [])
+
+    @unittest.skipUnless(is_posix, "not POSIX")
+    def test_delete_from_command_line(self):
+        """The command line tool removes the files in the background, but
+        the environment disappears at once."""
+        main_entry_point(["create"])
+        env = {**os.environ, "PYTHONPATH": str(Path(__file__).parent.parent)}
+        env.pop("VIEN_NO_EXEC", None)
+        subprocess.check_call([sys.executable, "-m", "vien", "delete"],
+                              env=env)
+        self.assertVenvNotExists()
+        # waiting for the background process
+        trash = self.svetDir / ".trash"
+        with TimeLimited(10):
+            while os.listdir(str(trash)):
+                time.sleep(0.05)
+
+        main_entry_point(["create"])
+        subprocess.check_call(
+            [sys.executable, "-m", "vien", "delete", "--wait"], env=env)
+        self.assertVenvNotExists()
+        self.assertEqual(os.listdir(str(self.svetDir / ".trash")), [])
+
     def test_delete_fails_if_not_exists(self):
         self.assertVenvNotExists()
         with self.assertRaises(VenvDoesNotExistExit) as cm:
@@ -285,6 +387,22 @@ class TestsInsideTempProjectDir(unittest.TestCase):
         main_entry_point(["recreate"])
         self.assertVenvExists()
 
+    def test_recreate_replaces_when_ready(self):
+        main_entry_point(["create"])
+        marker = self.expectedVenvDir / "marker.txt"
+        marker.touch()
+        main_entry_point(["recreate"])
+        self.assertVenvExists()
+        self.assertFalse(marker.exists())
+        self.assertEqual([n for n in os.listdir(str(self.svetDir))
+                          if n.endswith(".staging")], [])
+        self.assertEqual(os.listdir(str(self.svetDir / ".trash")), [])
+        # the paths in the environment are the final ones
+        activate = self.expectedVenvDir / "bin" / "activate"
+        if activate.exists():
+            self.assertIn(str(self.expectedVenvDir), activate.read_text())
+            self.assertNotIn(".staging", activate.read_text())
+
     def test_recreate_with_argument(self):
         self.assertVenvNotExists()
 
@@ -434,6 +552,36 @@ class TestsInsideTempProjectDir(unittest.TestCase):
         self.assertTrue("svetdir" in interpreter_path.parts)
         self.assertTrue("project_venv" in interpreter_path.parts)
 
+    @unittest.skipUnless(is_posix, "not POSIX")
+    def test_run_sets_activated_environment(self):
+        main_entry_point(["create"])
+        report = self.projectDir / "env.json"
+        code = "import os, json, pathlib; " \
+               f"pathlib.Path({repr(str(report))}).write_text(" \
+               "json.dumps(dict(os.environ)))"
+
+        os.environ["PYTHONHOME"] = "/labuda"
+        try:
+            for extra in [[], ["--source-activate"]]:
+                if report.exists():
+                    report.unlink()
+                self._run_and_check(["run"] + extra + ["python3", "-c", code])
+                env = json.loads(report.read_text())
+                self.assertEqual(Path(env["VIRTUAL_ENV"]),
+                                 self.expectedVenvDir)
+                self.assertEqual(Path(env["PATH"].split(os.pathsep)[0]),
+                                 self.expectedVenvDir / "bin")
+                self.assertNotIn("PYTHONHOME", env)
+        finally:
+            del os.environ["PYTHONHOME"]
+
+    @unittest.skipUnless(is_posix, "not POSIX")
+    def test_run_command_not_found(self):
+        main_entry_point(["create"])
+        with self.assertRaises(CommandNotFoundExit) as ce:
+            main_entry_point(["run", "labuda-ladeda-hehe"])
+        self.assertIsErrorExit(ce.exception)
+
     ## CALL ####################################################################
 
     def test_call_needs_venv(self):
@@ -509,6 +657,22 @@ class TestsInsideTempProjectDir(unittest.TestCase):
         self.assertIn(str(self.projectDir.absolute()),
                       self.reported_syspath)
 
+    def test_call_as_file_and_as_module(self):
+        # the cached resolution of one must not be used for the other
+        main_entry_point(["create"])
+        file_py = self.project_pkg_sub / "module.py"
+        file_py.write_text("import sys; sys.exit(42 if __spec__ else 23)")
+        for order in [["", "-m"], ["-m", ""]]:
+            cache_file = self.svetDir / ".cache" / "call.json"
+            if cache_file.exists():
+                cache_file.unlink()
+            for option in order:
+                with self.assertRaises(ChildExit) as ce:
+                    main_entry_point(["call"] + ([option] if option else [])
+                                     + [str(file_py)])
+                self.assertEqual(ce.exception.code,
+                                 42 if option else 23)
+
     def test_call_parameters(self):
         """Testing that call really passes parameters to child."""
 
@@ -537,6 +701,198 @@ class TestsInsideTempProjectDir(unittest.TestCase):
         #     main_entry_point(["call", "main.py", "aaa", "bbb", "ccc"])
         # self.assertEqual(ce.exception.code, 4)  # received len(argv)
 
+    def _call_sequence(self, *options: str) -> List[str]:
+        log = self.projectDir / "log.txt"
+        (self.projectDir / "a.py").write_text(
+            "import os, sys\n"
+            "counter = 1\n"
+            f"open({str(log)!r}, 'a').write("
+            f"f'a {{sys.argv[1:]}} {{os.getpid()}}\\n')\n")
+        (self.project_pkg_sub / "b.py").write_text(
+            "import os, sys\n"
+            f"open({str(log)!r}, 'a').write("
+            f"f'b {{__name__}} {{sys.argv[1:]}} {{os.getpid()}} "
+            f"{{globals().get(\"counter\")}}\\n')\n")
+        (self.projectDir / "c.py").write_text("exit(5)")
+        (self.projectDir / "d.py").write_text(
+            f"open({str(log)!r}, 'a').write('d\\n')")
+
+        main_entry_point(["create"])
+        with self.assertRaises(ChildExit) as ce:
+            main_entry_point(["call", "--same-interpreter"] + list(options)
+                             + ["a.py", "x", "--",
+                                "-m", "pkg/sub/b.py", "y", "z", "--",
+                                "c.py", "--", "d.py"])
+        self.assertEqual(ce.exception.code, 5)
+        return log.read_text().splitlines()
+
+    def test_call_same_interpreter(self):
+        a, b = self._call_sequence()
+        a_args, a_pid = a.rsplit(" ", 1)
+        self.assertEqual(a_args, "a ['x']")
+        # the module, in the same process, with the globals of a.py
+        self.assertEqual(b, f"b __main__ ['y', 'z'] {a_pid} 1")
+
+    def test_call_same_interpreter_fresh_main(self):
+        a, b = self._call_sequence("--fresh-main")
+        self.assertTrue(b.endswith(" None"))
+
+    @unittest.skipUnless(is_posix, "not POSIX")
+    def test_run_batch(self):
+        main_entry_point(["create"])
+        (self.projectDir / "commands.txt").write_text(
+            "# the environment is activated\n"
+            "test \"$VIRTUAL_ENV\" = " + str(self.expectedVenvDir) + "\n"
+            "\n"
+            "# bash, not sh\n"
+            "[[ 1 == 1 ]]\n"
+            "exit 4\n"
+            "exit 5\n")
+        with self.assertRaises(ChildExit) as ce:
+            main_entry_point(["run", "--batch", "commands.txt", "-j", "2"])
+        # the code of the first failed command
+        self.assertEqual(ce.exception.code, 4)
+
+    @unittest.skipUnless(is_posix, "not POSIX")
+    def test_run_in_projects(self):
+        services = Path(self._temp_dir) / "services"
+        for name in ("alpha", "beta"):
+            (services / name).mkdir(parents=True)
+            main_entry_point(["-p", str(services / name), "create"])
+        report = "import os, sys; open('report.txt', 'w').write(sys.prefix)"
+
+        with self.assertRaises(ChildExit) as ce:
+            main_entry_point(["-p", str(services / "*"),
+                              "run", "-j", "2", "python", "-c", report])
+        self.assertEqual(ce.exception.code, 0)
+        for name in ("alpha", "beta"):
+            # run in the project dir, in the environment of the project
+            self.assertEqual(
+                (services / name / "report.txt").read_text(),
+                str(self.svetDir / f"{name}_venv"))
+
+        # the project without an environment fails, the others run
+        (services / "gamma").mkdir()
+        (services / "list.txt").write_text("beta\n# comment\ngamma\n")
+        (services / "beta" / "report.txt").unlink()
+        with self.assertRaises(ChildExit) as ce:
+            main_entry_point(["-p", "@" + str(services / "list.txt"),
+                              "run", "python", "-c", report])
+        self.assertEqual(ce.exception.code, 1)
+        self.assertTrue((services / "beta" / "report.txt").exists())
+
+    def test_multiple_projects_only_for_run(self):
+        with self.assertRaises(MultipleProjectsExit) as ce:
+            main_entry_point(["-p", "a", "-p", "b", "create"])
+        self.assertIsErrorExit(ce.exception)
+
+    @unittest.skipUnless(is_posix, "not POSIX")
+    def test_project_dir_named_like_pattern(self):
+        odd = Path(self._temp_dir) / "odd[1]"
+        odd.mkdir()
+        os.chdir(self._temp_dir)
+        main_entry_point(["-p", "odd[1]", "create"])
+        with CapturedOutput() as output:
+            main_entry_point(["-p", "odd[1]", "path"])
+        self.assertEqual(output.std.strip(), str(self.svetDir / "odd[1]_venv"))
+        with self.assertRaises(ChildExit) as ce:
+            main_entry_point(["-p", "odd[1]", "run", "python", "-c",
+                              "import sys; exit(sys.prefix.endswith("
+                              "'odd[1]_venv') and 5)"])
+        self.assertEqual(ce.exception.code, 5)
+
+    @unittest.skipUnless(is_posix, "not POSIX")
+    def test_run_batch_file_not_found(self):
+        main_entry_point(["create"])
+        with self.assertRaises(BatchFileNotFoundExit) as ce:
+            main_entry_point(["run", "--batch", "commands.txt"])
+        self.assertIsErrorExit(ce.exception)
+
+    @unittest.skipUnless(is_posix, "not POSIX")
+    def test_call_from_command_line_replaces_process(self):
+        """When started from the command line, vien must exec the
+        interpreter instead of keeping its own process as the parent."""
+
+        main_entry_point(["create"])
+        pid_file = self.projectDir / "pid.txt"
+        (self.projectDir / "pid.py").write_text(
+            "import os, pathlib\n"
+            f"pathlib.Path({repr(str(pid_file))})"
+            ".write_text(str(os.getpid()))\n"
+            "exit(7)")
+
+        env = {**os.environ, "PYTHONPATH": str(Path(__file__).parent.parent)}
+        env.pop("VIEN_NO_EXEC", None)
+        process = subprocess.Popen(
+            [sys.executable, "-m", "vien", "call", "pid.py"], env=env)
+        self.assertEqual(process.wait(), 7)
+        self.assertEqual(int(pid_file.read_text()), process.pid)
+
+        # the same, but exec is disabled: the interpreter runs in a child
+        env["VIEN_NO_EXEC"] = "1"
+        process = subprocess.Popen(
+            [sys.executable, "-m", "vien", "call", "pid.py"], env=env)
+        self.assertEqual(process.wait(), 7)
+        self.assertNotEqual(int(pid_file.read_text()), process.pid)
+
+    @unittest.skipUnless(is_posix, "not POSIX")
+    def test_install_launcher(self):
+        main_entry_point(["create"])
+        file_py = self.project_pkg_sub / "module.py"
+        self.write_reporting_program(file_py)
+        launcher = self.project_pkg_sub / "module"
+
+        with TempCwd():
+            main_entry_point(["-p", "../..", "install-launcher", "-m",
+                              str(file_py)])
+            self.assertTrue(os.access(str(launcher), os.X_OK))
+            # the launcher is up to date
+            main_entry_point(["-p", "../..", "install-launcher", "-m",
+                              str(file_py), "--check"])
+
+            self.assertProjectDirIsNotCwd()
+            env = {**os.environ, "PYTHONPATH": ""}
+            subprocess.check_call([str(launcher), "arg1"], env=env)
+
+        self.assertInVenv(self.reported_executable)
+        self.assertIn(str(self.projectDir.absolute()),
+                      self.reported_syspath)
+        self.assertEqual(self.reported_argv[-1], "arg1")
+
+        # the launcher written for the file mode is different
+        with self.assertRaises(LauncherOutdatedExit) as ce:
+            main_entry_point(["install-launcher", str(file_py), "--check"])
+        self.assertIsErrorExit(ce.exception)
+
+    @unittest.skipUnless(is_posix, "not POSIX")
+    def test_install_launcher_without_py_extension(self):
+        main_entry_point(["create"])
+        script = self.projectDir / "myscript"
+        script.write_text("exit(3)\n")
+
+        # the launcher would be the script itself
+        for extra in ([], ["--bin-dir", str(self.projectDir)]):
+            with self.assertRaises(LauncherReplacesFileExit) as ce:
+                main_entry_point(["install-launcher", str(script)] + extra)
+            self.assertIsErrorExit(ce.exception)
+            self.assertEqual(script.read_text(), "exit(3)\n")
+
+        bin_dir = self.projectDir / "bin"
+        main_entry_point(["install-launcher", str(script),
+                          "--bin-dir", str(bin_dir)])
+        self.assertEqual(subprocess.call([str(bin_dir / "myscript")]), 3)
+        self.assertEqual(script.read_text(), "exit(3)\n")
+
+    @unittest.skipUnless(is_posix, "not POSIX")
+    def test_write_launcher_over_source(self):
+        from vien._launcher import write_launcher
+        script = self.projectDir / "myscript"
+        script.write_text("exit(3)\n")
+        with self.assertRaises(LauncherReplacesFileExit):
+            write_launcher(self.projectDir / "." / "myscript", "#!/bin/sh\n",
+                           script)
+        self.assertEqual(script.read_text(), "exit(3)\n")
+
     def test_call_project_dir_venv(self):
         """Tests that the -p parameter actually changes the project directory,
         so the correct virtual environment is found."""
@@ -0,0 +1,68 @@
+# SPDX-FileCopyrightText: (c) 2021 Artëm IG <github.com/rtmigo>
+# SPDX-License-Identifier: BSD-3-Clause
+
+import io
+import sys
+import unittest
+
+from vien._parallel import Job, read_batch, run_jobs, summary, \
+    batch_exit_code, TAIL_LINES
+
+
+def python_job(prefix: str, code: str) -> Job:
+    return Job(prefix=prefix, command=[sys.executable, "-c", code])
+
+
+class TestReadBatch(unittest.TestCase):
+    def test_skips_empty_and_comments(self):
+        self.assertEqual(read_batch(["echo a\n", "\n", "  # no\n",
+                                     "  echo b  \n"]),
+                         ["echo a", "echo b"])
+
+
+class TestRunJobs(unittest.TestCase):
+    def test_results_in_order(self):
+        output = io.StringIO()
+        jobs = [python_job("[1] ", "import time; time.sleep(0.3); "
+                                   "print('slow')"),
+                python_job("[2] ", "print('fast'); exit(3)")]
+        results = run_jobs(jobs, workers=2, output=output)
+        self.assertEqual([r.exit_code for r in results], [0, 3])
+        self.assertEqual(results[0].tail, ["slow\n"])
+        # the second one finished first
+        self.assertEqual(output.getvalue(), "[2] fast\n[1] slow\n")
+        self.assertEqual(batch_exit_code(results), 3)
+
+    def test_tail_is_bounded(self):
+        output = io.StringIO()
+        [result] = run_jobs(
+            [python_job("", "for i in range(1000): print(i)")],
+            workers=1, output=output)
+        self.assertEqual(len(output.getvalue().splitlines()), 1000)
+        self.assertEqual(len(result.tail), TAIL_LINES)
+        self.assertEqual(result.tail[-1], "999\n")
+
+    def test_stderr_is_prefixed(self):
+        output = io.StringIO()
+        run_jobs([python_job("[x] ", "import sys; sys.stderr.write('e')")],
+                 workers=1, output=output)
+        self.assertEqual(output.getvalue(), "[x] e\n")
+
+    def test_missing_executable(self):
+        output = io.StringIO()
+        [result] = run_jobs([Job("", ["/nonexistent/program"])], workers=1,
+                            output=output)
+        self.assertEqual(result.exit_code, 127)
+
+    def test_summary(self):
+        results = run_jobs([python_job("[1] ", "exit(0)"),
+                            python_job("[2] ", "print('oops'); exit(2)")],
+                           workers=2, output=io.StringIO())
+        text = summary(results, 1.0)
+        self.assertIn("2 commands in 1.00 s (2.0/s), 1 failed", text)
+        self.assertIn("Failed with code 2: [2] ", text)
+        self.assertIn("  oops", text)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,54 @@
+# SPDX-FileCopyrightText: (c) 2021 Artëm IG <github.com/rtmigo>
+# SPDX-License-Identifier: BSD-3-Clause
+
+import os
+import subprocess
+import sys
+import unittest
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+from tests.common import is_posix
+from vien._pool import claim_spare, fill_pool, pool_status
+
+
+class TestPool(unittest.TestCase):
+    def test_no_pool(self):
+        with TemporaryDirectory() as td:
+            pool = Path(td) / ".pool"
+            self.assertFalse(
+                claim_spare(pool, sys.executable, Path(td) / "a_venv"))
+            # misses are not counted when the pool is not used
+            self.assertFalse(pool.exists())
+
+    def test_fill_and_claim(self):
+        with TemporaryDirectory() as td:
+            pool = Path(td) / ".pool"
+            self.assertEqual(fill_pool(pool, sys.executable, 1), 1)
+            self.assertEqual(fill_pool(pool, sys.executable, 1), 0)
+            self.assertEqual(pool_status(pool).spares, [(sys.executable, 1)])
+
+            venv_dir = Path(td) / "project_venv"
+            self.assertTrue(claim_spare(pool, sys.executable, venv_dir))
+            self.assertFalse(
+                claim_spare(pool, sys.executable, Path(td) / "other_venv"))
+
+            status = pool_status(pool)
+            self.assertEqual((status.hits, status.misses), (1, 1))
+            self.assertEqual(status.spares, [(sys.executable, 0)])
+
+            bin_dir = venv_dir / ("bin" if is_posix else "Scripts")
+            self.assertIn(str(venv_dir),
+                          (venv_dir / "pyvenv.cfg").read_text()
+                          + (bin_dir / ("activate" if is_posix
+                                        else "activate.bat")).read_text())
+            python = bin_dir / ("python" if is_posix else "python.exe")
+            prefix = subprocess.check_output(
+                [str(python), "-c", "import sys; print(sys.prefix)"],
+                universal_newlines=True).strip()
+            self.assertEqual(os.path.realpath(prefix),
+                             os.path.realpath(str(venv_dir)))
+
+
+if __name__ == '__main__':
+    unittest.main()
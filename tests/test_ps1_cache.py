@@ -0,0 +1,75 @@
+# SPDX-FileCopyrightText: (c) 2021 Artëm IG <github.com/rtmigo>
+# SPDX-License-Identifier: BSD-3-Clause
+
+import os
+import unittest
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest import mock
+
+import vien._main
+from vien._main import cached_bash_ps1
+
+
+class TestCachedPs1(unittest.TestCase):
+    def setUp(self):
+        self._td = TemporaryDirectory()
+        self.temp = Path(self._td.name)
+        self.bashrc = self.temp / "bashrc"
+        self.bashrc.write_text("PS1=one")
+
+        self._old_env = dict(os.environ)
+        os.environ.pop("PS1", None)
+        os.environ["VIENDIR"] = str(self.temp / "vien")
+
+        self.guesses = 0
+
+        def fake_guess():
+            self.guesses += 1
+            return f"guess{self.guesses}"
+
+        self._patches = [
+            mock.patch.object(vien._main, "guess_bash_ps1", fake_guess),
+            mock.patch.object(vien._main, "bash_rc_files",
+                              lambda: [self.bashrc])]
+        for p in self._patches:
+            p.start()
+
+    def tearDown(self):
+        for p in self._patches:
+            p.stop()
+        os.environ.clear()
+        os.environ.update(self._old_env)
+        self._td.cleanup()
+
+    def test_env_var_is_not_cached(self):
+        os.environ["PS1"] = "from env"
+        self.assertEqual(cached_bash_ps1(), "from env")
+        self.assertEqual(self.guesses, 0)
+
+    def test_guesses_once(self):
+        self.assertEqual(cached_bash_ps1(), "guess1")
+        self.assertEqual(cached_bash_ps1(), "guess1")
+        self.assertEqual(self.guesses, 1)
+
+    def test_invalidated_by_rc_file_mtime(self):
+        self.assertEqual(cached_bash_ps1(), "guess1")
+        stat = self.bashrc.stat()
+        os.utime(str(self.bashrc),
+                 ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+        self.assertEqual(cached_bash_ps1(), "guess2")
+        self.assertEqual(cached_bash_ps1(), "guess2")
+
+    def test_invalidated_by_rc_file_removal(self):
+        self.assertEqual(cached_bash_ps1(), "guess1")
+        self.bashrc.unlink()
+        self.assertEqual(cached_bash_ps1(), "guess2")
+
+    def test_refresh(self):
+        self.assertEqual(cached_bash_ps1(), "guess1")
+        self.assertEqual(cached_bash_ps1(refresh=True), "guess2")
+        self.assertEqual(cached_bash_ps1(), "guess2")
+
+
+if __name__ == "__main__":
+    unittest.main()
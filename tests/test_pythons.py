@@ -0,0 +1,79 @@
+# SPDX-FileCopyrightText: (c) 2021 Artëm IG <github.com/rtmigo>
+# SPDX-License-Identifier: BSD-3-Clause
+
+import os
+import unittest
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest import mock
+
+from tests.common import is_posix
+from vien._pythons import is_version_spec, PythonsCache, discover, \
+    find_by_version, PythonInfo
+
+
+def fake_python(bin_dir: Path, name: str, version: str) -> Path:
+    file = bin_dir / name
+    file.write_text(f"#!/bin/sh\necho {version}\n")
+    os.chmod(str(file), 0o755)
+    return file
+
+
+class TestVersionSpec(unittest.TestCase):
+    def test_is_version_spec(self):
+        for arg in ["3", "3.11", "3.11.2"]:
+            self.assertTrue(is_version_spec(arg))
+        for arg in ["python3", "3.11.2.1", "/usr/bin/python3", "3.x"]:
+            self.assertFalse(is_version_spec(arg))
+
+
+@unittest.skipUnless(is_posix, "fake interpreters are sh scripts")
+class TestDiscover(unittest.TestCase):
+    def setUp(self):
+        self._td = TemporaryDirectory()
+        self.bin_dir = Path(self._td.name) / "bin"
+        self.bin_dir.mkdir()
+        self.cache_file = Path(self._td.name) / "pythons.json"
+        patcher = mock.patch.dict(os.environ, {"PATH": str(self.bin_dir)})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        roots = mock.patch("vien._pythons._install_roots", return_value=[])
+        roots.start()
+        self.addCleanup(roots.stop)
+
+    def tearDown(self):
+        self._td.cleanup()
+
+    def test_discover_and_cache(self):
+        old = fake_python(self.bin_dir, "python3.7", "3.7.1")
+        fake_python(self.bin_dir, "python3.11", "3.11.2")
+        fake_python(self.bin_dir, "python3.11-config", "0")
+
+        self.assertEqual(
+            discover(PythonsCache(self.cache_file)),
+            [PythonInfo(str(self.bin_dir / "python3.11"), "3.11.2"),
+             PythonInfo(str(old), "3.7.1")])
+
+        # nothing is run when the cache is fresh
+        with mock.patch("vien._pythons._probe",
+                        side_effect=AssertionError):
+            cache = PythonsCache(self.cache_file)
+            self.assertEqual(find_by_version(cache, "3"),
+                             str(self.bin_dir / "python3.11"))
+            self.assertEqual(find_by_version(cache, "3.7"), str(old))
+
+        # the modified binary is run again
+        fake_python(self.bin_dir, "python3.7", "3.7.9")
+        os.utime(str(old), ns=(1, 1))
+        cache = PythonsCache(self.cache_file)
+        self.assertIsNone(cache.get(str(old)))
+        self.assertEqual(find_by_version(cache, "3.7.9"), str(old))
+
+    def test_not_found(self):
+        fake_python(self.bin_dir, "python3.7", "3.7.1")
+        self.assertIsNone(
+            find_by_version(PythonsCache(self.cache_file), "3.11"))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,125 @@
+# SPDX-FileCopyrightText: (c) 2021 Artëm IG <github.com/rtmigo>
+# SPDX-License-Identifier: BSD-3-Clause
+
+import json
+import os
+import subprocess
+import sys
+import unittest
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+from vien._exceptions import PipWheelNotFoundExit
+from vien._shared_pip import find_pip_wheel, get_shared_pip, \
+    shared_pip_env, python_satisfies, requires_python, cached_pip_wheel
+
+
+def write_wheel(path: Path, requires: str):
+    import zipfile
+    with zipfile.ZipFile(str(path), "w") as zf:
+        zf.writestr("pip-99.0.dist-info/METADATA",
+                    f"Metadata-Version: 2.1\nName: pip\n"
+                    f"Requires-Python: {requires}\n\nRequires-Python: no\n")
+
+
+class TestSharedPip(unittest.TestCase):
+    def test_unpacked_once(self):
+        with TemporaryDirectory() as td:
+            vien_dir = Path(td)
+            wheel = find_pip_wheel()
+            pip_dir = get_shared_pip(vien_dir, wheel)
+            self.assertEqual(pip_dir.parent, vien_dir / ".pip")
+            self.assertTrue(wheel.name.startswith(pip_dir.name + "-"))
+            self.assertTrue((pip_dir / "pip" / "__init__.py").exists())
+
+            mtime = pip_dir.stat().st_mtime_ns
+            self.assertEqual(get_shared_pip(vien_dir, wheel), pip_dir)
+            self.assertEqual(pip_dir.stat().st_mtime_ns, mtime)
+            self.assertEqual(os.listdir(str(vien_dir / ".pip")),
+                             [pip_dir.name])
+
+            output = subprocess.check_output(
+                [sys.executable, "-m", "pip", "--version"],
+                env=shared_pip_env(pip_dir, dict(os.environ)),
+                universal_newlines=True)
+            self.assertIn(str(pip_dir), output)
+
+    def test_wheel_of_other_interpreter(self):
+        # the interpreter is run to find its wheel
+        with TemporaryDirectory() as td:
+            link = Path(td) / "python"
+            link.symlink_to(sys.executable)
+            self.assertEqual(find_pip_wheel(str(link)), find_pip_wheel())
+
+    def test_wheel_choice_cached(self):
+        from unittest import mock
+        import vien._shared_pip as shared_pip
+        with TemporaryDirectory() as td:
+            vien_dir = Path(td)
+            link = vien_dir / "python"
+            link.symlink_to(sys.executable)
+            with mock.patch.dict(os.environ), \
+                    mock.patch.object(shared_pip, "_probe_python",
+                                      wraps=shared_pip._probe_python) as probe:
+                os.environ.pop("VIEN_PIP_WHEEL", None)
+                wheel = cached_pip_wheel(vien_dir, str(link))
+                self.assertEqual(wheel, find_pip_wheel())
+                self.assertTrue((vien_dir / ".pip" / "wheels.json").exists())
+                probe.reset_mock()
+
+                self.assertEqual(cached_pip_wheel(vien_dir, str(link)), wheel)
+                probe.assert_not_called()
+
+                # another interpreter at the same path
+                file = vien_dir / ".pip" / "wheels.json"
+                data = json.loads(file.read_text())
+                data[str(link)][0] -= 1
+                file.write_text(json.dumps(data))
+                self.assertEqual(cached_pip_wheel(vien_dir, str(link)), wheel)
+                probe.assert_called_once_with(str(link))
+
+    def test_requires_python(self):
+        with TemporaryDirectory() as td:
+            wheel = Path(td) / "pip-99.0-py3-none-any.whl"
+            write_wheel(wheel, ">=3.8, !=3.9.*")
+            self.assertEqual(requires_python(wheel), ">=3.8, !=3.9.*")
+            self.assertIsNone(requires_python(Path(td) / "missing.whl"))
+
+    def test_python_satisfies(self):
+        self.assertTrue(python_satisfies((3, 8, 0), ">=3.8"))
+        self.assertFalse(python_satisfies((3, 7, 9), ">=3.8"))
+        self.assertFalse(python_satisfies((3, 9, 1), ">=3.8,!=3.9.*"))
+        self.assertTrue(python_satisfies((3, 10, 1), ">=3.8,!=3.9.*"))
+        self.assertTrue(python_satisfies((3, 7, 1), ">=2.7,<4"))
+        self.assertTrue(python_satisfies((3, 7, 1), "whatever"))
+
+    def test_incompatible_wheel(self):
+        old = os.environ.get("VIEN_PIP_WHEEL")
+        with TemporaryDirectory() as td:
+            wheel = Path(td) / "pip-99.0-py3-none-any.whl"
+            write_wheel(wheel, ">=99")
+            os.environ["VIEN_PIP_WHEEL"] = str(wheel)
+            try:
+                with self.assertRaises(PipWheelNotFoundExit):
+                    find_pip_wheel()
+            finally:
+                if old is None:
+                    del os.environ["VIEN_PIP_WHEEL"]
+                else:
+                    os.environ["VIEN_PIP_WHEEL"] = old
+
+    def test_pinned_wheel(self):
+        old = os.environ.get("VIEN_PIP_WHEEL")
+        os.environ["VIEN_PIP_WHEEL"] = "/labuda/pip-1.0-py3-none-any.whl"
+        try:
+            with self.assertRaises(PipWheelNotFoundExit):
+                find_pip_wheel()
+        finally:
+            if old is None:
+                del os.environ["VIEN_PIP_WHEEL"]
+            else:
+                os.environ["VIEN_PIP_WHEEL"] = old
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,51 @@
+# SPDX-FileCopyrightText: (c) 2021 Artëm IG <github.com/rtmigo>
+# SPDX-License-Identifier: BSD-3-Clause
+
+import os
+import subprocess
+import unittest
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+from tests.common import is_posix
+from vien._main import write_shell_rc
+
+
+@unittest.skipUnless(is_posix, "not POSIX")
+class TestShellRc(unittest.TestCase):
+    def test_rewritten_only_when_changed(self):
+        with TemporaryDirectory() as td:
+            venv_dir = Path(td) / "project_venv"
+            venv_dir.mkdir()
+
+            rc_file = write_shell_rc(venv_dir, "first$ ")
+            inode = rc_file.stat().st_ino
+
+            self.assertEqual(write_shell_rc(venv_dir, "first$ "), rc_file)
+            self.assertEqual(rc_file.stat().st_ino, inode)
+
+            write_shell_rc(venv_dir, "second$ ")
+            self.assertNotEqual(rc_file.stat().st_ino, inode)
+            self.assertIn("second$ ", rc_file.read_text())
+
+    def test_activates_after_bashrc(self):
+        with TemporaryDirectory() as td:
+            home = Path(td)
+            (home / ".bashrc").write_text('export PATH="/shims:$PATH"')
+            venv_dir = home / "project_venv"
+            venv_dir.mkdir()
+            rc_file = write_shell_rc(venv_dir, "prompt$ ")
+
+            output = subprocess.check_output(
+                ['/bin/bash', '-c',
+                 f'source "{rc_file}" && echo "$PATH" && echo "$PS1"'],
+                env={**os.environ, "HOME": str(home),
+                     "PYTHONHOME": "/labuda"},
+                universal_newlines=True)
+            path, ps1 = output.splitlines()
+            self.assertTrue(path.startswith(f"{venv_dir}/bin:/shims:"))
+            self.assertEqual(ps1, "prompt$ ")
+
+
+if __name__ == "__main__":
+    unittest.main()
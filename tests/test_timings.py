@@ -0,0 +1,99 @@
+# SPDX-FileCopyrightText: (c) 2021 Artëm IG <github.com/rtmigo>
+# SPDX-License-Identifier: BSD-3-Clause
+
+import json
+import os
+import subprocess
+import sys
+import unittest
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from typing import Dict, List
+
+from tests.common import is_posix
+from vien._parsed_args import ParsedArgs, Commands
+from vien._timings import split_flag
+
+
+class TestSplitFlag(unittest.TestCase):
+    def test_before_command(self):
+        self.assertEqual(split_flag(["--timings", "path"]), (["path"], True))
+        self.assertEqual(split_flag(["-p", "x", "--timings", "run", "ls"]),
+                         (["-p", "x", "run", "ls"], True))
+
+    def test_after_command(self):
+        # the argument of the program, not the flag
+        args = ["run", "prog", "--timings"]
+        self.assertEqual(split_flag(args), (args, False))
+        # the value of -p
+        args = ["-p", "--timings", "path"]
+        self.assertEqual(split_flag(args), (args, False))
+
+    def test_parsed(self):
+        pa = ParsedArgs(["--timings", "-p", "x", "run", "ls", "--timings"])
+        self.assertEqual(pa.command, Commands.run)
+        self.assertEqual(pa.project_dir_arg, "x")
+        self.assertEqual(pa.run_args, ["ls", "--timings"])
+
+
+@unittest.skipUnless(is_posix, "not POSIX")
+class TestReport(unittest.TestCase):
+    def setUp(self):
+        self.temp = TemporaryDirectory()
+        self.project_dir = Path(self.temp.name) / "timedProject"
+        self.project_dir.mkdir()
+        self.env = {**os.environ,
+                    "VIENDIR": os.path.join(self.temp.name, "vien"),
+                    "PYTHONPATH": str(Path(__file__).parent.parent)}
+        self.env.pop("VIEN_TIMINGS", None)
+
+    def tearDown(self):
+        self.temp.cleanup()
+
+    def vien(self, args: List[str], env: Dict[str, str] = None) \
+            -> subprocess.CompletedProcess:
+        return subprocess.run([sys.executable, "-m", "vien"] + args,
+                              cwd=str(self.project_dir),
+                              env={**self.env, **(env or {})},
+                              stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                              universal_newlines=True)
+
+    def test_stderr(self):
+        cp = self.vien(["--timings", "path"])
+        self.assertEqual(cp.returncode, 0)
+        self.assertEqual(
+            cp.stdout.strip(),
+            os.path.join(self.env["VIENDIR"], "timedProject_venv"))
+        self.assertIn("parse args", cp.stderr)
+        self.assertIn("total", cp.stderr)
+
+    def test_json_with_child(self):
+        self.assertEqual(self.vien(["create"]).returncode, 0)
+        report = Path(self.temp.name) / "timings.json"
+        cp = self.vien(["run", "sh", "-c", "echo out; exit 3"],
+                       env={"VIEN_TIMINGS": str(report)})
+        # the child output and the exit code are the same
+        self.assertEqual(cp.returncode, 3)
+        self.assertEqual(cp.stdout, "out\n")
+        self.assertEqual(cp.stderr, "")
+
+        data = json.loads(report.read_text())
+        self.assertEqual(data["exit_code"], 3)
+        self.assertEqual(data["args"], ["run", "sh", "-c", "echo out; exit 3"])
+        phases = [p["phase"] for p in data["phases"]]
+        self.assertEqual(phases, ["import", "parse args", "project dir",
+                                  "venv lookup", "environment", "spawn",
+                                  "child"])
+        self.assertGreaterEqual(data["total_ms"],
+                                sum(p["ms"] for p in data["phases"]))
+
+    def test_error_exit_code(self):
+        report = Path(self.temp.name) / "timings.json"
+        cp = self.vien(["run", "true"], env={"VIEN_TIMINGS": str(report)})
+        self.assertEqual(cp.returncode, 1)
+        self.assertIn("does not exist", cp.stderr)
+        self.assertEqual(json.loads(report.read_text())["exit_code"], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,58 @@
+# SPDX-FileCopyrightText: (c) 2021 Artëm IG <github.com/rtmigo>
+# SPDX-License-Identifier: BSD-3-Clause
+
+import os
+import time
+import unittest
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+from tests.common import is_posix
+from vien._trash import remove_tree, move_to_trash, stale_entries, \
+    STALE_SECONDS
+
+
+class TestTrash(unittest.TestCase):
+    def test_remove_tree(self):
+        with TemporaryDirectory() as td:
+            outside = Path(td) / "outside"
+            outside.mkdir()
+            (outside / "keep.txt").write_text("keep")
+
+            root = Path(td) / "root"
+            for i in range(5):
+                sub = root / f"d{i}" / "sub" / "subsub"
+                sub.mkdir(parents=True)
+                for j in range(10):
+                    (sub / f"f{j}.txt").write_text("x")
+                    (sub.parent / f"f{j}.txt").write_text("x")
+            if is_posix:
+                os.symlink(str(outside), str(root / "link"))
+
+            remove_tree(root)
+
+            self.assertFalse(root.exists())
+            self.assertTrue((outside / "keep.txt").exists())
+
+    def test_move_to_trash(self):
+        with TemporaryDirectory() as td:
+            venv_dir = Path(td) / "project_venv"
+            venv_dir.mkdir()
+            trash = Path(td) / ".trash"
+
+            entry = move_to_trash(venv_dir, trash)
+            self.assertFalse(venv_dir.exists())
+            self.assertEqual(entry.parent, trash)
+            self.assertTrue(entry.name.startswith("project_venv."))
+
+            # a fresh entry is probably being removed by another process
+            self.assertEqual(stale_entries(trash), [])
+
+            old_time = int(time.time()) - STALE_SECONDS - 1
+            stale = trash / f"old_venv.{old_time}.123"
+            stale.mkdir()
+            self.assertEqual(stale_entries(trash), [stale])
+
+
+if __name__ == '__main__':
+    unittest.main()
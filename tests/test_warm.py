@@ -0,0 +1,87 @@
+# SPDX-FileCopyrightText: (c) 2021 Artëm IG <github.com/rtmigo>
+# SPDX-License-Identifier: BSD-3-Clause
+
+import json
+import os
+import signal
+import unittest
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest import mock
+
+from tests.common import is_posix
+from vien import main_entry_point
+from vien._exceptions import ChildExit
+
+
+@unittest.skipUnless(is_posix, "not POSIX")
+class TestWarmCall(unittest.TestCase):
+    def setUp(self):
+        self._td = TemporaryDirectory()
+        temp = Path(self._td.name)
+        self.vien_dir = temp / "vd"
+        self.project_dir = temp / "project"
+        self.project_dir.mkdir()
+        self.report = self.project_dir / "report.json"
+        (self.project_dir / "report.py").write_text(
+            "import json, os, sys\n"
+            f"with open({str(self.report)!r}, 'w') as f:\n"
+            "    json.dump({'argv': sys.argv, 'cwd': os.getcwd(),\n"
+            "               'server': os.getppid(),\n"
+            "               'preloaded': 'decimal' in sys.modules,\n"
+            "               'prefix': sys.prefix}, f)\n"
+            "sys.exit(int(sys.argv[1]))\n")
+
+        patcher = mock.patch.dict(os.environ, {
+            "VIENDIR": str(self.vien_dir),
+            "VIEN_WARM_PRELOAD": "decimal",
+            "VIEN_WARM_IDLE": "10"})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self._old_cwd = os.getcwd()
+        os.chdir(str(self.project_dir))
+        main_entry_point(["create"])
+
+    def tearDown(self):
+        os.chdir(self._old_cwd)
+        if self.report.exists():
+            try:
+                os.kill(json.loads(self.report.read_text())["server"],
+                        signal.SIGTERM)
+            except OSError:
+                pass
+        self._td.cleanup()
+
+    def call(self, *args: str) -> dict:
+        with self.assertRaises(ChildExit) as ce:
+            main_entry_point(["call", "--warm"] + list(args))
+        report = json.loads(self.report.read_text())
+        report["exit"] = ce.exception.code
+        return report
+
+    def test_call(self):
+        first = self.call("report.py", "5")
+        self.assertEqual(first["exit"], 5)
+        self.assertEqual(first["argv"], ["report.py", "5"])
+        self.assertEqual(os.path.realpath(first["cwd"]),
+                         os.path.realpath(str(self.project_dir)))
+        self.assertTrue(first["preloaded"])
+        self.assertEqual(os.path.realpath(first["prefix"]),
+                         os.path.realpath(
+                             str(self.vien_dir / "project_venv")))
+
+        # the same server
+        second = self.call("report.py", "0")
+        self.assertEqual(second["exit"], 0)
+        self.assertEqual(second["server"], first["server"])
+
+        # the server restarts when the packages change
+        site_packages = next(
+            (self.vien_dir / "project_venv" / "lib").glob("*/site-packages"))
+        os.utime(str(site_packages), ns=(1, 1))
+        third = self.call("report.py", "0")
+        self.assertNotEqual(third["server"], first["server"])
+
+
+if __name__ == '__main__':
+    unittest.main()
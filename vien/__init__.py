@@ -3,5 +3,27 @@
 
 from ._constants import __version__, __license__, __copyright__
 from ._common import is_posix
-from ._main import main_entry_point
 
+# the module is imported by each `vien` command, and typing takes longer to
+# import than the daemon takes to run the command
+TYPE_CHECKING = False
+if TYPE_CHECKING:
+    from typing import List, Optional
+
+
+def main_entry_point(args: "Optional[List[str]]" = None):
+    import sys
+    from . import _timings
+    if _timings.requested(sys.argv[1:] if args is None else args):
+        # measuring this process, so the daemon is not used
+        _timings.start()
+    elif args is None:
+        # A running daemon runs the command line without importing the
+        # rest of vien
+        from ._client import run_in_daemon
+        run_in_daemon(sys.argv[1:])
+    # The command-line machinery is imported only when it is really needed,
+    # so `import vien` stays cheap
+    from ._main import main_entry_point as _main_entry_point
+    _timings.mark("import")
+    _main_entry_point(args)
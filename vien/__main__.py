@@ -1,7 +1,7 @@
 # SPDX-FileCopyrightText: (c) 2021 Artëm IG <github.com/rtmigo>
 # SPDX-License-Identifier: BSD-3-Clause
 
-from vien._main import main_entry_point
+from vien import main_entry_point
 
 if __name__ == "__main__":
     main_entry_point()
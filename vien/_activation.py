@@ -0,0 +1,124 @@
+# SPDX-FileCopyrightText: (c) 2021 Artëm IG <github.com/rtmigo>
+# SPDX-License-Identifier: BSD-3-Clause
+
+"""The activation manifest of the environment.
+
+`create` writes the VENV/vien_activation.json with what the commands need to
+run a program in the environment: the interpreter, the bin dir, the value
+of $VIRTUAL_ENV, the version of the base interpreter and the site-packages
+dirs. So the commands read one small file instead of probing the files of
+the environment.
+
+The manifest is valid while the pyvenv.cfg and the bin dir are not
+modified. Otherwise, or if there is no manifest (the environment was created
+by an older vien), it is rebuilt and saved by the command that needs it.
+"""
+
+import os
+from pathlib import Path
+from typing import Any, Dict, List, NamedTuple, Optional
+
+from vien._cache import load_json, save_json
+
+FORMAT = 1
+MANIFEST_NAME = "vien_activation.json"
+
+
+class Activation(NamedTuple):
+    venv_dir: Path
+    python: Path
+    bin_dir: Path
+    virtual_env: str
+    base_version: Optional[str]
+    module_roots: List[Path]  # the site-packages dirs
+
+
+def manifest_file(venv_dir: Path) -> Path:
+    return venv_dir / MANIFEST_NAME
+
+
+def _stamp(venv_dir: Path) -> List[Any]:
+    """Changes when the environment is recreated in place, or when the
+    programs are installed to the bin dir or removed from it."""
+    from vien._main import venv_dir_to_bin_dir
+    result: List[Any] = []
+    try:
+        st = os.stat(str(venv_dir / "pyvenv.cfg"))
+        result.append([st.st_ino, st.st_mtime_ns])
+    except OSError:
+        result.append(None)
+    try:
+        result.append(os.stat(str(venv_dir_to_bin_dir(venv_dir))).st_mtime_ns)
+    except OSError:
+        result.append(None)
+    return result
+
+
+def _site_packages(venv_dir: Path) -> List[Path]:
+    if os.name == "nt":
+        candidates = [venv_dir / "Lib" / "site-packages"]
+    else:
+        # lib/python3.11/site-packages, lib/pypy3.9/site-packages
+        lib = venv_dir / "lib"
+        try:
+            names = sorted(os.listdir(str(lib)))
+        except OSError:
+            names = []
+        candidates = [lib / n / "site-packages" for n in names]
+    return [c for c in candidates if c.is_dir()]
+
+
+def build_activation(venv_dir: Path) -> Activation:
+    from vien._main import venv_dir_to_bin_dir, venv_dir_to_python_exe, \
+        venv_base_version
+    return Activation(venv_dir=venv_dir,
+                      python=venv_dir_to_python_exe(venv_dir),
+                      bin_dir=venv_dir_to_bin_dir(venv_dir),
+                      virtual_env=str(venv_dir),
+                      base_version=venv_base_version(venv_dir),
+                      module_roots=_site_packages(venv_dir))
+
+
+def _to_json(activation: Activation, stamp: List[Any]) -> Dict[str, Any]:
+    return {"format": FORMAT,
+            "stamp": stamp,
+            "venv_dir": str(activation.venv_dir),
+            "python": str(activation.python),
+            "bin_dir": str(activation.bin_dir),
+            "virtual_env": activation.virtual_env,
+            "base_version": activation.base_version,
+            "module_roots": [str(p) for p in activation.module_roots]}
+
+
+def _from_json(data: Dict[str, Any]) -> Activation:
+    return Activation(venv_dir=Path(data["venv_dir"]),
+                      python=Path(data["python"]),
+                      bin_dir=Path(data["bin_dir"]),
+                      virtual_env=data["virtual_env"],
+                      base_version=data["base_version"],
+                      module_roots=[Path(p) for p in data["module_roots"]])
+
+
+def write_activation(venv_dir: Path) -> Activation:
+    """Builds the manifest of the environment and saves it."""
+    activation = build_activation(venv_dir)
+    save_json(manifest_file(venv_dir),
+              _to_json(activation, _stamp(venv_dir)))
+    return activation
+
+
+def load_activation(venv_dir: Path) -> Optional[Activation]:
+    """Returns the manifest of the environment, rebuilding it if needed.
+    Returns None if the environment does not exist."""
+    data = load_json(manifest_file(venv_dir))
+    if isinstance(data, dict) \
+            and data.get("format") == FORMAT \
+            and data.get("venv_dir") == str(venv_dir) \
+            and data.get("stamp") == _stamp(venv_dir):
+        try:
+            return _from_json(data)
+        except (KeyError, TypeError):
+            pass
+    if not venv_dir.exists():
+        return None
+    return write_activation(venv_dir)
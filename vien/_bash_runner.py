@@ -1,103 +1,267 @@
 # SPDX-FileCopyrightText: (c) 2021 Artëm IG <github.com/rtmigo>
 # SPDX-License-Identifier: BSD-3-Clause
 
-import subprocess
-import time
-from subprocess import Popen, TimeoutExpired, CalledProcessError, \
-    CompletedProcess, PIPE
+"""Running the child processes.
 
-from vien._common import need_posix
+The processes are run by asyncio. So the output is read while the process
+runs, the input is written as a stream without blocking, and one vien
+process can run many children at once (see _parallel.py). The synchronous
+functions run the event loop for a single process, or do without it when
+nothing is read or written while the process runs.
+"""
 
+import asyncio
+import os
+import signal
+import sys
+from subprocess import CalledProcessError, CompletedProcess, \
+    TimeoutExpired, PIPE, Popen
+from typing import Awaitable, Callable, Iterable, List, Optional, Union, \
+    TypeVar
 
-def run_as_bash_script(script: str, timeout: float = None,
-                       input_delay: float = None,
-                       capture_output: bool = False,
-                       input: bytes = None,
-                       **kwargs
-                       ) -> subprocess.CompletedProcess:
-    """Runs the provided string as a .sh script."""
+from vien._common import need_posix, is_windows
 
-    need_posix()
+OutputCallback = Callable[[bytes], None]
 
-    # we need executable='/bin/bash' for Ubuntu 18.04, it will run '/bin/sh'
-    # otherwise. For MacOS 10.13 it seems to be optional
-    return _run_with_input_delay(script, shell=True, executable='/bin/bash',
-                                 timeout=timeout,
-                                 input=input,
-                                 capture_output=capture_output,
-                                 input_delay=input_delay,
-                                 **kwargs)
-
-
-def _run_with_input_delay(*popenargs, input_delay: float = None,
-                          input=None, timeout: float = None,
-                          check: bool = False,
-                          capture_output: bool = False,
-                          **kwargs):
-    """Basically the same as subprocess.run, but accepts input_delay
-    parameter."""
-
-    # This is almost an exact copy of subprocess.run (as of 2021-03-06).
-    # SPDX-FileCopyrightText: 2003-2005 Peter Astrand <astrand@lysator.liu.se>
-    # https://github.com/python/cpython/blob/master/Lib/subprocess.py
-
-    # START of insert from another portion of subprocess.py
+# bytes or the chunks of bytes
+Input = Union[bytes, Iterable[bytes]]
+
+T = TypeVar('T')
+
+# the same as subprocess.run waits for the child after Ctrl+C
+_SIGINT_WAIT_SECONDS = 0.25
+
+# the arguments of run_async that need the event loop
+_STREAMING_ARGS = ('on_stdout', 'on_stderr', 'on_start', 'input_delay')
+
+
+def run_loop(coroutine: Awaitable[T]) -> T:
+    """Runs the coroutine in a new event loop."""
+    if is_windows and sys.version_info < (3, 8):
+        # only the proactor loop runs subprocesses on Windows, and it is
+        # not the default before 3.8
+        asyncio.set_event_loop_policy(
+            asyncio.WindowsProactorEventLoopPolicy())  # type: ignore
+    return asyncio.run(coroutine)  # type: ignore
+
+
+async def _settle(future: asyncio.Future):
+    """Cancels the future and waits until it is done. Its exception is
+    retrieved, otherwise Python 3.7 and 3.8 print that the CancelledError
+    of the gather was never retrieved."""
+    future.cancel()
+    await asyncio.wait([future])
+    if not future.cancelled():
+        future.exception()
+
+
+def _kill(process: Union[asyncio.subprocess.Process, Popen], group: bool):
+    try:
+        if group:
+            os.killpg(process.pid, signal.SIGKILL)
+        else:
+            process.kill()
+    except ProcessLookupError:
+        pass
+
+
+async def _pump(stream: asyncio.StreamReader, chunks: Optional[List[bytes]],
+                callback: Optional[OutputCallback]):
+    while True:
+        data = await stream.read(64 * 1024)
+        if not data:
+            break
+        if callback is not None:
+            callback(data)
+        if chunks is not None:
+            chunks.append(data)
+
+
+async def _feed(stdin: asyncio.StreamWriter, input: Input,
+                input_delay: Optional[float]):
+    if input_delay:
+        await asyncio.sleep(input_delay)
     try:
-        import msvcrt
-        import _winapi
-        _mswindows = True
-    except ModuleNotFoundError:
-        _mswindows = False
-    # END of insert
+        for chunk in [input] if isinstance(input, bytes) else input:
+            stdin.write(chunk)
+            await stdin.drain()
+    except (BrokenPipeError, ConnectionResetError):
+        # the process exited without reading everything
+        pass
+    finally:
+        stdin.close()
 
+
+def _set_pipes(kwargs: dict, input: Optional[Input],
+               timeout: Optional[float], capture_output: bool,
+               on_stdout: Optional[OutputCallback] = None,
+               on_stderr: Optional[OutputCallback] = None) -> bool:
+    """Sets the pipes and the new session in the arguments of the process.
+    Returns True if the process is to be run in its own process group."""
     if input is not None:
         if kwargs.get('stdin') is not None:
             raise ValueError('stdin and input arguments may not both be used.')
         kwargs['stdin'] = PIPE
-
-    if capture_output:
-        if kwargs.get('stdout') is not None or kwargs.get('stderr') is not None:
-            raise ValueError('stdout and stderr arguments may not be used '
-                             'with capture_output.')
+    if capture_output or on_stdout is not None:
+        if kwargs.get('stdout') is not None:
+            raise ValueError('stdout argument may not be used with '
+                             'capture_output or on_stdout.')
         kwargs['stdout'] = PIPE
+    if capture_output or on_stderr is not None:
+        if kwargs.get('stderr') is not None:
+            raise ValueError('stderr argument may not be used with '
+                             'capture_output or on_stderr.')
         kwargs['stderr'] = PIPE
+    group = timeout is not None and not is_windows
+    if group:
+        kwargs['start_new_session'] = True
+    return group
+
 
-    with Popen(*popenargs, **kwargs) as process:
+async def run_async(args: Union[str, List[str]],
+                    shell: bool = False,
+                    input: Optional[Input] = None,
+                    input_delay: Optional[float] = None,
+                    timeout: Optional[float] = None,
+                    capture_output: bool = False,
+                    check: bool = False,
+                    on_stdout: Optional[OutputCallback] = None,
+                    on_stderr: Optional[OutputCallback] = None,
+                    on_start: Optional[Callable[[], None]] = None,
+                    **kwargs) -> CompletedProcess:
+    """Runs the process like `subprocess.run`.
+
+    The output is passed to `on_stdout` and `on_stderr` as soon as it is
+    read, and also collected into the result with `capture_output`. The
+    `input` is written to stdin after `input_delay` seconds. The
+    `on_start` is called when the process is started.
+
+    With the `timeout`, the process is started in a new process group
+    (POSIX). So when the time is out, its children are killed too.
+    """
+    group = _set_pipes(kwargs, input, timeout, capture_output,
+                       on_stdout, on_stderr)
+    if shell:
+        assert isinstance(args, str)
+        process = await asyncio.create_subprocess_shell(args, **kwargs)
+    else:
+        process = await asyncio.create_subprocess_exec(*args, **kwargs)
+    if on_start is not None:
+        on_start()
+
+    stdout: Optional[List[bytes]] = [] if capture_output else None
+    stderr: Optional[List[bytes]] = [] if capture_output else None
+    tasks = [process.wait()]
+    if process.stdout is not None:
+        tasks.append(_pump(process.stdout, stdout, on_stdout))
+    if process.stderr is not None:
+        tasks.append(_pump(process.stderr, stderr, on_stderr))
+    if input is not None:
+        assert process.stdin is not None
+        tasks.append(_feed(process.stdin, input, input_delay))
+
+    def joined(chunks: Optional[List[bytes]]) -> Optional[bytes]:
+        return b"".join(chunks) if chunks is not None else None
+
+    gathered = asyncio.gather(*tasks)
+    try:
+        await asyncio.wait_for(gathered, timeout)
+    except asyncio.TimeoutError:
+        _kill(process, group)
+        await process.wait()
+        await _settle(gathered)
+        raise TimeoutExpired(args, timeout,  # type: ignore
+                             output=joined(stdout), stderr=joined(stderr))
+    except BaseException:
+        # cancelled, including by Ctrl+C. The child got SIGINT too,
+        # and may exit by itself
+        try:
+            await asyncio.wait_for(process.wait(), _SIGINT_WAIT_SECONDS)
+        except BaseException:
+            _kill(process, group)
         try:
-            # START of modified code
-            if input is not None and input_delay:
-                time.sleep(input_delay)
-            # END of modified code
+            await _settle(gathered)
+        except BaseException:
+            pass
+        raise
+
+    exit_code = process.returncode
+    if exit_code is None:
+        raise RuntimeError("The process was not terminated.")
+    if check and exit_code:
+        raise CalledProcessError(exit_code, args,
+                                 output=joined(stdout), stderr=joined(stderr))
+    return CompletedProcess(args, exit_code, joined(stdout), joined(stderr))
 
+
+def _run_blocking(args: Union[str, List[str]],
+                  shell: bool = False,
+                  input: Optional[bytes] = None,
+                  timeout: Optional[float] = None,
+                  capture_output: bool = False,
+                  check: bool = False,
+                  **kwargs) -> CompletedProcess:
+    """Runs the process like `subprocess.run`, but kills the whole process
+    group when the time is out, as `run_async` does."""
+    group = _set_pipes(kwargs, input, timeout, capture_output)
+    with Popen(args, shell=shell, **kwargs) as process:
+        try:
             stdout, stderr = process.communicate(input, timeout=timeout)
-        except TimeoutExpired as exc:
-            process.kill()
-            if _mswindows:
-                # Windows accumulates the output in a single blocking
-                # read() call run on child threads, with the timeout
-                # being done in a join() on those threads.  communicate()
-                # _after_ kill() is required to collect that and add it
-                # to the exception.
-                exc.stdout, exc.stderr = process.communicate()
-            else:
-                # POSIX _communicate already populated the output so
-                # far into the TimeoutExpired exception.
-                process.wait()
+        except TimeoutExpired as e:
+            _kill(process, group)
+            e.output, e.stderr = process.communicate()
             raise
-        except:  # Including KeyboardInterrupt, communicate handled that.
+        except BaseException:
+            # communicate has waited for the child after Ctrl+C
             process.kill()
-            # We don't call process.wait() as .__exit__ does that for us.
             raise
+    exit_code = process.returncode
+    if check and exit_code:
+        raise CalledProcessError(exit_code, args,
+                                 output=stdout, stderr=stderr)
+    return CompletedProcess(args, exit_code, stdout, stderr)
 
-        exit_code = process.poll()
 
-        # START of modified code
-        if exit_code is None:
-            raise RuntimeError("The process was not terminated.")
-        # END of modified code
+def run_process(args: Union[str, List[str]], **kwargs) -> CompletedProcess:
+    """The synchronous `run_async`.
+
+    Without the callbacks and the streamed input, the process is run
+    without the event loop. Python 3.7 cannot run the subprocesses of the
+    event loop outside the main thread, and the blocking run can."""
+    streaming = {name: kwargs.pop(name, None) for name in _STREAMING_ARGS}
+    input = kwargs.get('input')
+    if all(v is None for v in streaming.values()) \
+            and (input is None or isinstance(input, bytes)):
+        return _run_blocking(args, **kwargs)
+    return run_loop(run_async(args, **streaming, **kwargs))
+
+
+def run_as_bash_script(script: str, timeout: Optional[float] = None,
+                       input_delay: Optional[float] = None,
+                       capture_output: bool = False,
+                       input: Optional[bytes] = None,
+                       **kwargs
+                       ) -> CompletedProcess:
+    """Runs the provided string as a .sh script."""
+
+    need_posix()
+
+    # we need executable='/bin/bash' for Ubuntu 18.04, it will run '/bin/sh'
+    # otherwise. For MacOS 10.13 it seems to be optional
+    return run_process(script, shell=True, executable='/bin/bash',
+                       timeout=timeout,
+                       input=input,
+                       capture_output=capture_output,
+                       input_delay=input_delay,
+                       **kwargs)
 
-        if check and exit_code:
-            raise CalledProcessError(exit_code, process.args,
-                                     output=stdout, stderr=stderr)
 
-    return CompletedProcess(process.args, exit_code, stdout, stderr)
+def run_with_input(args: List[str],
+                   input: Optional[bytes] = None,
+                   input_delay: Optional[float] = None,
+                   timeout: Optional[float] = None,
+                   **kwargs) -> CompletedProcess:
+    """Runs the program (without a shell), writing the `input` to its
+    stdin after `input_delay` seconds."""
+    return run_process(args, input=input, input_delay=input_delay,
+                       timeout=timeout, **kwargs)
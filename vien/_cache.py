@@ -0,0 +1,48 @@
+# SPDX-FileCopyrightText: (c) 2021 Artëm IG <github.com/rtmigo>
+# SPDX-License-Identifier: BSD-3-Clause
+
+import os
+from pathlib import Path
+from typing import Any, Optional
+
+
+def cache_dir(vien_dir: Path) -> Path:
+    # The names of virtual environments always end with "_venv", so this
+    # name does not collide with them
+    return vien_dir / ".cache"
+
+
+def load_json(file: Path) -> Optional[Any]:
+    """Returns the data saved by `save_json`, or None if the file does not
+    exist or cannot be read."""
+    import json
+    try:
+        return json.loads(file.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+
+
+def save_json(file: Path, data: Any) -> None:
+    """Writes the file atomically, so concurrent readers never see it
+    half-written. Errors are ignored: failing to update a cache must not
+    fail the command."""
+    import json
+    temp = file.with_name(f"{file.name}.{os.getpid()}.tmp")
+    try:
+        file.parent.mkdir(parents=True, exist_ok=True)
+        temp.write_text(json.dumps(data), encoding="utf-8")
+        os.replace(str(temp), str(file))
+    except OSError:
+        try:
+            temp.unlink()
+        except OSError:
+            pass
+
+
+def mtime_ns(file: Path) -> Optional[int]:
+    """Returns the modification time of the file, or None if it does not
+    exist."""
+    try:
+        return file.stat().st_mtime_ns
+    except OSError:
+        return None
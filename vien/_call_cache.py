@@ -0,0 +1,89 @@
+# SPDX-FileCopyrightText: (c) 2021 Artëm IG <github.com/rtmigo>
+# SPDX-License-Identifier: BSD-3-Clause
+
+import os
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional
+
+from vien._cache import load_json, save_json
+
+
+class ResolvedCall(NamedTuple):
+    """The result of resolving `vien call` arguments to the paths."""
+    project_dir: Path
+    venv_dir: Path
+    python_exe: Path
+    module_name: Optional[str]  # not None for `call -m`
+
+
+def _stamp(python_exe: Path) -> Optional[List[int]]:
+    # The `python_exe` is usually a symlink inside the venv. We do not
+    # follow it: recreating the venv creates a new symlink with another
+    # inode, even if the base interpreter is the same
+    try:
+        st = os.lstat(str(python_exe))
+    except OSError:
+        return None
+    return [st.st_ino, st.st_mtime_ns]
+
+
+class CallCache:
+    """Maps the arguments of the `vien call` (script path, the value of -p,
+    whether it is run with -m) to the resolved paths, so the shebang scripts
+    do not redo the path work on each launch.
+
+    An entry is valid while the script exists, and the interpreter of the
+    virtual environment is the same file.
+    """
+
+    MAX_ENTRIES = 1000
+
+    def __init__(self, file: Path):
+        self.file = file
+        self._entries: Optional[Dict[str, dict]] = None
+
+    @staticmethod
+    def key(script: str, project_dir_arg: Optional[str],
+            vien_dir: Path, module: bool = False) -> str:
+        script = os.path.abspath(script)
+        if project_dir_arg is None:
+            # without -p, the project dir is the working dir
+            project_dir_arg = f"cwd:{os.getcwd()}"
+        # the module name is resolved only for -m
+        return "\n".join((script, project_dir_arg, str(vien_dir),
+                          "-m" if module else ""))
+
+    @property
+    def entries(self) -> Dict[str, dict]:
+        if self._entries is None:
+            loaded = load_json(self.file)
+            self._entries = loaded if isinstance(loaded, dict) else dict()
+        return self._entries
+
+    def get(self, key: str) -> Optional[ResolvedCall]:
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        script = key.partition("\n")[0]
+        if not os.path.exists(script):
+            return None
+        python_exe = Path(entry["python_exe"])
+        if _stamp(python_exe) != entry["stamp"]:
+            return None
+        return ResolvedCall(project_dir=Path(entry["project_dir"]),
+                            venv_dir=Path(entry["venv_dir"]),
+                            python_exe=python_exe,
+                            module_name=entry["module_name"])
+
+    def put(self, key: str, resolved: ResolvedCall):
+        entries = self.entries
+        entries.pop(key, None)
+        while len(entries) >= self.MAX_ENTRIES:
+            # dicts keep the insertion order, so this is the oldest entry
+            del entries[next(iter(entries))]
+        entries[key] = {"project_dir": str(resolved.project_dir),
+                        "venv_dir": str(resolved.venv_dir),
+                        "python_exe": str(resolved.python_exe),
+                        "module_name": resolved.module_name,
+                        "stamp": _stamp(resolved.python_exe)}
+        save_json(self.file, entries)
@@ -0,0 +1,62 @@
+# SPDX-FileCopyrightText: (c) 2021 Artëm IG <github.com/rtmigo>
+# SPDX-License-Identifier: BSD-3-Clause
+
+"""The runner for `vien call --same-interpreter`.
+
+This file is run as a script by the interpreter of the virtual environment,
+so it imports nothing but the standard library. It runs the files and
+modules one after another, as if each one was run by `python FILE ARGS` or
+`python -m MODULE ARGS`.
+
+The first argument is a JSON list of {"file": ..., "args": [...]} or
+{"module": ..., "args": [...]}. The second is "fresh" or "shared". With
+"shared", each script starts with the global variables left by the
+previous one.
+
+A script that exits with a non-zero code stops the sequence, and the
+interpreter exits with that code.
+"""
+
+import json
+import os
+import runpy
+import sys
+
+
+def _is_dunder(name: str) -> bool:
+    return name.startswith("__") and name.endswith("__")
+
+
+def run_sequence(plan: list, fresh: bool):
+    # the dir of this script is not the place to import modules from
+    if sys.path and os.path.abspath(sys.path[0]) == \
+            os.path.dirname(os.path.abspath(__file__)):
+        del sys.path[0]
+    base_path = list(sys.path)
+
+    namespace: dict = {}
+    for item in plan:
+        module = item.get("module")
+        first = os.getcwd() if module \
+            else os.path.dirname(os.path.abspath(item["file"]))
+        sys.path[:] = [first] + base_path
+        sys.argv = [module or item["file"]] + item["args"]
+        init_globals = None if fresh \
+            else {k: v for k, v in namespace.items() if not _is_dunder(k)}
+        try:
+            if module:
+                namespace = runpy.run_module(module, init_globals,
+                                             run_name="__main__",
+                                             alter_sys=True)
+            else:
+                namespace = runpy.run_path(item["file"], init_globals,
+                                           run_name="__main__")
+        except SystemExit as e:
+            if e.code is not None and e.code != 0:
+                raise
+            # sys.exit(0) ends only this script. Its globals are lost
+        sys.stdout.flush()
+
+
+if __name__ == "__main__":
+    run_sequence(json.loads(sys.argv[1]), fresh=sys.argv[2] == "fresh")
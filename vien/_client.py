@@ -0,0 +1,148 @@
+# SPDX-FileCopyrightText: (c) 2021 Artëm IG <github.com/rtmigo>
+# SPDX-License-Identifier: BSD-3-Clause
+
+"""The thin client of the vien daemon (see _daemon.py), and the client side
+of the protocol, that is also used by `vien call --warm` (see _warm.py).
+
+Each `vien` command imports this module before the rest of vien. Talking to
+the daemon only saves time if the client imports next to nothing. So there
+is no typing and no pathlib here, and the sockets and signals are handled
+by the C modules _socket and _signal: the socket and signal modules import
+enum, that takes longer than the daemon takes to run `vien path`.
+"""
+
+import os
+import sys
+
+from vien._common import get_vien_dir_str
+
+TYPE_CHECKING = False
+if TYPE_CHECKING:
+    from typing import Dict, Iterator, List, Optional
+
+# the limit of sockaddr_un.sun_path is 104 bytes on macOS, 108 on Linux
+MAX_SOCKET_PATH = 100
+
+_FORWARDED_SIGNALS = ["SIGINT", "SIGTERM", "SIGHUP", "SIGQUIT", "SIGUSR1",
+                      "SIGUSR2", "SIGWINCH"]
+
+
+def daemon_socket_path(vien_dir: str) -> "Optional[str]":
+    """Returns the socket path of the daemon, or None if the path is too
+    long for a Unix socket. Only the user can enter the directory of the
+    socket."""
+    path = os.path.join(vien_dir, ".daemon", "daemon.sock")
+    if len(os.fsencode(path)) > MAX_SOCKET_PATH:
+        return None
+    return path
+
+
+def send_request(sock, request: "Dict"):
+    import array
+    import json
+    import struct
+    import _socket
+    body = json.dumps(request).encode("utf-8")
+    fds = array.array("i", [0, 1, 2])
+    sock.sendmsg([struct.pack(">I", len(body)) + body],
+                 [(_socket.SOL_SOCKET, _socket.SCM_RIGHTS, fds.tobytes())])
+
+
+def exchange(sock, request: "Dict") -> "Iterator[Dict]":
+    """Sends the request with the stdio descriptors and yields the
+    replies."""
+    import json
+    send_request(sock, request)
+    buffer = b""
+    while True:
+        chunk = sock.recv(65536)
+        if not chunk:
+            return
+        *lines, buffer = (buffer + chunk).split(b"\n")
+        for line in lines:
+            yield json.loads(line.decode("utf-8"))
+
+
+def forward_signals(pid: int) -> "Dict":
+    """Makes the signals sent to vien (like Ctrl+C) go to the child.
+    Returns the old handlers."""
+    import _signal
+
+    def forward(signum, frame):
+        try:
+            os.kill(pid, signum)
+        except OSError:
+            pass
+
+    old_handlers = dict()
+    for name in _FORWARDED_SIGNALS:
+        signum = getattr(_signal, name, None)
+        if signum is not None:
+            old_handlers[signum] = _signal.signal(signum, forward)
+    return old_handlers
+
+
+def restore_signals(old_handlers: "Dict"):
+    import _signal
+    for signum, handler in old_handlers.items():
+        _signal.signal(signum, handler)
+
+
+def _connect(path: str):
+    import _socket
+    sock = _socket.socket(_socket.AF_UNIX, _socket.SOCK_STREAM)
+    try:
+        sock.connect(path)
+    except OSError:
+        sock.close()
+        return None
+    return sock
+
+
+def run_in_daemon(args: "List[str]"):
+    """Runs the command in a child of the daemon. Then the function does not
+    return: it exits with the exit code of the command, or replaces the
+    process with the program that the command runs.
+
+    Returns if the daemon is not running or refuses the request. The
+    command is not started then, and must be run in this process."""
+    if os.name != "posix" or os.environ.get("VIEN_NO_DAEMON") \
+            or "daemon" in args:
+        return
+    path = daemon_socket_path(get_vien_dir_str())
+    if path is None or not os.path.exists(path):
+        return
+
+    from vien._constants import __version__
+
+    sock = _connect(path)
+    if sock is None:
+        # the socket of a killed daemon
+        return
+    # the daemon runs the commands with its own interpreter, so it refuses
+    # the clients started by another one
+    request = {"version": __version__, "python": sys.executable,
+               "args": args, "argv0": sys.argv[0], "cwd": os.getcwd(),
+               "env": dict(os.environ)}
+    old_handlers: "Dict" = dict()
+    started = False
+    try:
+        for reply in exchange(sock, request):
+            if "pid" in reply:
+                started = True
+                old_handlers = forward_signals(reply["pid"])
+            elif "exec" in reply:
+                restore_signals(old_handlers)
+                executable, exec_args, env = reply["exec"]
+                os.execve(executable, exec_args, env)
+            elif "exit" in reply:
+                raise SystemExit(reply["exit"])
+            elif reply.get("restart") or reply.get("refused"):
+                # another version of vien or another interpreter
+                return
+    finally:
+        sock.close()
+        restore_signals(old_handlers)
+    if started:
+        raise SystemExit("The vien daemon closed the connection "
+                         "unexpectedly.")
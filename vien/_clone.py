@@ -0,0 +1,207 @@
+# SPDX-FileCopyrightText: (c) 2021 Artëm IG <github.com/rtmigo>
+# SPDX-License-Identifier: BSD-3-Clause
+
+"""Creating virtual environments by cloning a pristine template instead of
+running `python -m venv`.
+
+Most of the `python -m venv` time is spent by `ensurepip`. But a fresh
+environment created by the same interpreter always has the same files,
+except for a few that contain the path to the environment. So we keep one
+template environment per interpreter, copy it, and fix the paths.
+"""
+
+import errno
+import os
+import shutil
+import subprocess
+import sys
+from pathlib import Path
+from typing import Optional
+
+# ioctl request number from <linux/fs.h>
+_FICLONE = 0x40049409
+
+
+def interpreter_key(exe: str) -> str:
+    """Returns a string, that identifies the interpreter binary. It changes
+    when the interpreter is moved or updated."""
+    import hashlib
+    real = os.path.realpath(exe)
+    mtime = os.stat(real).st_mtime_ns
+    digest = hashlib.sha1(f"{real}\n{mtime}".encode()).hexdigest()[:16]
+    return f"{os.path.basename(real)}-{digest}"
+
+
+def _location_dependent_files(venv_dir: Path):
+    """Files that contain the absolute path of the virtual environment:
+    pyvenv.cfg, the activate scripts and the shebangs of console
+    scripts. All of them are in the bin/Scripts directory."""
+    yield venv_dir / "pyvenv.cfg"
+    for bin_name in ("bin", "Scripts"):
+        bin_dir = venv_dir / bin_name
+        if not bin_dir.exists():
+            continue
+        for entry in os.scandir(str(bin_dir)):
+            if entry.is_file(follow_symlinks=False):
+                yield Path(entry.path)
+
+
+def relocate_venv(venv_dir: Path, old_dir: Path,
+                  new_dir: Optional[Path] = None):
+    """Fixes the files of the environment located in `venv_dir`. The
+    environment was created in `old_dir`, but will be used in `new_dir`
+    (by default, in the `venv_dir`).
+
+    Each file is replaced rather than modified in place, so the files
+    linked with the template stay intact."""
+    if new_dir is None:
+        new_dir = venv_dir
+    replacements = [
+        (str(old_dir), str(new_dir)),
+        # The default prompt is the basename of the environment dir. It is
+        # written as "(name)" or as a shell-quoted word, depending on the
+        # Python version. The old names are temporary names unique enough
+        # to be replaced anywhere
+        (old_dir.name, new_dir.name)]
+    for file in _location_dependent_files(venv_dir):
+        try:
+            data = file.read_bytes()
+        except OSError:
+            continue
+        new_data = data
+        for old, new in replacements:
+            new_data = new_data.replace(old.encode(), new.encode())
+        if new_data == data:
+            continue
+        temp = file.with_name(f".{file.name}.relocating")
+        temp.write_bytes(new_data)
+        shutil.copymode(str(file), str(temp))
+        os.replace(str(temp), str(file))
+
+
+class _FileCloner:
+    """Copies files as cheaply as the filesystem allows."""
+
+    def __init__(self):
+        # FICLONE is Linux-only. It works on Btrfs, XFS and some others
+        self.reflinks_supported = sys.platform.startswith("linux")
+        self.hardlinks_supported = True
+
+    def _reflink(self, src: str, dst: str) -> bool:
+        import fcntl
+        src_fd = os.open(src, os.O_RDONLY)
+        try:
+            dst_fd = os.open(dst, os.O_WRONLY | os.O_CREAT | os.O_EXCL,
+                             os.stat(src).st_mode & 0o7777)
+            try:
+                fcntl.ioctl(dst_fd, _FICLONE, src_fd)
+                return True
+            except OSError as e:
+                if e.errno in (errno.EOPNOTSUPP, errno.EXDEV, errno.EINVAL,
+                               errno.ENOTTY, errno.EBADF, errno.ENOSYS):
+                    # the filesystem cannot do it. Do not try again
+                    self.reflinks_supported = False
+                    os.close(dst_fd)
+                    dst_fd = -1
+                    os.unlink(dst)
+                    return False
+                raise
+            finally:
+                if dst_fd >= 0:
+                    os.close(dst_fd)
+        finally:
+            os.close(src_fd)
+
+    def clone(self, src: str, dst: str, immutable: bool):
+        if self.reflinks_supported and self._reflink(src, dst):
+            shutil.copystat(src, dst)
+            return
+        if immutable and self.hardlinks_supported:
+            try:
+                os.link(src, dst)
+                return
+            except OSError:
+                self.hardlinks_supported = False
+        shutil.copy2(src, dst)
+
+
+def clone_tree(src_dir: Path, dst_dir: Path):
+    """Copies the environment from `src_dir` to `dst_dir` (that must not
+    exist). Uses reflinks (copy-on-write) where the filesystem supports
+    them. Otherwise uses hardlinks for the installed packages, and plain
+    copies for everything else.
+
+    The packages are "immutable": pip never modifies their files in place,
+    it removes the old files and creates new ones. So the hardlinked files
+    of the template stay intact.
+    """
+    cloner = _FileCloner()
+    src_root = str(src_dir)
+    for dir_path, dir_names, file_names in os.walk(src_root):
+        rel = os.path.relpath(dir_path, src_root)
+        target_dir = os.path.normpath(os.path.join(str(dst_dir), rel))
+        os.mkdir(target_dir)
+        immutable = "site-packages" in rel.split(os.sep)
+
+        for name in dir_names + file_names:
+            src = os.path.join(dir_path, name)
+            dst = os.path.join(target_dir, name)
+            if os.path.islink(src):
+                os.symlink(os.readlink(src), dst)
+                if name in dir_names:
+                    # os.walk does not follow the links, but lists them
+                    # as directories
+                    dir_names.remove(name)
+            elif name in file_names:
+                cloner.clone(src, dst, immutable=immutable)
+
+        shutil.copystat(dir_path, target_dir)
+
+
+def create_with_venv_module(exe: str, venv_dir: Path) -> bool:
+    return subprocess.run([exe, "-m", "venv", str(venv_dir)]).returncode == 0
+
+
+def get_template(exe: str, templates_dir: Path) -> Optional[Path]:
+    """Returns the template environment for the interpreter, creating it
+    if needed. Returns None if the environment cannot be created."""
+    template = templates_dir / interpreter_key(exe)
+    if template.exists():
+        return template
+
+    # The template is created under a temporary name and renamed when
+    # complete, so a half-created template is never used
+    templates_dir.mkdir(parents=True, exist_ok=True)
+    temp = templates_dir / f".{template.name}.{os.getpid()}.tmp"
+    if temp.exists():
+        shutil.rmtree(str(temp))
+    if not create_with_venv_module(exe, temp):
+        shutil.rmtree(str(temp), ignore_errors=True)
+        return None
+    relocate_venv(temp, old_dir=temp, new_dir=template)
+    try:
+        os.rename(str(temp), str(template))
+    except OSError:
+        # another process has created the template at the same time
+        shutil.rmtree(str(temp), ignore_errors=True)
+        if not template.exists():
+            raise
+    return template
+
+
+def clone_from_template(exe: str, templates_dir: Path,
+                        venv_dir: Path,
+                        new_dir: Optional[Path] = None) -> bool:
+    """Creates the environment `venv_dir` by cloning the template for the
+    interpreter. The environment is fixed to be used in `new_dir` (by
+    default, in the `venv_dir`). Returns False if it failed."""
+    template = get_template(exe, templates_dir)
+    if template is None:
+        return False
+    try:
+        clone_tree(template, venv_dir)
+        relocate_venv(venv_dir, old_dir=template, new_dir=new_dir)
+    except OSError:
+        shutil.rmtree(str(venv_dir), ignore_errors=True)
+        return False
+    return True
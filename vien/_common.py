@@ -4,6 +4,12 @@
 
 import os
 
+# pathlib is imported by get_vien_dir itself, so the client of the daemon
+# does not pay for it (see _client.py)
+TYPE_CHECKING = False
+if TYPE_CHECKING:
+    from pathlib import Path
+
 is_windows = os.name == 'nt'
 is_posix = os.name == 'posix'
 
@@ -23,3 +29,26 @@ def need_posix():
 def need_windows():
     if not is_windows:
         raise UnexpectedOsError
+
+
+def get_vien_dir_str() -> str:
+    path_from_var = os.environ.get("VIENDIR")
+    if path_from_var:
+        path_from_var = os.path.expandvars(path_from_var)
+        path_from_var = os.path.expanduser(path_from_var)
+        return path_from_var
+    else:
+        # It looks like storing dot files in the home directory
+        # is the de facto standard for both worlds.
+        #
+        # App    | POSIX     | Windows
+        # -------|-----------|----------------------
+        # VSCode | ~/.vscode | %USERPROFILE%\.vscode
+        # AWS:   | ~/.aws    | %USERPROFILE%\.aws
+        #
+        return os.path.join(os.path.expanduser("~"), ".vien")
+
+
+def get_vien_dir() -> "Path":
+    from pathlib import Path
+    return Path(get_vien_dir_str())
@@ -1,4 +1,4 @@
-__version__ = "8.1.0"
+__version__ = "9.0.0"
 __copyright__ = "(c) 2020-2021 Artëm IG <github.com/rtmigo>"
 __license__ = "BSD-3-Clause"
 
@@ -0,0 +1,156 @@
+# SPDX-FileCopyrightText: (c) 2021 Artëm IG <github.com/rtmigo>
+# SPDX-License-Identifier: BSD-3-Clause
+
+"""The vien daemon.
+
+A `vien` command spends more time on starting the interpreter and importing
+vien than on finding the environment. The daemon is a resident process
+with vien already imported. When it is running, the `vien` command only
+sends its arguments, working directory, environment variables and stdio
+descriptors to the socket VIENDIR/.daemon/daemon.sock (see _client.py).
+Only the user can enter the directory, and the daemon checks the user of
+each client where the system tells it.
+
+The daemon forks a child for each request. The child runs the command the
+same way vien would run it in its own process. When the command ends with
+exec (as `call`, `run` and `shell` do), the child sends the program to the
+client instead, and the client execs it.
+
+The daemon uses the protocol and the fork loop of the warm server. It
+exits when it gets a request from another version of vien or when its own
+files are changed. It refuses the clients run by another interpreter than
+its own, because the commands like `create` use the interpreter running
+vien. In all these cases the client runs the command itself.
+"""
+
+import os
+import sys
+from pathlib import Path
+
+from vien._client import daemon_socket_path
+from vien._constants import __version__
+from vien._exceptions import DaemonExit
+
+START_TIMEOUT = 30.0
+
+
+def idle_seconds_from_env() -> float:
+    """The daemon exits after $VIEN_DAEMON_IDLE seconds without requests.
+    The default is an hour."""
+    try:
+        return float(os.environ.get("VIEN_DAEMON_IDLE", ""))
+    except ValueError:
+        return 3600.0
+
+
+def _source_stamp() -> list:
+    package_dir = Path(__file__).parent
+    return sorted((name, os.stat(str(package_dir / name)).st_mtime_ns)
+                  for name in os.listdir(str(package_dir))
+                  if name.endswith(".py"))
+
+
+def _preload():
+    """Imports the modules that the commands would import."""
+    import argparse, json, shlex, shutil, subprocess  # noqa
+    import vien._main, vien._call_cache, vien._cache, vien._locks  # noqa
+
+
+def run_command(conn, request: dict, fds: list):
+    """Runs the vien command in the forked child. Never returns."""
+    from vien._warm_server import adopt_client, run_in_child, send_line
+    import vien._main as main_module
+
+    adopt_client(request, fds)
+    sys.argv = [request["argv0"]] + request["args"]
+
+    def send_exec(executable, args, env):
+        send_line(conn, {"exec": [executable, list(args), dict(env)]})
+        os._exit(0)
+
+    main_module.execve = send_exec
+    # the environment is the client's now
+    replace_process = main_module.can_replace_process(None)
+    run_in_child(lambda: main_module.main(request["args"], replace_process))
+
+
+def serve(sock_path: str):
+    from vien._warm_server import serve_forking
+    _preload()
+    stamp = _source_stamp()
+
+    def is_current(request: dict) -> bool:
+        return not request.get("stop") \
+            and request.get("version") == __version__ \
+            and _source_stamp() == stamp
+
+    def is_accepted(request: dict) -> bool:
+        return request.get("stop") \
+            or request.get("python") == sys.executable
+
+    serve_forking(sock_path, is_current, run_command,
+                  idle_seconds_from_env(), is_accepted)
+
+
+def _socket_path(vien_dir: Path) -> Path:
+    path = daemon_socket_path(str(vien_dir))
+    if path is None:
+        raise DaemonExit(f"the path of VIENDIR {vien_dir} is too long "
+                         f"for a socket")
+    return Path(path)
+
+
+def _is_running(path: Path) -> bool:
+    from vien._warm import connect
+    sock = connect(path)
+    if sock is None:
+        return False
+    sock.close()
+    return True
+
+
+def start_daemon(vien_dir: Path) -> str:
+    import subprocess
+    from vien._warm import make_private_dir, wait_connect
+
+    path = _socket_path(vien_dir)
+    if _is_running(path):
+        return f"The daemon is already running on {path}"
+    make_private_dir(path.parent)
+    # the daemon imports this copy of vien, even if it is not installed
+    package_parent = str(Path(__file__).parent.parent)
+    code = f"import sys; sys.path.insert(0, {package_parent!r}); " \
+           "from vien._daemon import serve; serve(sys.argv[1])"
+    with (path.parent / "daemon.log").open("ab") as log:
+        server = subprocess.Popen(
+            [sys.executable, "-c", code, str(path)],
+            cwd=str(vien_dir),
+            stdin=subprocess.DEVNULL, stdout=log, stderr=log,
+            start_new_session=True)
+    try:
+        wait_connect(path, server, START_TIMEOUT, "daemon").close()
+    except OSError as e:
+        raise DaemonExit(e)
+    return f"Started the daemon on {path}"
+
+
+def stop_daemon(vien_dir: Path) -> str:
+    from vien._client import exchange
+    from vien._warm import connect
+
+    path = _socket_path(vien_dir)
+    sock = connect(path)
+    if sock is None:
+        return "The daemon is not running"
+    with sock:
+        # the daemon exits when its children exit
+        for _ in exchange(sock, {"stop": True}):
+            pass
+    return f"Stopped the daemon on {path}"
+
+
+def daemon_status(vien_dir: Path) -> str:
+    path = _socket_path(vien_dir)
+    if _is_running(path):
+        return f"The daemon is running on {path}"
+    return "The daemon is not running"
@@ -2,6 +2,7 @@
 # SPDX-License-Identifier: BSD-3-Clause
 
 from pathlib import Path
+from typing import List
 
 
 class VienExit(SystemExit):
@@ -57,3 +58,70 @@ class FailedToClearVenvExit(VienExit):
 class CannotFindExecutableExit(VienExit):
     def __init__(self, version: str):
         super().__init__(f"Cannot resolve '{version}' to an executable file.")
+
+
+class CommandNotFoundExit(VienExit):
+    def __init__(self, command: str):
+        super().__init__(f"Command '{command}' not found.")
+
+
+class LauncherOutdatedExit(VienExit):
+    def __init__(self, path: Path):
+        super().__init__(f"Launcher {path} is missing or outdated.\n"
+                         f"Run \"vien install-launcher\" without --check "
+                         f"to update it.")
+
+
+class LauncherReplacesFileExit(VienExit):
+    def __init__(self, path: Path):
+        super().__init__(f"The launcher would replace the file {path}.\n"
+                         f"Name the file with the .py extension, or put "
+                         f"the launcher elsewhere with --bin-dir.")
+
+
+class PipWheelNotFoundExit(VienExit):
+    def __init__(self, python_version: str):
+        super().__init__(f"Cannot find the pip wheel for Python "
+                         f"{python_version} to share between "
+                         f"environments. Set $VIEN_PIP_WHEEL to the path of "
+                         f"a pip-*.whl file.")
+
+
+class LockTimeoutExit(VienExit):
+    def __init__(self, path: Path, timeout: float):
+        super().__init__(f"Environment {path} is still locked by another "
+                         f"vien process after {timeout:g} s. The timeout "
+                         f"can be changed with $VIEN_LOCK_TIMEOUT.")
+
+
+class WarmServerExit(VienExit):
+    def __init__(self, error: Exception):
+        super().__init__(f"Warm server failed: {error}")
+
+
+class DaemonExit(VienExit):
+    def __init__(self, error):
+        super().__init__(f"Vien daemon failed: {error}")
+
+
+class BatchFileNotFoundExit(VienExit):
+    def __init__(self, path: Path):
+        super().__init__(f"Batch file {path} not found.")
+
+
+class MultipleProjectsExit(VienExit):
+    def __init__(self, command: str):
+        super().__init__(f"The '{command}' command takes a single project "
+                         f"directory. Only 'run' can run in several "
+                         f"projects.")
+
+
+class ProjectDirsNotFoundExit(VienExit):
+    def __init__(self, args: List[str]):
+        super().__init__(f"No project directories found for "
+                         f"{' '.join(args)}.")
+
+
+class ProjectListNotFoundExit(VienExit):
+    def __init__(self, path: Path):
+        super().__init__(f"Project list file {path} not found.")
@@ -0,0 +1,65 @@
+# SPDX-FileCopyrightText: (c) 2021 Artëm IG <github.com/rtmigo>
+# SPDX-License-Identifier: BSD-3-Clause
+
+import os
+import shlex
+from pathlib import Path
+from typing import Optional
+
+from vien._exceptions import LauncherReplacesFileExit
+
+
+def launcher_path(py_file: Path, bin_dir: Optional[Path]) -> Path:
+    """pkg/main.py -> pkg/main, or BIN_DIR/main. For a file without the .py
+    extension, this is the file itself, unless BIN_DIR is another
+    directory (see `check_not_source`)."""
+    name = py_file.name[:-3] if py_file.name.lower().endswith(".py") \
+        else py_file.name
+    return (bin_dir if bin_dir is not None else py_file.parent) / name
+
+
+def launcher_text(py_file: Path,
+                  python_exe: Path,
+                  project_dir: Path,
+                  module_name: Optional[str],
+                  venv_version: Optional[str]) -> str:
+    """Returns the text of a POSIX sh script that runs the `py_file` in the
+    virtual environment the same way as `vien call` would, but without
+    starting vien."""
+
+    if module_name is not None:
+        python_args = f"-m {shlex.quote(module_name)}"
+    else:
+        python_args = shlex.quote(str(py_file))
+
+    return "\n".join([
+        "#!/bin/sh",
+        # no version of vien here: the launcher does not change with it,
+        # and `--check` compares the whole text
+        "# Generated by vien. Do not edit.",
+        f"# script: {py_file}",
+        f"# interpreter: {python_exe} ({venv_version or 'unknown version'})",
+        "",
+        # the same value as the `child_env` builds for `vien call`
+        f'PYTHONPATH={shlex.quote(str(project_dir))}'
+        f'"{os.pathsep}$PYTHONPATH"',
+        "export PYTHONPATH",
+        f'exec {shlex.quote(str(python_exe))} {python_args} "$@"',
+        ""])
+
+
+def check_not_source(file: Path, py_file: Path):
+    """Raises if the launcher would replace the file it runs."""
+    same = os.path.samefile(str(file), str(py_file)) if file.exists() \
+        else file.absolute() == py_file.absolute()
+    if same:
+        raise LauncherReplacesFileExit(py_file)
+
+
+def write_launcher(file: Path, text: str, py_file: Path):
+    check_not_source(file, py_file)
+    file.parent.mkdir(parents=True, exist_ok=True)
+    temp = file.with_name(f".{file.name}.{os.getpid()}.tmp")
+    temp.write_text(text, encoding="utf-8")
+    os.chmod(str(temp), 0o755)
+    os.replace(str(temp), str(file))
@@ -0,0 +1,96 @@
+# SPDX-FileCopyrightText: (c) 2021 Artëm IG <github.com/rtmigo>
+# SPDX-License-Identifier: BSD-3-Clause
+
+"""Advisory locks that keep concurrent vien processes from getting in each
+other's way.
+
+`create`, `recreate` and `delete` hold an exclusive lock on the environment.
+`run`, `call`, `shell` and `pip` take a shared lock only while they find the
+environment. So they wait until the environment is ready, but do not keep
+it locked while the program runs: a long `vien shell` does not block
+`recreate`.
+
+The locks are `flock` locks on the files VIENDIR/.locks/NAME_venv.lock. The
+file is not in the environment dir, because the dir is renamed. On Windows
+the locks do nothing.
+"""
+
+import os
+import sys
+import time
+from pathlib import Path
+from typing import Optional
+
+from vien._exceptions import LockTimeoutExit
+
+DEFAULT_TIMEOUT = 300.0
+
+
+def lock_timeout_from_env() -> float:
+    """The number of seconds from $VIEN_LOCK_TIMEOUT. Zero means do not
+    wait at all."""
+    try:
+        return max(0.0, float(os.environ.get("VIEN_LOCK_TIMEOUT", "")))
+    except ValueError:
+        return DEFAULT_TIMEOUT
+
+
+def lock_file(venv_dir: Path) -> Path:
+    return venv_dir.parent / ".locks" / (venv_dir.name + ".lock")
+
+
+class VenvLock:
+    def __init__(self, venv_dir: Path, exclusive: bool,
+                 timeout: Optional[float] = None):
+        self.venv_dir = venv_dir
+        self.exclusive = exclusive
+        self.timeout = timeout if timeout is not None \
+            else lock_timeout_from_env()
+        self.waited: float = 0.0
+        self._fd = -1
+
+    def _open(self) -> int:
+        file = lock_file(self.venv_dir)
+        flags = os.O_RDWR | os.O_CREAT
+        try:
+            return os.open(str(file), flags, 0o666)
+        except FileNotFoundError:
+            file.parent.mkdir(parents=True, exist_ok=True)
+            return os.open(str(file), flags, 0o666)
+
+    def __enter__(self) -> 'VenvLock':
+        if os.name != "posix":
+            return self
+        import fcntl
+        operation = fcntl.LOCK_EX if self.exclusive else fcntl.LOCK_SH
+        self._fd = self._open()
+        try:
+            fcntl.flock(self._fd, operation | fcntl.LOCK_NB)
+            return self
+        except BlockingIOError:
+            pass
+
+        print(f"Waiting for another vien process to release "
+              f"{self.venv_dir}", file=sys.stderr)
+        started = time.monotonic()
+        delay = 0.005
+        while True:
+            time.sleep(delay)
+            try:
+                fcntl.flock(self._fd, operation | fcntl.LOCK_NB)
+                break
+            except BlockingIOError:
+                if time.monotonic() - started >= self.timeout:
+                    os.close(self._fd)
+                    self._fd = -1
+                    raise LockTimeoutExit(self.venv_dir, self.timeout)
+            delay = min(delay * 2, 0.1)
+        self.waited = time.monotonic() - started
+        print(f"Waited {self.waited:.2f} s", file=sys.stderr)
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if self._fd >= 0:
+            # closing the file releases the lock
+            os.close(self._fd)
+            self._fd = -1
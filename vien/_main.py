@@ -3,54 +3,46 @@
 
 from __future__ import annotations
 
-import json
 import os
-import shutil
-import subprocess
 import sys
-import shlex
 from pathlib import Path
 from typing import *
 
-from vien import is_posix
-from vien._common import need_posix, is_windows, need_windows
-from vien._parsed_args import Commands, ParsedArgs
-from vien._bash_runner import run_as_bash_script
+from vien import is_posix, _timings
+from vien._common import need_posix, is_windows, need_windows, \
+    get_vien_dir
+from vien._parsed_args import Commands, ParsedArgs, is_projects_pattern
 from vien._call_funcs import relative_fn_to_module_name, relative_inner_path
 from vien._parsed_call import ParsedCall, list_left_partition
-from vien._colors import Colors
-from vien._cmdexe_escape_args import cmd_escape_arg
+from vien._call_cache import ResolvedCall
 from vien._exceptions import ChildExit, VenvExistsExit, VenvDoesNotExistExit, \
     PyFileNotFoundExit, PyFileArgNotFoundExit, FailedToCreateVenvExit, \
-    FailedToClearVenvExit, CannotFindExecutableExit
+    FailedToClearVenvExit, CannotFindExecutableExit, CommandNotFoundExit, \
+    LauncherOutdatedExit, WarmServerExit, BatchFileNotFoundExit, VienExit, \
+    MultipleProjectsExit, ProjectDirsNotFoundExit, ProjectListNotFoundExit
+
+if TYPE_CHECKING:
+    from vien._activation import Activation
+    from vien._parallel import JobResult
+
+# Each vien command pays for importing this module, even `vien path` and the
+# shebang scripts. So the modules needed only by some of the commands
+# (subprocess, shutil, json...) are imported inside the functions.
 
 verbose = False
 
+# Replaces the process. The daemon child replaces this function to send the
+# command to the client, that runs exec itself
+execve: Callable[[str, List[str], Mapping[str, str]], NoReturn] = os.execve
+
 
 def exe_name() -> str:
     return os.path.basename(sys.argv[0])
 
 
-def get_vien_dir() -> Path:
-    path_from_var = os.environ.get("VIENDIR")
-    if path_from_var:
-        path_from_var = os.path.expandvars(path_from_var)
-        path_from_var = os.path.expanduser(path_from_var)
-        return Path(path_from_var)
-    else:
-        # It looks like storing dot files in the home directory
-        # is the de facto standard for both worlds.
-        #
-        # App    | POSIX     | Windows
-        # -------|-----------|----------------------
-        # VSCode | ~/.vscode | %USERPROFILE%\.vscode
-        # AWS:   | ~/.aws    | %USERPROFILE%\.aws
-        #
-        return Path.home() / ".vien"
-
-
 def run_bash_sequence(commands: List[str], env: Optional[Dict] = None) -> int:
     need_posix()
+    from vien._bash_runner import run_process
 
     # command || exit /b 666
 
@@ -65,10 +57,10 @@ def run_bash_sequence(commands: List[str], env: Optional[Dict] = None) -> int:
     # Otherwise the command is executed in /bin/sh, ignoring the hashbang,
     # but SH fails to execute commands like 'source'
 
-    return subprocess.call("\n".join(lines),
-                           shell=True,
-                           executable='/bin/bash',
-                           env=env)
+    return run_process("\n".join(lines),
+                       shell=True,
+                       executable='/bin/bash',
+                       env=env).returncode
 
 
 def run_cmdexe_sequence(commands: List[str], env: Optional[Dict] = None) -> int:
@@ -76,6 +68,7 @@ def run_cmdexe_sequence(commands: List[str], env: Optional[Dict] = None) -> int:
     # This function does not work "officially" yet.
 
     need_windows()
+    from vien._bash_runner import run_process
 
     # raise NotImplemented
 
@@ -91,21 +84,25 @@ def run_cmdexe_sequence(commands: List[str], env: Optional[Dict] = None) -> int:
 
     # print(f"CMD running {glued}")
 
-    return subprocess.call(glued,
-                           shell=True,
-                           # executable='/bin/bash',
-                           env=env)
+    return run_process(glued,
+                       shell=True,
+                       # executable='/bin/bash',
+                       env=env).returncode
+
+
+def venv_dir_to_bin_dir(venv_dir: Path) -> Path:
+    # https://docs.python.org/3/library/venv.html
+    return venv_dir / ("bin" if is_posix else "Scripts")
 
 
 def venv_dir_to_python_exe(venv_dir: Path) -> Path:
     # this method is being tested indirectly each time the venv is created:
     # vien prints the path to executable after running this function
 
+    parent = venv_dir_to_bin_dir(venv_dir)
     if is_posix:
-        parent = venv_dir / "bin"
         basenames = "python", "python3"
     else:
-        parent = venv_dir / "Scripts"
         basenames = "python.exe", "python3.exe"
 
     for name in basenames:
@@ -116,6 +113,20 @@ def venv_dir_to_python_exe(venv_dir: Path) -> Path:
     raise Exception(f"Cannot find the Python interpreter in {venv_dir}.")
 
 
+def venv_base_version(venv_dir: Path) -> Optional[str]:
+    """Returns the version of the base interpreter, as written by venv
+    to the pyvenv.cfg."""
+    try:
+        text = (venv_dir / "pyvenv.cfg").read_text(encoding="utf-8")
+    except OSError:
+        return None
+    for line in text.splitlines():
+        key, _, value = line.partition("=")
+        if key.strip() in ("version", "version_info"):
+            return value.strip()
+    return None
+
+
 def windows_cmdexe_activate(venv_dir: Path) -> Path:
     # https://docs.python.org/3/library/venv.html
     assert is_windows
@@ -128,69 +139,214 @@ def posix_bash_activate(venv_dir: Path) -> Path:
     return venv_dir / 'bin' / 'activate'
 
 
+def pythons_cache():
+    from vien._cache import cache_dir
+    from vien._pythons import PythonsCache
+    return PythonsCache(cache_dir(get_vien_dir()) / "pythons.json")
+
+
 def arg_to_python_interpreter(argument: Optional[str]) -> str:
     if argument is None:
         return sys.executable
+    from vien._pythons import is_version_spec, find_by_version
+    if is_version_spec(argument):
+        # like "3.11"
+        exe = find_by_version(pythons_cache(), argument)
+        if not exe:
+            raise CannotFindExecutableExit(argument)
+        return exe
+    import shutil
     exe = shutil.which(argument)
     if not exe:
         raise CannotFindExecutableExit(argument)
     return exe
 
 
-def main_create(dirs: Dirs, interpreter: Optional[str]):
-    if dirs.venv_dir.exists():
+def get_templates_dir() -> Path:
+    return get_vien_dir() / ".templates"
+
+
+def build_venv(exe: str, staging: Path, venv_dir: Path,
+               use_template: bool, shared_pip: bool) -> bool:
+    """Creates the environment in the `staging` directory, but fixed to
+    be used in `venv_dir`. Returns False if failed."""
+    from vien._pool import pool_dir, claim_spare
+    from vien._clone import relocate_venv
+    if shared_pip:
+        # without ensurepip, creating is fast enough without any tricks
+        if not create_with_shared_pip(exe, staging):
+            return False
+    elif claim_spare(pool_dir(get_vien_dir()), exe, staging,
+                     new_dir=venv_dir):
+        return True
+    elif use_template:
+        from vien._clone import clone_from_template
+        return clone_from_template(exe, get_templates_dir(), staging,
+                                   new_dir=venv_dir)
+    else:
+        import subprocess
+        if subprocess.run([exe, "-m", "venv", str(staging)]).returncode != 0:
+            return False
+    relocate_venv(staging, old_dir=staging, new_dir=venv_dir)
+    return True
+
+
+def main_create(dirs: Dirs, interpreter: Optional[str],
+                use_template: bool = False,
+                shared_pip: bool = False,
+                replace: bool = False,
+                background_delete: bool = False):
+    """Creates the environment. With `replace`, the existing environment
+    is replaced by the new one when it is ready."""
+    if dirs.venv_dir.exists() and not replace:
+        raise VenvExistsExit(dirs.venv_dir)
+
+    print(f"Creating {dirs.venv_dir}")
+    activation = create_venv(dirs, interpreter, use_template=use_template,
+                             shared_pip=shared_pip, replace=replace,
+                             background_delete=background_delete)
+
+    print()
+    print("PROJECT DIR (unmodified)")
+    print(f"  {dirs.project_dir}")
+    print()
+    #  (for projects named '{os.path.basename(dirs.project_dir)}')
+    print(f"VIRTUAL ENVIRONMENT (created)")
+    print(f"  {dirs.venv_dir}")
+    print()
+    print("PYTHON EXECUTABLE (virtual)")
+    print(f"  {activation.python}")
+
+
+def create_venv(dirs: Dirs, interpreter: Optional[str],
+                use_template: bool = False,
+                shared_pip: bool = False,
+                replace: bool = False,
+                background_delete: bool = False) -> Activation:
+    """Does the work of `main_create` without printing. Returns the
+    activation manifest of the new environment."""
+    if dirs.venv_dir.exists() and not replace:
         raise VenvExistsExit(dirs.venv_dir)
 
     exe = arg_to_python_interpreter(interpreter)
 
-    print(f"Creating {dirs.venv_dir}")
+    from vien._staging import staging_dir, abandoned_staging_dirs, swap_in
+    from vien._trash import trash_dir, remove_tree, remove_in_background
+    # the environment is built in the staging dir and renamed when
+    # complete. So the half-created environment never appears in place
+    staging = staging_dir(dirs.venv_dir)
+    to_remove = abandoned_staging_dirs(dirs.venv_dir)
+    try:
+        created = build_venv(exe, staging, dirs.venv_dir,
+                             use_template=use_template,
+                             shared_pip=shared_pip)
+        if created:
+            try:
+                old = swap_in(staging, dirs.venv_dir,
+                              trash_dir(get_vien_dir()), replace=replace)
+            except OSError:
+                # created by another process in the meantime
+                raise VenvExistsExit(dirs.venv_dir)
+            if old is not None:
+                to_remove.append(old)
+    finally:
+        if staging.exists():
+            to_remove.append(staging)
+        if background_delete and to_remove:
+            remove_in_background(to_remove)
+        else:
+            for path in to_remove:
+                remove_tree(path)
 
-    result = subprocess.run([exe, "-m", "venv", str(dirs.venv_dir)])
-    if result.returncode == 0:
-        print()
-        print("PROJECT DIR (unmodified)")
-        print(f"  {dirs.project_dir}")
-        print()
-        #  (for projects named '{os.path.basename(dirs.project_dir)}')
-        print(f"VIRTUAL ENVIRONMENT (created)")
-        print(f"  {dirs.venv_dir}")
-        print()
-        print("PYTHON EXECUTABLE (virtual)")
-        print(f"  {venv_dir_to_python_exe(dirs.venv_dir)}")
-    else:
+    if not created:
         raise FailedToCreateVenvExit(dirs.venv_dir)
 
+    from vien._activation import write_activation
+    return write_activation(dirs.venv_dir)
 
-def main_delete(venv_dir: Path):
+
+def main_delete(venv_dir: Path, background: bool = False):
+    """Deletes the environment. With `background`, the files are removed
+    by a forked process after this function returns. But the environment
+    is gone from its place in any case."""
     if "_venv" not in venv_dir.name:
         raise ValueError(venv_dir)
     if not venv_dir.exists():
         raise VenvDoesNotExistExit(venv_dir)
 
-    # todo try to use the same executable that created the environment
-    # If we use sys.executable, we may clear the venv in some incompatible way.
-    # But we can't just use executable from the venv when clearing it:
-    # Windows will fail with [WinError 5] Access is denied: '...python.exe'
-
     # todo check we are not running the same executable we about to delete
     # python_exe = venv_dir_to_python_exe(venv_dir)
-    print(f"Clearing {venv_dir}")
-
-    result = subprocess.run(
-        [sys.executable, "-m", "venv", "--clear", str(venv_dir)],
-        capture_output=True, encoding=sys.stdout.encoding)
-    if result.returncode != 0:
-        print(f"stdout: {result.stdout}")
-        print(f"stderr: {result.stderr}")
-        raise FailedToClearVenvExit(venv_dir)
     print(f"Deleting {venv_dir}")
-    shutil.rmtree(str(venv_dir))
+    delete_venv(venv_dir, background=background)
+
+
+def delete_venv(venv_dir: Path, background: bool = False):
+    """Does the work of `main_delete` without printing."""
+    if "_venv" not in venv_dir.name:
+        raise ValueError(venv_dir)
+    if not venv_dir.exists():
+        raise VenvDoesNotExistExit(venv_dir)
 
+    from vien._trash import trash_dir, move_to_trash, stale_entries, \
+        remove_tree, remove_in_background
+    trash = trash_dir(get_vien_dir())
+    to_remove = stale_entries(trash)
+    try:
+        to_remove.insert(0, move_to_trash(venv_dir, trash))
+    except OSError:
+        # Windows will fail with [WinError 5] Access is denied, if the
+        # python.exe is running. Trying to remove at least the other files
+        to_remove.insert(0, venv_dir)
+        background = False
+
+    if background:
+        remove_in_background(to_remove)
+        return
+    try:
+        for path in to_remove:
+            remove_tree(path)
+    except OSError as e:
+        print(e, file=sys.stderr)
+        raise FailedToClearVenvExit(venv_dir)
+
+
+def main_recreate(dirs: Dirs, interpreter: Optional[str],
+                  use_template: bool = False,
+                  shared_pip: bool = False,
+                  background_delete: bool = False):
+    # the old environment is in use until the new one is ready
+    main_create(dirs, interpreter=interpreter, use_template=use_template,
+                shared_pip=shared_pip, replace=True,
+                background_delete=background_delete)
+
+
+def create_with_shared_pip(exe: str, venv_dir: Path) -> bool:
+    from vien._shared_pip import get_shared_pip, cached_pip_wheel, \
+        write_pip_wrappers
+    vien_dir = get_vien_dir()
+    pip_dir = get_shared_pip(vien_dir, cached_pip_wheel(vien_dir, exe))
+    import subprocess
+    if subprocess.run([exe, "-m", "venv", "--without-pip",
+                       str(venv_dir)]).returncode != 0:
+        return False
+    if is_posix:
+        write_pip_wrappers(venv_dir_to_bin_dir(venv_dir), pip_dir,
+                           venv_dir_to_python_exe(venv_dir))
+    return True
 
-def main_recreate(dirs: Dirs, interpreter: Optional[str]):
-    if dirs.venv_dir.exists():
-        main_delete(dirs.venv_dir)
-    main_create(dirs, interpreter=interpreter)
+
+def main_pip(activation: Activation, pip_args: List[str],
+             replace_process: bool = False):
+    """Runs the shared pip with the interpreter of the environment. Works
+    for the environments that have their own pip too."""
+    from vien._shared_pip import get_shared_pip, cached_pip_wheel, \
+        shared_pip_env
+    vien_dir = get_vien_dir()
+    pip_dir = get_shared_pip(
+        vien_dir, cached_pip_wheel(vien_dir, str(activation.python)))
+    env = shared_pip_env(pip_dir, activated_env(activation.venv_dir))
+    exec_or_run([str(activation.python), "-m", "pip"] + pip_args, env=env,
+                replace_process=replace_process)
 
 
 def guess_bash_ps1():
@@ -237,17 +393,90 @@ def guess_bash_ps1():
         return r"\h:\W \u\$"  # default for MacOS up to Catalina
 
     # hope for the best in other systems
+    import subprocess
     return subprocess.check_output(
         ['/bin/bash', '-i', '-c', 'echo $PS1']).decode().rstrip()
 
 
-def main_shell(dirs: Dirs, input: Optional[str], input_delay: Optional[float]):
+def bash_rc_files() -> List[Path]:
+    """Files that bash reads on startup, and that may define the PS1."""
+    return [Path(os.path.expanduser("~/.bashrc")),
+            Path("/etc/bash.bashrc")]
+
+
+def cached_bash_ps1(refresh: bool = False) -> str:
+    """Returns the same as `guess_bash_ps1`, but caches the guessed value
+    in VIENDIR.
+
+    Guessing may start an interactive bash, that reads all the startup
+    files of the user. It's slow, so we do it again only when the startup
+    files are modified, or when `refresh` is True.
+    """
+    env_var = os.environ.get("PS1")
+    if env_var is not None:
+        return env_var
+
+    from vien._cache import cache_dir, load_json, save_json, mtime_ns
+    cache_file = cache_dir(get_vien_dir()) / "ps1.json"
+    sources = {str(f): mtime_ns(f) for f in bash_rc_files()}
+
+    if not refresh:
+        cached = load_json(cache_file)
+        if isinstance(cached, dict) and cached.get("sources") == sources:
+            return cached["ps1"]
+
+    ps1 = guess_bash_ps1()
+    save_json(cache_file, {"sources": sources, "ps1": ps1})
+    return ps1
+
+
+def shell_rc_text(venv_dir: Path, ps1: str) -> str:
+    """Returns the text of the rcfile for the bash started by `vien shell`.
+    """
+    import shlex
+
+    # The environment of the shell is activated anyway: it is inherited
+    # from vien. But the startup files of the user may prepend something
+    # like pyenv shims to the $PATH. So we activate the environment
+    # again, after running them.
+    return "\n".join([
+        "# Generated by vien. The file will be overwritten.",
+        "if [ -f ~/.bashrc ]; then source ~/.bashrc; fi",
+        f"export VIRTUAL_ENV={shlex.quote(str(venv_dir))}",
+        'case "$PATH" in',
+        f'  {shlex.quote(str(venv_dir_to_bin_dir(venv_dir)))}:*) ;;',
+        f'  *) export PATH={shlex.quote(str(venv_dir_to_bin_dir(venv_dir)))}'
+        f'":$PATH" ;;',
+        "esac",
+        "unset PYTHONHOME",
+        f"PS1={shlex.quote(ps1)}",
+        ""])
+
+
+def write_shell_rc(venv_dir: Path, ps1: str) -> Path:
+    """Creates or updates the rcfile inside the virtual environment and
+    returns its path. The file is rewritten only when its text changes."""
+    rc_file = venv_dir / "vien_shell.rc"
+    text = shell_rc_text(venv_dir, ps1)
+    try:
+        if rc_file.read_text(encoding="utf-8") == text:
+            return rc_file
+    except OSError:
+        pass
+    temp = rc_file.with_name(f"{rc_file.name}.{os.getpid()}.tmp")
+    temp.write_text(text, encoding="utf-8")
+    os.replace(str(temp), str(rc_file))
+    return rc_file
+
+
+def main_shell(dirs: Dirs, input: Optional[str], input_delay: Optional[float],
+               refresh_prompt: bool = False, replace_process: bool = False):
     dirs.venv_must_exist()
 
-    activate_path_quoted = shlex.quote(
-        str(dirs.venv_dir / "bin" / "activate"))
+    from vien._bash_runner import run_with_input
+    from vien._colors import Colors
 
-    old_ps1 = os.environ.get("PS1") or guess_bash_ps1()
+    old_ps1 = cached_bash_ps1(refresh=refresh_prompt)
 
     if not old_ps1:
         old_ps1 = r"\h:\W \u\$"  # default from MacOS
@@ -258,18 +487,15 @@ def main_shell(dirs: Dirs, input: Optional[str], input_delay: Optional[float]):
     venv_name = dirs.project_dir.name
     new_ps1 = f"{color_start}({venv_name}){color_end}:{old_ps1} "
 
-    commands = [f'source {activate_path_quoted}']
+    # The rcfile is used instead of ~/.bashrc. It sources the ~/.bashrc
+    # and then sets the prompt. So starting the shell is a single exec
+    # without helper processes.
+    rc_file = write_shell_rc(dirs.venv_dir, new_ps1)
+    args = ['/bin/bash', '--rcfile', str(rc_file)]
+    env = activated_env(dirs.venv_dir, child_env(dirs.project_dir))
 
-    bashrc_file = Path(os.path.expanduser("~/.bashrc"))
-
-    if bashrc_file.exists():
-        # Ubuntu
-        commands.append(
-            f"exec bash --rcfile <(cat {json.dumps(str(bashrc_file))} "
-            f"&& echo 'PS1={json.dumps(new_ps1)}')")
-    else:
-        # MacOS
-        commands.append(f"PS1={json.dumps(new_ps1)} exec bash")
+    if input is None:
+        exec_or_run(args, env=env, replace_process=replace_process)
 
     # we will use [input] for testing: we will send a command to the stdin of
     # the interactive sub-shell and later check whether the command was
@@ -284,29 +510,59 @@ def main_shell(dirs: Dirs, input: Optional[str], input_delay: Optional[float]):
     # closes the stdin. So it will not wait for "exit". But it serves the
     # task well
 
-    cp = run_as_bash_script("\n".join(commands),
-                            input=input.encode() if input else None,
-                            input_delay=input_delay,
-                            env=child_env(dirs.project_dir))
+    cp = run_with_input(args,
+                        input=input.encode(),
+                        input_delay=input_delay,
+                        env=env)
+    _timings.mark("child")
 
     # the vien will return the same exit code as the shell returned
     raise ChildExit(cp.returncode)
 
 
 def bash_args_to_str(args: List[str]) -> str:
+    import shlex
     return ' '.join(shlex.quote(arg) for arg in args)
 
 
 def cmdexe_args_to_str(args: List[str]) -> str:
+    from vien._cmdexe_escape_args import cmd_escape_arg
     return ' '.join(cmd_escape_arg(arg) for arg in args)
 
 
-def main_run(dirs: Dirs, command: List[str]):
+def activated_env(venv_dir: Path, env: Optional[Dict] = None) -> Dict:
+    """Returns a copy of the environment variables, modified the same way as
+    `source bin/activate` would modify them."""
+    # https://docs.python.org/3/library/venv.html#how-venvs-work
+    result = dict(os.environ if env is None else env)
+    result['VIRTUAL_ENV'] = str(venv_dir)
+    result['PATH'] = f'{venv_dir_to_bin_dir(venv_dir)}{os.pathsep}' \
+                     f'{result.get("PATH", "")}'
+    result.pop('PYTHONHOME', None)
+    return result
+
+
+def main_run(dirs: Dirs, command: List[str],
+             replace_process: bool = False,
+             source_activate: bool = False):
     dirs.venv_must_exist()
 
+    if is_posix and not source_activate and command:
+        # Activating the environment without a shell: the environment
+        # variables are the same, but we don't spend time on starting bash
+        # and interpreting the activate script
+        env = activated_env(dirs.venv_dir, child_env(dirs.project_dir))
+        import shutil
+        executable = shutil.which(command[0], path=env['PATH'])
+        if executable is None:
+            raise CommandNotFoundExit(command[0])
+        exec_or_run(command, env=env, replace_process=replace_process,
+                    executable=executable)
+
     sequence: List[str] = list()
 
     if is_posix:
+        import shlex
         activate_file = posix_bash_activate(dirs.venv_dir)
         sequence.append(f'source {shlex.quote(str(activate_file))}')
         sequence.append(bash_args_to_str(command))
@@ -323,9 +579,133 @@ def main_run(dirs: Dirs, command: List[str]):
         raise FileNotFoundError(activate_file)
 
     exit_code = run_func(sequence, env=child_env(dirs.project_dir))
+    _timings.mark("child")
     raise ChildExit(exit_code)
 
 
+def main_run_batch(dirs: Dirs, batch_file: str, jobs: Optional[int]):
+    """Runs the commands from the file in the environment, activated only
+    once for all of them."""
+    from vien._parallel import Job, read_batch, run_jobs
+
+    if batch_file == "-":
+        commands = read_batch(sys.stdin)
+    else:
+        try:
+            with open(batch_file, encoding="utf-8") as f:
+                commands = read_batch(f)
+        except FileNotFoundError:
+            raise BatchFileNotFoundExit(Path(batch_file))
+
+    env = activated_env(dirs.venv_dir, child_env(dirs.project_dir))
+    width = len(str(len(commands)))
+    # the same shell as for the single command of 'run'
+    batch = [Job(prefix=f"[{i + 1:>{width}}] ", command=command, env=env,
+                 executable="/bin/bash")
+             for i, command in enumerate(commands)]
+
+    import time
+    started = time.monotonic()
+    results = run_jobs(batch, workers=jobs or 1)
+    finish_jobs(results, time.monotonic() - started)
+
+
+def finish_jobs(results: List[JobResult], seconds: float) -> NoReturn:
+    """Prints the summary of the commands and exits with the code of the
+    first failed one."""
+    from vien._parallel import summary, batch_exit_code
+    sys.stdout.flush()
+    print(summary(results, seconds), file=sys.stderr)
+    raise ChildExit(batch_exit_code(results))
+
+
+def expand_project_dirs(args: List[str]) -> List[Path]:
+    """Returns the project dirs from the [-p ARG] options. An ARG may be a
+    glob pattern like 'services/*', or @FILE where the file lists the
+    directories (relative to the file), one per line. An existing dir is
+    taken as it is, even if its name looks like a pattern."""
+    import glob
+    from vien._parallel import read_batch
+
+    result: List[Path] = list()
+    seen = set()
+
+    def add(path: Path):
+        path = Path(os.path.normpath(path.absolute()))
+        if path not in seen:
+            seen.add(path)
+            result.append(path)
+
+    for arg in args:
+        if not is_projects_pattern(arg):
+            add(Path(arg))
+        elif arg.startswith("@"):
+            list_file = Path(arg[1:])
+            try:
+                lines = list_file.read_text(encoding="utf-8").splitlines()
+            except FileNotFoundError:
+                raise ProjectListNotFoundExit(list_file)
+            for line in read_batch(lines):
+                add(normalize_path(list_file.parent.absolute(), Path(line)))
+        else:
+            for match in sorted(glob.glob(arg)):
+                if os.path.isdir(match):
+                    add(Path(match))
+    return result
+
+
+def main_run_projects(parsed: ParsedArgs):
+    """Runs the command in the environment of each project, in the project
+    directory. Up to `-j` projects at once."""
+    if parsed.command != Commands.run or parsed.run_batch is not None:
+        raise MultipleProjectsExit(parsed.command.value)
+    command = parsed.run_args
+    if not command:
+        raise CommandNotFoundExit("")
+    projects = expand_project_dirs(parsed.project_dir_args)
+    if not projects:
+        raise ProjectDirsNotFoundExit(parsed.project_dir_args)
+
+    import shutil
+    import time
+    from vien._locks import VenvLock
+    from vien._parallel import Job, JobResult, run_jobs
+
+    width = max(len(p.name) for p in projects)
+    results: List[Optional[JobResult]] = [None] * len(projects)
+    jobs: List[Tuple[int, Job]] = list()
+    for i, project in enumerate(projects):
+        dirs = Dirs(project_dir=project)
+        env = activated_env(dirs.venv_dir, child_env(dirs.project_dir))
+        # a relative path is relative to the project dir
+        executable = command[0] if os.sep in command[0] \
+            else shutil.which(command[0], path=env['PATH'])
+        job = Job(prefix=f"[{project.name:<{width}}] ", command=command,
+                  env=env, cwd=str(project), executable=executable)
+
+        with VenvLock(dirs.venv_dir, exclusive=False):
+            venv_exists = dirs.venv_dir.exists()
+        error: Optional[VienExit] = None
+        if not venv_exists:
+            error = VenvDoesNotExistExit(dirs.venv_dir)
+        elif executable is None:
+            error = CommandNotFoundExit(command[0])
+        if error is not None:
+            lines = [line + "\n" for line in str(error.code).splitlines()]
+            sys.stdout.write("".join(job.prefix + line for line in lines))
+            results[i] = JobResult(job, 1, 0.0, lines)
+        else:
+            jobs.append((i, job))
+
+    started = time.monotonic()
+    done = run_jobs([job for _, job in jobs],
+                    workers=parsed.run_jobs or os.cpu_count() or 1)
+    for (i, _), result in zip(jobs, done):
+        results[i] = result
+    finish_jobs([r for r in results if r is not None],
+                time.monotonic() - started)
+
+
 class Dirs:
     def __init__(self, project_dir: Union[str, Path] = '.'):
         self.project_dir = Path(project_dir).absolute()
@@ -339,6 +719,15 @@ class Dirs:
             raise VenvDoesNotExistExit(self.venv_dir)
         return self
 
+    def activation(self) -> Activation:
+        """Loads the activation manifest of the environment, that must
+        exist."""
+        from vien._activation import load_activation
+        result = load_activation(self.venv_dir)
+        if result is None:
+            raise VenvDoesNotExistExit(self.venv_dir)
+        return result
+
 
 def _insert_into_pythonpath(insert_me: str) -> str:
     # https://docs.python.org/3/using/cmdline.html#envvar-PYTHONPATH
@@ -395,42 +784,250 @@ def replace_arg(args: List[str], old: str, new: List[str]) -> List[str]:
     return result
 
 
-def main_call(parsed: ParsedArgs, dirs: Dirs):
-    dirs.venv_must_exist()
+def exec_or_run(args: List[str], env: Optional[Dict],
+                replace_process: bool,
+                executable: Optional[str] = None) -> NoReturn:
+    """Runs the child process and raises ChildExit with its exit code.
 
-    #parsed_call = ParsedCall(parsed.args)
-    #assert parsed_call.file is not None
+    With `replace_process`, the vien process is replaced with the child
+    (POSIX exec). So no second interpreter stays resident for the child's
+    lifetime, and signals reach the child directly.
+    """
+    if replace_process:
+        need_posix()
+        # the buffered output would be lost after exec
+        sys.stdout.flush()
+        sys.stderr.flush()
+        execve(executable or args[0], args,
+               env if env is not None else os.environ)
+
+    _timings.mark("environment")
+    from vien._bash_runner import run_process
+    cp = run_process(args, env=env, executable=executable,
+                     on_start=lambda: _timings.mark("spawn"))
+    _timings.mark("child")
+    raise ChildExit(cp.returncode)
 
-    assert parsed.call is not None
+
+def resolve_call(parsed: ParsedArgs) -> ResolvedCall:
+    dirs = Dirs(project_dir=get_project_dir(parsed))
+    activation = dirs.activation()
 
     if not os.path.exists(parsed.call.filename):
         raise PyFileNotFoundExit(Path(parsed.call.filename))
 
+    module_name: Optional[str] = None
     if parsed.call.before_filename == "-m":
-        # todo unit test
         # /abc/project/package/module.py -> package/module.py
         relative = relative_inner_path(parsed.call.filename, dirs.project_dir)
         # package/module.py -> package.module
         module_name = relative_fn_to_module_name(relative)
+
+    return ResolvedCall(project_dir=dirs.project_dir,
+                        venv_dir=dirs.venv_dir,
+                        python_exe=activation.python,
+                        module_name=module_name)
+
+
+def resolve_call_cached(parsed: ParsedArgs) -> ResolvedCall:
+    """Returns the same as `resolve_call`, but remembers the result in
+    VIENDIR. The shebang scripts are run again and again with the same
+    arguments, and the cache saves them the path work."""
+    from vien._cache import cache_dir
+    from vien._call_cache import CallCache
+
+    vien_dir = get_vien_dir()
+    cache = CallCache(cache_dir(vien_dir) / "call.json")
+    key = CallCache.key(parsed.call.filename, parsed.project_dir_arg,
+                        vien_dir, module=parsed.call.before_filename == "-m")
+    resolved = cache.get(key)
+    if resolved is None:
+        resolved = resolve_call(parsed)
+        cache.put(key, resolved)
+    return resolved
+
+
+def main_call(parsed: ParsedArgs, replace_process: bool = False):
+    assert parsed.call is not None
+    if parsed.call_same_interpreter:
+        main_call_sequence(parsed, replace_process=replace_process)
+        return
+
+    resolved = resolve_call_cached(parsed)
+    _timings.mark("resolve call")
+
+    from vien._locks import VenvLock
+    # waiting while the environment is created, replaced or deleted
+    with VenvLock(resolved.venv_dir, exclusive=False):
+        if not resolved.python_exe.exists():
+            raise VenvDoesNotExistExit(resolved.venv_dir)
+    _timings.mark("venv lookup")
+
+    args_to_python = parsed.args_to_python
+    # args_to_python is the tail of the parsed.args
+    idx = parsed.call.filename_idx \
+        - (len(parsed.args) - len(args_to_python))
+    assert args_to_python[idx] == parsed.call.filename
+    if resolved.module_name is not None:
         # replacing the filename in args with the module name.
         # It is already prefixed with -m
-        args = parsed.call.args.copy()
-        args[parsed.call.filename_idx] = module_name
-        # args to python are those after 'call' word
-        _, args_to_python = list_left_partition(args, 'call')
-        assert '-m' in args_to_python
-        assert module_name in args_to_python
-    else:
-        args_to_python = parsed.args_to_python
+        args_to_python = args_to_python.copy()
+        assert args_to_python[idx - 1] == '-m'
+        args_to_python[idx] = resolved.module_name
 
-    python_exe = venv_dir_to_python_exe(dirs.venv_dir)
+    if parsed.call_warm and is_posix:
+        # the warm server cannot apply the interpreter options like -B
+        options_count = 1 if resolved.module_name is not None else 0
+        if idx == options_count:
+            main_call_warm(resolved, parsed.call.filename,
+                           args_to_python[idx + 1:])
 
     assert len(args_to_python) > 0
-    args = [str(python_exe)] + args_to_python
+    args = [str(resolved.python_exe)] + args_to_python
 
-    cp = subprocess.run(args, env=child_env(dirs.project_dir))
+    exec_or_run(args, env=child_env(resolved.project_dir),
+                replace_process=replace_process)
 
-    raise ChildExit(cp.returncode)
+
+def main_call_sequence(parsed: ParsedArgs, replace_process: bool = False):
+    """Runs the files one after another in one interpreter of the
+    environment."""
+    from vien._parsed_call import parse_call_sequence
+    targets = parse_call_sequence(parsed.args_to_python)
+    dirs = Dirs(project_dir=get_project_dir(parsed))
+
+    plan: List[Dict] = list()
+    for target in targets:
+        if not os.path.exists(target.filename):
+            raise PyFileNotFoundExit(Path(target.filename))
+        if target.as_module:
+            module_name = relative_fn_to_module_name(
+                relative_inner_path(target.filename, dirs.project_dir))
+            plan.append({"module": module_name, "args": target.args})
+        else:
+            plan.append({"file": target.filename, "args": target.args})
+
+    from vien._locks import VenvLock
+    # waiting while the environment is created, replaced or deleted
+    with VenvLock(dirs.venv_dir, exclusive=False):
+        activation = dirs.activation()
+
+    import json
+    runner = Path(__file__).parent / "_call_sequence.py"
+    args = [str(activation.python), str(runner),
+            json.dumps(plan), "fresh" if parsed.call_fresh_main else "shared"]
+    exec_or_run(args, env=child_env(dirs.project_dir),
+                replace_process=replace_process)
+
+
+def main_call_warm(resolved: ResolvedCall, filename: str,
+                   script_args: List[str]):
+    """Runs the call in a fork of the warm server and raises ChildExit.
+    Returns if the warm server cannot be used."""
+    from vien._warm import socket_path, call_warm
+    vien_dir = get_vien_dir()
+    sock_path = socket_path(vien_dir, resolved.venv_dir)
+    if sock_path is None:
+        return
+    if resolved.module_name is not None:
+        file, module = None, resolved.module_name
+    else:
+        file, module = filename, None
+    env = child_env(resolved.project_dir)
+    try:
+        code = call_warm(resolved.python_exe, resolved.venv_dir, sock_path,
+                         file=file, module=module, args=script_args,
+                         env=dict(env if env is not None else os.environ))
+    except OSError as e:
+        raise WarmServerExit(e)
+    raise ChildExit(code)
+
+
+def main_pythons():
+    from vien._pythons import discover
+    for info in discover(pythons_cache()):
+        print(f"{info.version:<10} {info.path}")
+
+
+def main_pool(parsed: ParsedArgs):
+    from vien._pool import pool_dir, pool_status, fill_pool, \
+        pool_size_from_env, pool_pythons_from_env
+    pool = pool_dir(get_vien_dir())
+
+    if parsed.pool_command == "fill":
+        size = parsed.pool_size
+        if size is None:
+            size = pool_size_from_env()
+        # None is the interpreter running vien
+        pythons: List[Optional[str]] = \
+            list(parsed.pool_pythons or pool_pythons_from_env()) or [None]
+        for python in pythons:
+            exe = arg_to_python_interpreter(python)
+            print(f"Filling the pool for {exe}")
+            created = fill_pool(pool, exe, size)
+            print(f"  {created} created")
+    else:
+        assert parsed.pool_command == "status"
+        status = pool_status(pool)
+        print("SPARE ENVIRONMENTS")
+        if not status.spares:
+            print("  none")
+        for exe, count in status.spares:
+            print(f"  {count}  {exe}")
+        print()
+        print(f"HITS    {status.hits}")
+        print(f"MISSES  {status.misses}")
+
+
+def main_daemon(parsed: ParsedArgs):
+    need_posix()
+    from vien._daemon import daemon_status, start_daemon, stop_daemon
+    vien_dir = get_vien_dir()
+    if parsed.daemon_command == "start":
+        print(start_daemon(vien_dir))
+    elif parsed.daemon_command == "stop":
+        print(stop_daemon(vien_dir))
+    else:
+        assert parsed.daemon_command == "status"
+        print(daemon_status(vien_dir))
+
+
+def main_install_launcher(parsed: ParsedArgs, dirs: Dirs):
+    need_posix()
+    activation = dirs.activation()
+    from vien._launcher import launcher_path, launcher_text, write_launcher, \
+        check_not_source
+
+    py_file = Path(parsed.launcher_file).absolute()
+    if not py_file.exists():
+        raise PyFileNotFoundExit(py_file)
+
+    module_name: Optional[str] = None
+    if parsed.launcher_module:
+        module_name = relative_fn_to_module_name(
+            relative_inner_path(py_file, dirs.project_dir))
+
+    bin_dir = parsed.launcher_bin_dir
+    launcher = launcher_path(py_file,
+                             Path(bin_dir).absolute() if bin_dir else None)
+    text = launcher_text(py_file=py_file,
+                         python_exe=activation.python,
+                         project_dir=dirs.project_dir,
+                         module_name=module_name,
+                         venv_version=activation.base_version)
+    check_not_source(launcher, py_file)
+
+    if parsed.launcher_check:
+        try:
+            up_to_date = launcher.read_text(encoding="utf-8") == text
+        except OSError:
+            up_to_date = False
+        if not up_to_date:
+            raise LauncherOutdatedExit(launcher)
+        print(f"Launcher {launcher} is up to date.")
+    else:
+        write_launcher(launcher, text, py_file)
+        print(f"Created launcher {launcher}")
 
 
 def normalize_path(reference: Path, path: Path) -> Path:
@@ -448,6 +1045,9 @@ def get_project_dir(parsed: ParsedArgs) -> Path:
             if parsed.call.filename is None:
                 raise PyFileArgNotFoundExit
             reference_dir = Path(parsed.call.filename).parent.absolute()
+        elif parsed.command == Commands.install_launcher:
+            # the launcher will run the file the same way as 'call'
+            reference_dir = Path(parsed.launcher_file).parent.absolute()
         else:
             # for other commands the reference dir is cwd
             reference_dir = Path(".").absolute()
@@ -461,28 +1061,115 @@ def get_project_dir(parsed: ParsedArgs) -> Path:
     return project_dir
 
 
-def main_entry_point(args: Optional[List[str]] = None):
-    parsed = ParsedArgs(args)
+def can_replace_process(args: Optional[List[str]]) -> bool:
+    """Whether the vien process may be replaced with the child process.
+
+    When the arguments come from the command line, vien is the top-level
+    program and owns the process. When the arguments are passed from Python
+    code, the process belongs to the caller, and we must return to it.
+    """
+    return args is None \
+        and is_posix \
+        and not os.environ.get("VIEN_NO_EXEC")
 
-    dirs = Dirs(project_dir=get_project_dir(parsed))
 
+def main_modify_venv(parsed: ParsedArgs, dirs: Dirs, replace_process: bool):
     if parsed.command == Commands.create:
-        main_create(dirs, parsed.python_executable)
+        main_create(dirs, parsed.python_executable,
+                    use_template=parsed.use_template,
+                    shared_pip=parsed.use_shared_pip)
     elif parsed.command == Commands.recreate:
         main_recreate(dirs,
-                      parsed.python_executable)  # todo .existing()?
+                      parsed.python_executable,
+                      use_template=parsed.use_template,
+                      shared_pip=parsed.use_shared_pip,
+                      # the removal outlives the process only when
+                      # vien is a command line tool
+                      background_delete=replace_process)  # todo .existing()?
     elif parsed.command == Commands.delete:  # todo move 'existing' check from func?
-        main_delete(dirs.venv_dir)
+        main_delete(dirs.venv_dir,
+                    background=replace_process and not parsed.delete_wait)
+    else:
+        raise ValueError
+
+
+def main_entry_point(args: Optional[List[str]] = None):
+    if not _timings.enabled():
+        main(args, replace_process=can_replace_process(args))
+        return
+
+    # the same as SystemExit.code
+    exit_code: Union[int, str, None] = 1
+    try:
+        # the process is not replaced, so the child is measured too
+        main(args, replace_process=False)
+        exit_code = 0
+    except SystemExit as e:
+        exit_code = e.code
+        raise
+    finally:
+        _timings.report(sys.argv[1:] if args is None else args, exit_code)
+
+
+def main(args: Optional[List[str]], replace_process: bool):
+    parsed = ParsedArgs(args)
+    _timings.mark("parse args")
+
+    if parsed.multiple_projects:
+        main_run_projects(parsed)
+        return
+
+    if parsed.command == Commands.call:
+        # the shebang scripts get here. The paths are resolved with a cache
+        main_call(parsed, replace_process=replace_process)
+        return
+    if parsed.command == Commands.pool:
+        main_pool(parsed)
+        return
+    if parsed.command == Commands.pythons:
+        main_pythons()
+        return
+    if parsed.command == Commands.daemon:
+        main_daemon(parsed)
+        return
+
+    dirs = Dirs(project_dir=get_project_dir(parsed))
+    _timings.mark("project dir")
+
+    if parsed.command in (Commands.create, Commands.recreate,
+                          Commands.delete):
+        from vien._locks import VenvLock
+        # the concurrent processes wait instead of creating the same
+        # environment twice or deleting it while it is being created
+        with VenvLock(dirs.venv_dir, exclusive=True):
+            main_modify_venv(parsed, dirs, replace_process)
+        return
+
+    if parsed.command in (Commands.run, Commands.shell, Commands.pip):
+        from vien._locks import VenvLock
+        # waiting while the environment is created, replaced or deleted
+        with VenvLock(dirs.venv_dir, exclusive=False):
+            activation = dirs.activation()
+        _timings.mark("venv lookup")
+
+    if parsed.command == Commands.pip:
+        main_pip(activation, parsed.pip_args,
+                 replace_process=replace_process)
     elif parsed.command == Commands.path:
         print(dirs.venv_dir)  # does not need to be existing
+    elif parsed.command == Commands.run and parsed.run_batch is not None:
+        main_run_batch(dirs.venv_must_exist(), parsed.run_batch,
+                       parsed.run_jobs)
     elif parsed.command == Commands.run:
         # todo allow running commands from strings
-        main_run(dirs.venv_must_exist(), parsed.run_args)
-    elif parsed.command == Commands.call:
-
-        main_call(parsed, dirs)
-
+        main_run(dirs.venv_must_exist(), parsed.run_args,
+                 replace_process=replace_process,
+                 source_activate=parsed.run_source_activate)
+    elif parsed.command == Commands.install_launcher:
+        main_install_launcher(parsed, dirs)
     elif parsed.command == Commands.shell:
-        main_shell(dirs, parsed.shell_input, parsed.shell_delay)
+        main_shell(dirs, parsed.shell_input, parsed.shell_delay,
+                   refresh_prompt=parsed.shell_refresh_prompt,
+                   replace_process=replace_process)
     else:
         raise ValueError
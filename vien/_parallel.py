@@ -0,0 +1,165 @@
+# SPDX-FileCopyrightText: (c) 2021 Artëm IG <github.com/rtmigo>
+# SPDX-License-Identifier: BSD-3-Clause
+
+"""Running many commands at once, for `vien run --batch` and for `run` in
+several projects.
+
+Each command runs in its own process, started by the asyncio runner of
+_bash_runner.py. The output of the command is printed line by line with its
+prefix, like "[3] ". The whole output is never kept in memory: only the
+last lines of each command are remembered, to be shown in the summary if
+the command fails.
+"""
+
+import asyncio
+import sys
+import time
+from typing import Dict, Iterable, List, NamedTuple, Optional, TextIO, \
+    Union
+
+# longer lines are printed in parts
+MAX_LINE_BYTES = 64 * 1024
+
+TAIL_LINES = 10
+
+
+class Job(NamedTuple):
+    prefix: str
+    # a list of arguments, or a string for the shell
+    command: Union[str, List[str]]
+    env: Optional[Dict[str, str]] = None
+    cwd: Optional[str] = None
+    # the program to run instead of the first argument
+    executable: Optional[str] = None
+
+    @property
+    def title(self) -> str:
+        if isinstance(self.command, str):
+            return self.command
+        return " ".join(self.command)
+
+
+class JobResult(NamedTuple):
+    job: Job
+    exit_code: int
+    seconds: float
+    # the last lines of the output
+    tail: List[str]
+
+
+def read_batch(lines: Iterable[str]) -> List[str]:
+    """Returns the commands from the lines of a batch file. The empty lines
+    and the lines starting with # are skipped."""
+    result = []
+    for line in lines:
+        line = line.strip()
+        if line and not line.startswith("#"):
+            result.append(line)
+    return result
+
+
+class _PrefixedLines:
+    """Prints the output of a job line by line, with the prefix, and
+    remembers the last lines."""
+
+    def __init__(self, prefix: str, output: TextIO):
+        from collections import deque
+        self.prefix = prefix
+        self.output = output
+        self.tail: deque = deque(maxlen=TAIL_LINES)
+        self._buffer = b""
+
+    def feed(self, data: bytes):
+        self._buffer += data
+        while True:
+            end = self._buffer.find(b"\n") + 1
+            if end == 0:
+                if len(self._buffer) < MAX_LINE_BYTES:
+                    break
+                end = MAX_LINE_BYTES
+            self._print(self._buffer[:end])
+            self._buffer = self._buffer[end:]
+
+    def close(self):
+        if self._buffer:
+            self._print(self._buffer)
+            self._buffer = b""
+
+    def _print(self, data: bytes):
+        line = data.decode(errors="replace")
+        if not line.endswith("\n"):
+            line += "\n"
+        self.tail.append(line)
+        self.output.write(self.prefix + line)
+        self.output.flush()
+
+
+async def _run_job(job: Job, output: TextIO,
+                   semaphore: asyncio.Semaphore) -> JobResult:
+    from subprocess import DEVNULL, STDOUT
+    from vien._bash_runner import run_async
+
+    async with semaphore:
+        lines = _PrefixedLines(job.prefix, output)
+        started = time.monotonic()
+        try:
+            cp = await run_async(job.command,
+                                 shell=isinstance(job.command, str),
+                                 env=job.env, cwd=job.cwd,
+                                 executable=job.executable,
+                                 stdin=DEVNULL, stderr=STDOUT,
+                                 on_stdout=lines.feed)
+            exit_code = cp.returncode
+        except OSError as e:
+            lines.feed(f"{e}\n".encode())
+            exit_code = 127
+        lines.close()
+        return JobResult(job, exit_code, time.monotonic() - started,
+                         list(lines.tail))
+
+
+async def run_jobs_async(jobs: List[Job], workers: int,
+                         output: Optional[TextIO] = None) -> List[JobResult]:
+    """Runs the jobs in at most `workers` processes at once. Returns the
+    results in the order of the jobs."""
+    semaphore = asyncio.Semaphore(max(workers, 1))
+    return list(await asyncio.gather(
+        *[_run_job(job, output or sys.stdout, semaphore) for job in jobs]))
+
+
+def run_jobs(jobs: List[Job], workers: int,
+             output: Optional[TextIO] = None) -> List[JobResult]:
+    """The synchronous `run_jobs_async`."""
+    from vien._bash_runner import run_loop
+    return run_loop(run_jobs_async(jobs, workers, output))
+
+
+def summary(results: List[JobResult], seconds: float,
+            slowest: int = 3) -> str:
+    """Returns the text about the throughput, the slowest commands and the
+    failed ones."""
+    failed = [r for r in results if r.exit_code != 0]
+    rate = len(results) / seconds if seconds > 0 else 0.0
+    lines = [f"{len(results)} commands in {seconds:.2f} s "
+             f"({rate:.1f}/s), {len(failed)} failed"]
+    if len(results) > 1:
+        lines.append("Slowest:")
+        for r in sorted(results, key=lambda r: r.seconds,
+                        reverse=True)[:slowest]:
+            lines.append(f"  {r.seconds:7.2f} s  {r.job.prefix}"
+                         f"{r.job.title}")
+    for r in failed:
+        lines.append(f"Failed with code {r.exit_code}: {r.job.prefix}"
+                     f"{r.job.title}")
+        lines.extend("  " + line.rstrip("\n") for line in r.tail)
+    return "\n".join(lines)
+
+
+def batch_exit_code(results: List[JobResult]) -> int:
+    """The exit code of the first failed job, or zero."""
+    for r in results:
+        if r.exit_code != 0:
+            # the negative codes of the killed processes are not valid
+            # exit codes
+            return r.exit_code if r.exit_code > 0 else 1
+    return 0
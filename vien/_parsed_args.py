@@ -1,19 +1,21 @@
 # SPDX-FileCopyrightText: (c) 2021 Artëm IG <github.com/rtmigo>
 # SPDX-License-Identifier: BSD-3-Clause
 
-import argparse
 import os
 import sys
 from enum import Enum
-from typing import List, Optional, Iterable
+from types import SimpleNamespace
+from typing import Any, List, Optional, Iterable, Tuple
 
 from vien._common import is_windows
+from vien._exceptions import MultipleProjectsExit
 
 from vien import is_posix
 
 import vien
 # from vien.call_parser import items_after
 from vien._parsed_call import ParsedCall
+from vien._timings import split_flag as split_timings_flag
 
 
 def version_message() -> str:
@@ -56,6 +58,34 @@ def _remove_leading_p(args: List[str]) -> List[str]:
     return args
 
 
+# the options of vien itself, that go right after 'call' and before the
+# arguments to Python
+CALL_OPTIONS = ('--warm', '--same-interpreter', '--fresh-main')
+
+
+def _command_index(args: List[str]) -> Optional[int]:
+    """Returns the index of the command, that is the first argument after
+    the options of vien itself."""
+    i = 0
+    while i < len(args) and args[i].startswith('-'):
+        # the only option before the command that takes a value
+        i += 2 if args[i] in ('-p', '--project-dir') else 1
+    return i if i < len(args) else None
+
+
+def _split_call_options(args: List[str]) -> Tuple[List[str], List[str]]:
+    """['call', '--warm', 'file.py'] -> (['call', 'file.py'], ['--warm'])"""
+    idx = _command_index(args)
+    if idx is None or args[idx] != 'call':
+        return args, []
+    end = idx + 1
+    while end < len(args) and args[end] in CALL_OPTIONS:
+        end += 1
+    if end == idx + 1:
+        return args, []
+    return args[:idx + 1] + args[end:], args[idx + 1:end]
+
+
 class Commands(Enum):
     create = "create"
     delete = "delete"
@@ -64,6 +94,11 @@ class Commands(Enum):
     run = "run"
     call = "call"
     path = "path"
+    install_launcher = "install-launcher"
+    pool = "pool"
+    pip = "pip"
+    pythons = "pythons"
+    daemon = "daemon"
 
 
 class TempColumns:
@@ -90,134 +125,342 @@ class TempColumns:
             os.environ['COLUMNS'] = self._old_value
 
 
+def _fast_namespace(args: List[str]) -> Optional[SimpleNamespace]:
+    """Parses the most frequent command lines without building the
+    ArgumentParser: `[-p DIR] call ...`, `[-p DIR] run ...`,
+    `[-p DIR] pip ...` and `[-p DIR] path`.
+
+    Returns None if the arguments are not that simple. In this case they
+    should be parsed by the ArgumentParser, that will also show the help or
+    the error message.
+    """
+    project_dir: Optional[List[str]] = None
+    rest = args
+    if rest and rest[0] in ('-p', '--project-dir'):
+        if len(rest) < 2:
+            return None
+        project_dir = [rest[1]]
+        rest = rest[2:]
+    elif rest and rest[0].startswith('--project-dir='):
+        project_dir = [rest[0].partition('=')[2]]
+        rest = rest[1:]
+
+    if not rest:
+        return None
+    command, rest = rest[0], rest[1:]
+
+    if command == Commands.path.value:
+        if rest:
+            return None
+        return SimpleNamespace(command=command, project_dir=project_dir)
+
+    if command == Commands.run.value and is_posix:
+        source_activate = bool(rest) and rest[0] == '--source-activate'
+        if source_activate:
+            rest = rest[1:]
+        # the REMAINDER starts with the first positional argument
+        if not rest or rest[0].startswith('-'):
+            return None
+        return SimpleNamespace(command=command, project_dir=project_dir,
+                               source_activate=source_activate,
+                               otherargs=rest)
+
+    if command == Commands.pip.value:
+        # everything after 'pip' is for pip, including '--help'
+        return SimpleNamespace(command=command, project_dir=project_dir,
+                               pip_args=rest)
+
+    if command == Commands.call.value:
+        for arg in rest:
+            if not arg.startswith('-'):
+                break
+            # options that are recognized by the 'call' subparser itself
+            # (including abbreviations) instead of being passed to Python
+            if arg.startswith(('-h', '-p', '--')):
+                return None
+        return SimpleNamespace(command=command, project_dir=project_dir,
+                               outdated_call_project_dir=None)
+
+    return None
+
+
+def is_projects_pattern(arg: str) -> bool:
+    """Whether the -p value is a glob pattern or @FILE, rather than a
+    project dir. An existing dir named like 'odd[1]' is a project dir."""
+    return (arg.startswith('@') or any(c in arg for c in '*?[')) \
+        and not os.path.isdir(arg)
+
+
 class ParsedArgs:
     PARAM_WINDOWS_ALL_ARGS = "--vien-secret-windows-all-args"
 
     def __init__(self, args: Optional[List[str]]):
-        with TempColumns(80):
-
-            self._call: Optional[ParsedCall] = None
-
-            if args is None:
-                args = sys.argv[1:]
-
-            # secret parameter PARAM_WINDOWS_ALL_ARGS allows to run commands that
-            # are not yet fully supported on Windows.
-            enable_windows_all_args = self.PARAM_WINDOWS_ALL_ARGS in args
-            if enable_windows_all_args:
-                # for more transparent testing, I don't want this param
-                # to ever affect posix behavior
-                assert is_windows
-
-            parser = argparse.ArgumentParser()
-
-            parser.add_argument("-p", "--project-dir", default=None, type=str,
-                                help="the Python project directory "
-                                     "(default: current working directory). "
-                                     "Implicitly determines which virtual "
-                                     "environment should be used for the "
-                                     "command")
-
-            # the following parameter is added only to avoid parsing errors.
-            # Actually we use its value from `args` before running
-            # ArgumentParser
-            parser.add_argument(self.PARAM_WINDOWS_ALL_ARGS,
-                                action='store_true',
-                                help=argparse.SUPPRESS)
-
-            subparsers = parser.add_subparsers(dest='command', required=True)
-
-            parser_init = subparsers.add_parser(
-                Commands.create.name,
-                help="create new virtual environment")
-            parser_init.add_argument('python', type=str, default=None,
-                                     nargs='?')
-
-            subparsers.add_parser(Commands.delete.name,
-                                  help="delete existing environment")
-
-            parser_reinit = subparsers.add_parser(
-                Commands.recreate.name,
-                help="delete existing environment and create new")
-            parser_reinit.add_argument('python', type=str, default=None,
-                                       nargs='?')
-
-            if is_posix or enable_windows_all_args:
-                shell_parser = subparsers.add_parser(
-                    Commands.shell.name,
-                    help="dive into Bash sub-shell with the environment")
-                shell_parser.add_argument("--input", type=str, default=None)
-                shell_parser.add_argument("--delay", type=float, default=None,
-                                          help=argparse.SUPPRESS)
-
-            if is_posix or enable_windows_all_args:
-                parser_run = subparsers.add_parser(
-                    Commands.run.name,
-                    help="run a shell command in the environment")
-                parser_run.add_argument('otherargs', nargs=argparse.REMAINDER)
-
-            parser_call = subparsers.add_parser(
-                Commands.call.name,
-                help="run a .py file in the environment")
-            # todo Remove it later. [call -p] is outdated since 2021-05
-            parser_call.add_argument("-p", "--project-dir", default=None,
-                                     type=str,
-                                     dest="outdated_call_project_dir",
-                                     help=argparse.SUPPRESS)
-            # this arg is for help only. Actually it's buggy (at least in 3.7),
-            # so we will never use its result, and get those args other way
-            parser_call.add_argument('args_to_python', nargs=argparse.REMAINDER)
-
-            subparsers.add_parser(
-                Commands.path.name,
-                help="show the path of the environment "
-                     "for the project")
-
-            if not args:
-                print(usage_doc())
-                parser.print_help()
-                exit(2)
-
-            self.args = args
-
-            # it seems, nargs.REMAINDER is buggy in 2021:
-            # https://bugs.python.org/issue17050
-            #
-            # For example, when the first REMAINDER argument is an option
-            # such as "-d", argparse shows error instead of just
-            # remembering "-d"
-            #
-            # But "-d" actually can be the first REMAINDER arg after the CALL
-            # command.
-            #
-            # That's why we parse args twice. First time with
-            # `parse_known_args` - to get the command name. And then, if it's
-            # not CALL - we parse again with a stricter parse_args.
-
-            self._ns: argparse.Namespace
-            unknown: List[str]
-
-            self._ns, unknown = parser.parse_known_args(self.args)
-            if self._ns.command == 'call':
+        self._call: Optional[ParsedCall] = None
+
+        if args is None:
+            args = sys.argv[1:]
+        # the flag is handled by vien.main_entry_point
+        args, _ = split_timings_flag(args)
+        args, self.call_options = _split_call_options(args)
+        self.args = args
+
+        # argparse.Namespace or SimpleNamespace with the same attributes
+        self._ns: Any
+
+        ns = _fast_namespace(args)
+        if ns is not None:
+            self._ns = ns
+            if ns.command == Commands.call.value:
                 self.args_to_python = list(_iter_after(args, 'call'))
-
-                # if some of the unknown args are NOT after the 'call',
-                # then we're failed to interpret the command
-                bad_unrecognized = [unk for unk in unknown if
-                                    unk not in self.args_to_python]
-                if bad_unrecognized:
-                    parser.error(f"unrecognized arguments: {bad_unrecognized}")
-                    raise AssertionError("Not expected to run this line")
-
-                # todo Remove later. [call -p] is outdated since 2021-05
-                self.args_to_python = _remove_leading_p(self.args_to_python)
                 self._call = ParsedCall(args)
-            else:
-                # if some args were not recognized, parsing everything stricter
-                if unknown:
-                    self._ns = parser.parse_args(self.args)
-
-            self.command = Commands(self._ns.command)
+        else:
+            with TempColumns(80):
+                self._parse_with_argparse(args)
+
+        self.command = Commands(self._ns.command)
+
+    def _parse_with_argparse(self, args: List[str]):
+        import argparse
+
+        # secret parameter PARAM_WINDOWS_ALL_ARGS allows to run commands that
+        # are not yet fully supported on Windows.
+        enable_windows_all_args = self.PARAM_WINDOWS_ALL_ARGS in args
+        if enable_windows_all_args:
+            # for more transparent testing, I don't want this param
+            # to ever affect posix behavior
+            assert is_windows
+
+        parser = argparse.ArgumentParser()
+
+        parser.add_argument("-p", "--project-dir", default=None, type=str,
+                            action='append',
+                            help="the Python project directory "
+                                 "(default: current working directory). "
+                                 "Implicitly determines which virtual "
+                                 "environment should be used for the "
+                                 "command. For 'run' it can be repeated, "
+                                 "be a glob pattern or @FILE with a "
+                                 "directory per line")
+
+        # the flag is removed from `args` before parsing. Adding it here
+        # for the help
+        parser.add_argument("--timings", action='store_true',
+                            help="print how long each phase of the command "
+                                 "took to stderr. The child process is "
+                                 "not replaced, so its time is included")
+
+        # the following parameter is added only to avoid parsing errors.
+        # Actually we use its value from `args` before running
+        # ArgumentParser
+        parser.add_argument(self.PARAM_WINDOWS_ALL_ARGS,
+                            action='store_true',
+                            help=argparse.SUPPRESS)
+
+        subparsers = parser.add_subparsers(dest='command', required=True)
+
+        parser_init = subparsers.add_parser(
+            Commands.create.name,
+            help="create new virtual environment")
+        parser_init.add_argument(
+            'python', type=str, default=None, nargs='?',
+            help="the interpreter executable, or a version like 3.11")
+        parser_init.add_argument(
+            '--template', action='store_true',
+            help="clone a template environment kept for the interpreter "
+                 "instead of creating from scratch (faster)")
+        parser_init.add_argument(
+            '--shared-pip', action='store_true',
+            help="do not install pip into the environment, use the "
+                 "pip shared between environments instead")
+
+        parser_delete = subparsers.add_parser(
+            Commands.delete.name,
+            help="delete existing environment")
+        parser_delete.add_argument(
+            '--wait', action='store_true',
+            help="wait until all the files are removed "
+                 "(by default, they are removed in the background)")
+
+        parser_reinit = subparsers.add_parser(
+            Commands.recreate.name,
+            help="delete existing environment and create new")
+        parser_reinit.add_argument(
+            'python', type=str, default=None, nargs='?',
+            help="the interpreter executable, or a version like 3.11")
+        parser_reinit.add_argument(
+            '--template', action='store_true',
+            help="clone a template environment kept for the interpreter "
+                 "instead of creating from scratch (faster)")
+        parser_reinit.add_argument(
+            '--shared-pip', action='store_true',
+            help="do not install pip into the environment, use the "
+                 "pip shared between environments instead")
+
+        if is_posix or enable_windows_all_args:
+            shell_parser = subparsers.add_parser(
+                Commands.shell.name,
+                help="dive into Bash sub-shell with the environment")
+            shell_parser.add_argument("--input", type=str, default=None)
+            shell_parser.add_argument("--delay", type=float, default=None,
+                                      help=argparse.SUPPRESS)
+            shell_parser.add_argument(
+                "--refresh-prompt", action='store_true',
+                help="guess the default bash prompt again instead of "
+                     "using the cached value")
+
+        if is_posix or enable_windows_all_args:
+            parser_run = subparsers.add_parser(
+                Commands.run.name,
+                help="run a shell command in the environment")
+            parser_run.add_argument(
+                "--source-activate", action='store_true',
+                help="activate the environment by sourcing "
+                     "bin/activate in bash (slower, but runs custom "
+                     "activate hooks)")
+            parser_run.add_argument(
+                "--batch", metavar="FILE", default=None,
+                help="run the commands from the file, one per line "
+                     "('-' for stdin)")
+            parser_run.add_argument(
+                "-j", "--jobs", type=int, default=None,
+                help="the number of commands to run at once, with --batch "
+                     "(default: 1) or for several projects (default: the "
+                     "number of CPUs)")
+            parser_run.add_argument('otherargs', nargs=argparse.REMAINDER)
+
+        parser_call = subparsers.add_parser(
+            Commands.call.name,
+            help="run a .py file in the environment")
+        # todo Remove it later. [call -p] is outdated since 2021-05
+        parser_call.add_argument("-p", "--project-dir", default=None,
+                                 type=str,
+                                 dest="outdated_call_project_dir",
+                                 help=argparse.SUPPRESS)
+        # this option is removed from the args before parsing. Here it is
+        # for help only
+        parser_call.add_argument(
+            '--warm', action='store_true',
+            help="run the file in a fork of a resident interpreter with "
+                 "the modules from $VIEN_WARM_PRELOAD imported (POSIX)")
+        parser_call.add_argument(
+            '--same-interpreter', action='store_true',
+            help="run several files separated by '--' one after another "
+                 "in one interpreter")
+        parser_call.add_argument(
+            '--fresh-main', action='store_true',
+            help="with --same-interpreter, do not pass the global variables "
+                 "of a file to the next one")
+        # this arg is for help only. Actually it's buggy (at least in 3.7),
+        # so we will never use its result, and get those args other way
+        parser_call.add_argument('args_to_python', nargs=argparse.REMAINDER)
+
+        subparsers.add_parser(
+            Commands.path.name,
+            help="show the path of the environment "
+                 "for the project")
+
+        if is_posix or enable_windows_all_args:
+            parser_launcher = subparsers.add_parser(
+                Commands.install_launcher.value,
+                help="create a shell script that runs a .py file in the "
+                     "environment without starting vien")
+            parser_launcher.add_argument(
+                '-m', '--module', action='store_true',
+                help="run the file as a module")
+            parser_launcher.add_argument(
+                '--bin-dir', type=str, default=None,
+                help="the directory for the launcher "
+                     "(default: the directory of the .py file)")
+            parser_launcher.add_argument(
+                '--check', action='store_true',
+                help="do not write anything, but fail if the existing "
+                     "launcher is missing or outdated")
+            parser_launcher.add_argument('file', type=str)
+
+        parser_pip = subparsers.add_parser(
+            Commands.pip.name,
+            help="run the shared pip in the environment")
+        parser_pip.add_argument('pip_args', nargs=argparse.REMAINDER)
+
+        subparsers.add_parser(
+            Commands.pythons.name,
+            help="find the Python interpreters installed in the system")
+
+        parser_pool = subparsers.add_parser(
+            Commands.pool.name,
+            help="manage the pool of spare environments, that makes "
+                 "'create' faster")
+        pool_subparsers = parser_pool.add_subparsers(dest='pool_command',
+                                                     required=True)
+        parser_fill = pool_subparsers.add_parser(
+            'fill',
+            help="create spare environments for the interpreters")
+        parser_fill.add_argument(
+            '--size', type=int, default=None,
+            help="the number of spares per interpreter "
+                 "(default: $VIEN_POOL_SIZE or 2)")
+        parser_fill.add_argument(
+            'pythons', type=str, nargs='*',
+            help="the interpreters (default: $VIEN_POOL_PYTHONS or the "
+                 "interpreter running vien)")
+        pool_subparsers.add_parser(
+            'status',
+            help="show the number of spares, hits and misses")
+
+        parser_daemon = subparsers.add_parser(
+            Commands.daemon.name,
+            help="manage the resident process, that makes the other "
+                 "commands start faster (POSIX)")
+        daemon_subparsers = parser_daemon.add_subparsers(
+            dest='daemon_command', required=True)
+        daemon_subparsers.add_parser('start', help="start the daemon")
+        daemon_subparsers.add_parser('stop', help="stop the daemon")
+        daemon_subparsers.add_parser(
+            'status', help="tell whether the daemon is running")
+
+        if not args:
+            print(usage_doc())
+            parser.print_help()
+            exit(2)
+
+        # it seems, nargs.REMAINDER is buggy in 2021:
+        # https://bugs.python.org/issue17050
+        #
+        # For example, when the first REMAINDER argument is an option
+        # such as "-d", argparse shows error instead of just
+        # remembering "-d"
+        #
+        # But "-d" actually can be the first REMAINDER arg after the CALL
+        # command.
+        #
+        # That's why we parse args twice. First time with
+        # `parse_known_args` - to get the command name. And then, if it's
+        # not CALL - we parse again with a stricter parse_args.
+
+        unknown: List[str]
+
+        self._ns, unknown = parser.parse_known_args(args)
+        if self._ns.command == 'call':
+            self.args_to_python = list(_iter_after(args, 'call'))
+
+            # if some of the unknown args are NOT after the 'call',
+            # then we're failed to interpret the command
+            bad_unrecognized = [unk for unk in unknown if
+                                unk not in self.args_to_python]
+            if bad_unrecognized:
+                parser.error(f"unrecognized arguments: {bad_unrecognized}")
+                raise AssertionError("Not expected to run this line")
+
+            # todo Remove later. [call -p] is outdated since 2021-05
+            self.args_to_python = _remove_leading_p(self.args_to_python)
+            self._call = ParsedCall(args)
+        else:
+            # if some args were not recognized, parsing everything stricter
+            if unknown:
+                self._ns = parser.parse_args(args)
+            if self._ns.command == 'run' and self._ns.batch is not None \
+                    and self._ns.otherargs:
+                parser.error("a command cannot be combined with --batch")
 
     # @property
     # def command(self) -> Commands:
@@ -230,6 +473,24 @@ class ParsedArgs:
         assert self._call is not None
         return self._call
 
+    @property
+    def call_warm(self) -> bool:
+        if self.command != Commands.call:
+            raise RuntimeError
+        return '--warm' in self.call_options
+
+    @property
+    def call_same_interpreter(self) -> bool:
+        if self.command != Commands.call:
+            raise RuntimeError
+        return '--same-interpreter' in self.call_options
+
+    @property
+    def call_fresh_main(self) -> bool:
+        if self.command != Commands.call:
+            raise RuntimeError
+        return '--fresh-main' in self.call_options
+
     @property
     def project_dir_arg(self) -> Optional[str]:
         """Returns either outdated [call -p ARG] or normal [vien -p ARG]
@@ -240,7 +501,29 @@ class ParsedArgs:
             print("'vien call -p proj/dir file.py' syntax is outdated. "
                   "Use 'vien -p proj/dir call file.py'.")
             return project_dir_after_call
-        return self._ns.project_dir
+        project_dirs = self._ns.project_dir
+        if not project_dirs:
+            return None
+        if len(project_dirs) > 1:
+            raise MultipleProjectsExit(self.command.value)
+        return project_dirs[0]
+
+    @property
+    def project_dir_args(self) -> List[str]:
+        """All the values of [vien -p ARG]."""
+        return self._ns.project_dir or []
+
+    @property
+    def multiple_projects(self) -> bool:
+        """Whether the command must run for each of several projects, that
+        are set by repeated -p, a glob pattern or a list file."""
+        args = self.project_dir_args
+        if len(args) > 1:
+            return True
+        if self.command == Commands.call:
+            # the dir is relative to the file, and is never a pattern
+            return False
+        return any(is_projects_pattern(arg) for arg in args)
 
     @property
     def python_executable(self) -> Optional[str]:
@@ -249,6 +532,54 @@ class ParsedArgs:
         # assert self._ns.python is not None
         return self._ns.python
 
+    @property
+    def use_template(self) -> bool:
+        if self.command not in (Commands.create, Commands.recreate):
+            raise RuntimeError
+        return self._ns.template
+
+    @property
+    def use_shared_pip(self) -> bool:
+        if self.command not in (Commands.create, Commands.recreate):
+            raise RuntimeError
+        return self._ns.shared_pip
+
+    @property
+    def delete_wait(self) -> bool:
+        if self.command != Commands.delete:
+            raise RuntimeError
+        return self._ns.wait
+
+    @property
+    def pip_args(self) -> List[str]:
+        if self.command != Commands.pip:
+            raise RuntimeError
+        return self._ns.pip_args
+
+    @property
+    def pool_command(self) -> str:
+        if self.command != Commands.pool:
+            raise RuntimeError
+        return self._ns.pool_command
+
+    @property
+    def pool_size(self) -> Optional[int]:
+        if self.command != Commands.pool:
+            raise RuntimeError
+        return self._ns.__dict__.get('size')
+
+    @property
+    def pool_pythons(self) -> List[str]:
+        if self.command != Commands.pool:
+            raise RuntimeError
+        return self._ns.__dict__.get('pythons') or []
+
+    @property
+    def daemon_command(self) -> str:
+        if self.command != Commands.daemon:
+            raise RuntimeError
+        return self._ns.daemon_command
+
     @property
     def shell_input(self) -> Optional[str]:
         if self.command != Commands.shell:
@@ -261,8 +592,56 @@ class ParsedArgs:
             raise RuntimeError
         return self._ns.delay
 
+    @property
+    def shell_refresh_prompt(self) -> bool:
+        if self.command != Commands.shell:
+            raise RuntimeError
+        return self._ns.refresh_prompt
+
+    @property
+    def launcher_file(self) -> str:
+        if self.command != Commands.install_launcher:
+            raise RuntimeError
+        return self._ns.file
+
+    @property
+    def launcher_module(self) -> bool:
+        if self.command != Commands.install_launcher:
+            raise RuntimeError
+        return self._ns.module
+
+    @property
+    def launcher_bin_dir(self) -> Optional[str]:
+        if self.command != Commands.install_launcher:
+            raise RuntimeError
+        return self._ns.bin_dir
+
+    @property
+    def launcher_check(self) -> bool:
+        if self.command != Commands.install_launcher:
+            raise RuntimeError
+        return self._ns.check
+
     @property
     def run_args(self) -> List[str]:
         if self.command != Commands.run:
             raise RuntimeError
         return self._ns.otherargs
+
+    @property
+    def run_batch(self) -> Optional[str]:
+        if self.command != Commands.run:
+            raise RuntimeError
+        return self._ns.__dict__.get('batch')
+
+    @property
+    def run_jobs(self) -> Optional[int]:
+        if self.command != Commands.run:
+            raise RuntimeError
+        return self._ns.__dict__.get('jobs')
+
+    @property
+    def run_source_activate(self) -> bool:
+        if self.command != Commands.run:
+            raise RuntimeError
+        return self._ns.source_activate
@@ -1,7 +1,7 @@
 # SPDX-FileCopyrightText: (c) 2021 Artëm IG <github.com/rtmigo>
 # SPDX-License-Identifier: BSD-3-Clause
 
-from typing import Iterable, List, Optional, Tuple
+from typing import Iterable, List, NamedTuple, Optional, Tuple
 
 from vien._exceptions import PyFileArgNotFoundExit
 
@@ -61,3 +61,31 @@ class ParsedCall:
         if val == "call":
             return None
         return val
+
+
+class CallTarget(NamedTuple):
+    filename: str
+    as_module: bool
+    args: List[str]
+
+
+def parse_call_sequence(args: List[str]) -> List[CallTarget]:
+    """Parses the args of `call --same-interpreter`:
+    ['a.py', 'x', '--', '-m', 'b.py'] ->
+    [CallTarget('a.py', False, ['x']), CallTarget('b.py', True, [])]"""
+    segments: List[List[str]] = [[]]
+    for arg in args:
+        if arg == "--":
+            segments.append([])
+        else:
+            segments[-1].append(arg)
+
+    result = list()
+    for segment in segments:
+        as_module = bool(segment) and segment[0] == "-m"
+        if as_module:
+            segment = segment[1:]
+        if not segment or not segment[0].lower().endswith(".py"):
+            raise PyFileArgNotFoundExit
+        result.append(CallTarget(segment[0], as_module, segment[1:]))
+    return result
@@ -0,0 +1,144 @@
+# SPDX-FileCopyrightText: (c) 2021 Artëm IG <github.com/rtmigo>
+# SPDX-License-Identifier: BSD-3-Clause
+
+"""The pool of spare virtual environments.
+
+`vien pool fill` creates spare environments in advance. Then `vien create`
+only renames a spare environment into place and fixes the few files that
+contain its path.
+
+VIENDIR/.pool/
+  stats.json           hit and miss counters
+  python3.9-1a2b3c/    spares for one interpreter (see `interpreter_key`)
+    .interpreter       the path of the interpreter, for `pool status`
+    spare-0f1e2d...    a complete environment
+"""
+
+import os
+from pathlib import Path
+from typing import List, Optional, NamedTuple, Tuple
+
+from vien._cache import load_json, save_json
+from vien._clone import interpreter_key, relocate_venv, \
+    create_with_venv_module
+from vien._exceptions import FailedToCreateVenvExit
+
+DEFAULT_POOL_SIZE = 2
+
+_SPARE_PREFIX = "spare-"
+_INTERPRETER_FILE = ".interpreter"
+
+
+def pool_dir(vien_dir: Path) -> Path:
+    return vien_dir / ".pool"
+
+
+def pool_size_from_env() -> int:
+    try:
+        return max(0, int(os.environ.get("VIEN_POOL_SIZE", "")))
+    except ValueError:
+        return DEFAULT_POOL_SIZE
+
+
+def pool_pythons_from_env() -> List[str]:
+    """The interpreters listed in $VIEN_POOL_PYTHONS, separated by
+    os.pathsep."""
+    value = os.environ.get("VIEN_POOL_PYTHONS", "")
+    return [s for s in value.split(os.pathsep) if s]
+
+
+def _spares(interpreter_dir: Path) -> List[Path]:
+    try:
+        names = os.listdir(str(interpreter_dir))
+    except OSError:
+        return []
+    return [interpreter_dir / n for n in sorted(names)
+            if n.startswith(_SPARE_PREFIX)]
+
+
+def _count(pool: Path, key: str) -> None:
+    stats_file = pool / "stats.json"
+    stats = load_json(stats_file)
+    if not isinstance(stats, dict):
+        stats = {}
+    stats[key] = stats.get(key, 0) + 1
+    save_json(stats_file, stats)
+
+
+def claim_spare(pool: Path, exe: str, venv_dir: Path,
+                new_dir: Optional[Path] = None) -> bool:
+    """Moves a spare environment for the interpreter to `venv_dir`. The
+    environment is fixed to be used in `new_dir` (by default, in the
+    `venv_dir`).
+
+    Returns False if there are no spares. If the pool is not used at all,
+    the miss is not counted."""
+    if not pool.exists():
+        return False
+    for spare in _spares(pool / interpreter_key(exe)):
+        try:
+            # several processes may try to claim the same spare, but only
+            # one of them will rename it
+            os.rename(str(spare), str(venv_dir))
+        except OSError:
+            continue
+        relocate_venv(venv_dir, old_dir=spare, new_dir=new_dir)
+        _count(pool, "hits")
+        return True
+    _count(pool, "misses")
+    return False
+
+
+def fill_pool(pool: Path, exe: str, size: int) -> int:
+    """Creates spare environments for the interpreter, until there are
+    `size` of them. Returns the number of created environments."""
+    import uuid
+    interpreter_dir = pool / interpreter_key(exe)
+    interpreter_dir.mkdir(parents=True, exist_ok=True)
+    (interpreter_dir / _INTERPRETER_FILE).write_text(exe)
+
+    created = 0
+    while len(_spares(interpreter_dir)) < size:
+        name = _SPARE_PREFIX + uuid.uuid4().hex[:12]
+        spare = interpreter_dir / name
+        # the spare is created under a temporary name and renamed when
+        # complete, so `claim_spare` never gets a half-created one
+        temp = interpreter_dir / f".{name}.tmp"
+        if not create_with_venv_module(exe, temp):
+            import shutil
+            shutil.rmtree(str(temp), ignore_errors=True)
+            raise FailedToCreateVenvExit(temp)
+        relocate_venv(temp, old_dir=temp, new_dir=spare)
+        os.rename(str(temp), str(spare))
+        created += 1
+    return created
+
+
+class PoolStatus(NamedTuple):
+    hits: int
+    misses: int
+    spares: List[Tuple[str, int]]  # (interpreter, number of spares)
+
+
+def pool_status(pool: Path) -> PoolStatus:
+    stats = load_json(pool / "stats.json")
+    if not isinstance(stats, dict):
+        stats = {}
+    spares = []
+    try:
+        names = sorted(os.listdir(str(pool)))
+    except OSError:
+        names = []
+    for name in names:
+        interpreter_dir = pool / name
+        if not interpreter_dir.is_dir():
+            continue
+        try:
+            exe: Optional[str] = \
+                (interpreter_dir / _INTERPRETER_FILE).read_text()
+        except OSError:
+            exe = None
+        spares.append((exe or name, len(_spares(interpreter_dir))))
+    return PoolStatus(hits=stats.get("hits", 0),
+                      misses=stats.get("misses", 0),
+                      spares=spares)
@@ -0,0 +1,184 @@
+# SPDX-FileCopyrightText: (c) 2021 Artëm IG <github.com/rtmigo>
+# SPDX-License-Identifier: BSD-3-Clause
+
+"""Finding the Python interpreters installed in the system.
+
+The interpreters are searched in the PATH and in the common install roots.
+The version of each one is found by running it. The results are cached in
+VIENDIR/.cache/pythons.json, so `vien create 3.11` does not run any
+interpreter when the cache is fresh. An interpreter is probed again when
+its binary is modified.
+"""
+
+import os
+import re
+from pathlib import Path
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from vien._cache import load_json, save_json, mtime_ns
+
+_VERSION_SPEC_RE = re.compile(r'^\d+(\.\d+){0,2}$')
+_POSIX_NAME_RE = re.compile(r'^python\d*(\.\d+)?$')
+
+_PROBE = "import sys; print('.'.join(map(str, sys.version_info[:3])))"
+
+
+class PythonInfo(NamedTuple):
+    path: str
+    version: str  # like "3.11.7"
+
+    @property
+    def version_tuple(self) -> Tuple[int, ...]:
+        return _version_tuple(self.version)
+
+
+def _version_tuple(version: str) -> Tuple[int, ...]:
+    return tuple(int(x) for x in version.split("."))
+
+
+def is_version_spec(argument: str) -> bool:
+    """Tells whether the argument of `create` is a version like "3.11"
+    rather than an executable."""
+    return _VERSION_SPEC_RE.match(argument) is not None
+
+
+def _install_roots() -> List[Path]:
+    """The directories with bin dirs of the interpreters that are often
+    not in the PATH."""
+    home = Path.home()
+    pyenv_root = Path(os.environ.get("PYENV_ROOT") or home / ".pyenv")
+    roots: List[Path] = []
+    for parent in (pyenv_root / "versions",
+                   # Homebrew on Intel and Apple Silicon
+                   Path("/usr/local/opt"),
+                   Path("/opt/homebrew/opt")):
+        try:
+            names = sorted(os.listdir(str(parent)))
+        except OSError:
+            continue
+        roots.extend(parent / n / "bin" for n in names
+                     if parent.name == "versions" or n.startswith("python"))
+    # deadsnakes and the distributions install here
+    roots.extend([Path("/usr/local/bin"), Path("/usr/bin")])
+    return roots
+
+
+def _candidates_in(directory: Path) -> Iterable[str]:
+    try:
+        names = os.listdir(str(directory))
+    except OSError:
+        return
+    for name in names:
+        if os.name == "posix":
+            if not _POSIX_NAME_RE.match(name):
+                continue
+        elif name.lower() != "python.exe":
+            continue
+        path = os.path.join(str(directory), name)
+        if os.path.isfile(path) and os.access(path, os.X_OK):
+            yield path
+
+
+def find_candidates() -> List[str]:
+    """Returns the paths of the interpreter executables. The paths leading
+    to the same binary are reduced to one."""
+    # the pyenv shims run the interpreter selected for the current dir,
+    # so they cannot be cached
+    dirs = [Path(d) for d in os.environ.get("PATH", "").split(os.pathsep)
+            if d and os.path.basename(d) != "shims"]
+    dirs.extend(_install_roots())
+    seen_real = set()
+    result = []
+    for d in dirs:
+        for path in sorted(_candidates_in(d)):
+            real = os.path.realpath(path)
+            if real in seen_real:
+                continue
+            seen_real.add(real)
+            result.append(path)
+    return result
+
+
+def _probe(path: str) -> Optional[str]:
+    import subprocess
+    try:
+        cp = subprocess.run([path, "-c", _PROBE],
+                            stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                            universal_newlines=True, timeout=10)
+    except (OSError, subprocess.SubprocessError):
+        return None
+    version = cp.stdout.strip()
+    if cp.returncode != 0 or not is_version_spec(version):
+        return None
+    return version
+
+
+class PythonsCache:
+    """Remembers the versions of the interpreters. An entry is valid while
+    the binary has the same modification time."""
+
+    def __init__(self, file: Path):
+        self.file = file
+        data = load_json(file)
+        self.entries: Dict[str, Dict] = data if isinstance(data, dict) \
+            else dict()
+
+    def _stamp(self, path: str) -> Optional[int]:
+        return mtime_ns(Path(os.path.realpath(path)))
+
+    def get(self, path: str) -> Optional[str]:
+        entry = self.entries.get(path)
+        if entry is None or entry.get("mtime_ns") != self._stamp(path):
+            return None
+        return entry.get("version")
+
+    def valid_entries(self) -> List[PythonInfo]:
+        return [PythonInfo(path, version)
+                for path in self.entries
+                for version in [self.get(path)] if version is not None]
+
+    def update(self, infos: List[PythonInfo]):
+        self.entries = {
+            info.path: {"version": info.version,
+                        "mtime_ns": self._stamp(info.path)}
+            for info in infos}
+        save_json(self.file, self.entries)
+
+
+def discover(cache: PythonsCache, workers: int = 8) -> List[PythonInfo]:
+    """Finds the interpreters and their versions. Only the interpreters
+    that are new or modified since the last time are run. They are run in
+    parallel."""
+    candidates = find_candidates()
+    known = {path: cache.get(path) for path in candidates}
+    to_probe = [path for path, version in known.items() if version is None]
+    if to_probe:
+        from concurrent.futures import ThreadPoolExecutor
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for path, version in zip(to_probe,
+                                     executor.map(_probe, to_probe)):
+                known[path] = version
+    result = [PythonInfo(path, version)
+              for path, version in known.items() if version is not None]
+    cache.update(result)
+    return sorted_by_version(result)
+
+
+def sorted_by_version(infos: Iterable[PythonInfo]) -> List[PythonInfo]:
+    return sorted(infos, key=lambda i: i.version_tuple, reverse=True)
+
+
+def _matching(infos: Iterable[PythonInfo], spec: str) -> List[PythonInfo]:
+    wanted = _version_tuple(spec)
+    return [i for i in sorted_by_version(infos)
+            if i.version_tuple[:len(wanted)] == wanted]
+
+
+def find_by_version(cache: PythonsCache, spec: str) -> Optional[str]:
+    """Returns the newest interpreter matching the version spec: "3"
+    matches 3.x.x, "3.11" matches 3.11.x. The cached versions are used if
+    possible. Otherwise the interpreters are discovered again."""
+    matching = _matching(cache.valid_entries(), spec)
+    if not matching:
+        matching = _matching(discover(cache), spec)
+    return matching[0].path if matching else None
@@ -0,0 +1,225 @@
+# SPDX-FileCopyrightText: (c) 2021 Artëm IG <github.com/rtmigo>
+# SPDX-License-Identifier: BSD-3-Clause
+
+"""One pip installation shared by the environments created with
+`vien create --shared-pip`.
+
+Such environments are created without pip. Pip is a pure Python package
+that installs the packages into `sys.prefix` of the interpreter that runs
+it. So the pip unpacked once to VIENDIR/.pip/pip-X.Y.Z and added to the
+PYTHONPATH of the environment's interpreter works as the environment's own
+pip.
+
+The wheel is the one bundled with the interpreter of the environment, not
+with the interpreter running vien: pip drops the support of the old Python
+versions. The Requires-Python of the wheel is checked anyway.
+"""
+
+import os
+import re
+import sys
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from vien._exceptions import PipWheelNotFoundExit
+
+# prints the dir of the wheels bundled with ensurepip (or an empty line)
+# and the version of the interpreter
+_PROBE = "\n".join([
+    "import os, sys",
+    "try:",
+    "    import ensurepip",
+    "    print(os.path.join(os.path.dirname(ensurepip.__file__), '_bundled'))",
+    "except ImportError:",
+    "    print()",
+    "print('.'.join(map(str, sys.version_info[:3])))"])
+
+_CLAUSE_RE = re.compile(r'^(>=|<=|==|!=|~=|>|<)\s*(\d+(?:\.\d+)*)(\.\*)?$')
+
+
+def _probe_python(python_exe: str) -> Tuple[Optional[Path], Tuple[int, ...]]:
+    """Returns the dir of the bundled wheels and the version of the
+    interpreter."""
+    if python_exe == sys.executable:
+        try:
+            import ensurepip
+            bundled: Optional[Path] = \
+                Path(ensurepip.__file__).parent / "_bundled"
+        except ImportError:
+            bundled = None
+        return bundled, tuple(sys.version_info[:3])
+
+    import subprocess
+    lines = subprocess.check_output([python_exe, "-c", _PROBE],
+                                    universal_newlines=True).splitlines()
+    return (Path(lines[0]) if lines[0] else None,
+            tuple(int(x) for x in lines[1].split(".")))
+
+
+def requires_python(wheel: Path) -> Optional[str]:
+    """Returns the Requires-Python from the metadata of the wheel."""
+    import zipfile
+    try:
+        with zipfile.ZipFile(str(wheel)) as zf:
+            for name in zf.namelist():
+                if name.endswith(".dist-info/METADATA"):
+                    text = zf.read(name).decode("utf-8")
+                    # the headers end with an empty line
+                    for line in text.partition("\n\n")[0].splitlines():
+                        key, _, value = line.partition(":")
+                        if key.strip().lower() == "requires-python":
+                            return value.strip()
+    except (OSError, zipfile.BadZipFile):
+        pass
+    return None
+
+
+def python_satisfies(version: Tuple[int, ...], spec: str) -> bool:
+    """Checks the version like (3, 7, 9) against the Requires-Python like
+    ">=3.8,!=3.9.*". The clauses that are not understood are ignored."""
+    import operator
+    ops = {">=": operator.ge, "<=": operator.le, ">": operator.gt,
+           "<": operator.lt, "==": operator.eq, "!=": operator.ne,
+           "~=": operator.ge}
+    for clause in spec.split(","):
+        m = _CLAUSE_RE.match(clause.strip())
+        if m is None:
+            continue
+        op, number, star = m.groups()
+        wanted = tuple(int(x) for x in number.split("."))
+        if star:
+            if op in ("==", "!=") and \
+                    not ops[op](version[:len(wanted)], wanted):
+                return False
+            continue
+        padded = wanted + (0,) * (len(version) - len(wanted))
+        if not ops[op](version, padded):
+            return False
+    return True
+
+
+def _candidate_wheels(bundled: Optional[Path]) -> List[Path]:
+    env_wheel = os.environ.get("VIEN_PIP_WHEEL")
+    if env_wheel:
+        # pinned by the user
+        return [Path(env_wheel)]
+
+    result: List[Path] = []
+    dirs: List[Path] = []
+    if bundled is not None:
+        dirs.append(bundled)
+    # Debian and Ubuntu remove the wheels from ensurepip, but keep them here
+    dirs.append(Path("/usr/share/python-wheels"))
+    for d in dirs:
+        try:
+            names = os.listdir(str(d))
+        except OSError:
+            continue
+        result.extend(d / n for n in sorted(names)
+                      if n.startswith("pip-") and n.endswith(".whl"))
+    return result
+
+
+def find_pip_wheel(python_exe: str = sys.executable) -> Path:
+    """Returns the pip wheel that comes with the interpreter, or the one
+    from $VIEN_PIP_WHEEL. The wheel must support the interpreter."""
+    bundled, version = _probe_python(python_exe)
+    for wheel in _candidate_wheels(bundled):
+        if not wheel.is_file():
+            continue
+        spec = requires_python(wheel)
+        if spec is None or python_satisfies(version, spec):
+            return wheel
+    raise PipWheelNotFoundExit(".".join(map(str, version)))
+
+
+def cached_pip_wheel(vien_dir: Path, python_exe: str) -> Path:
+    """Returns the same as `find_pip_wheel`, but without running the
+    interpreter each time. The choice is saved to VIENDIR/.pip/wheels.json
+    with the modification time of the interpreter, so an upgraded
+    interpreter is probed again."""
+    if os.environ.get("VIEN_PIP_WHEEL"):
+        return find_pip_wheel(python_exe)
+
+    from vien._cache import load_json, mtime_ns, save_json
+    file = vien_dir / ".pip" / "wheels.json"
+    # the mtime of the interpreter, not of the symlink to it
+    mtime = mtime_ns(Path(python_exe))
+    data = load_json(file)
+    if not isinstance(data, dict):
+        data = dict()
+    saved = data.get(python_exe)
+    if mtime is not None and isinstance(saved, list) and len(saved) == 2 \
+            and saved[0] == mtime and Path(saved[1]).is_file():
+        return Path(saved[1])
+
+    wheel = find_pip_wheel(python_exe)
+    if mtime is not None:
+        data[python_exe] = [mtime, str(wheel)]
+        save_json(file, data)
+    return wheel
+
+
+def _wheel_version_name(wheel: Path) -> str:
+    # pip-23.2.1-py3-none-any.whl -> pip-23.2.1
+    return "-".join(wheel.name.split("-")[:2])
+
+
+def get_shared_pip(vien_dir: Path, wheel: Path) -> Path:
+    """Returns the directory with the unpacked pip, unpacking the wheel
+    if needed. The directory is to be added to PYTHONPATH.
+
+    The directories are named by the pip version. So the environments of
+    the interpreters that need different versions get different pips."""
+    pip_dir = vien_dir / ".pip" / _wheel_version_name(wheel)
+    if pip_dir.exists():
+        return pip_dir
+
+    import shutil
+    import zipfile
+    # unpacking under a temporary name, so a half-unpacked pip is never
+    # used by another process
+    temp = pip_dir.with_name(f".{pip_dir.name}.{os.getpid()}.tmp")
+    temp.parent.mkdir(parents=True, exist_ok=True)
+    try:
+        with zipfile.ZipFile(str(wheel)) as zf:
+            zf.extractall(str(temp))
+        os.rename(str(temp), str(pip_dir))
+    except OSError:
+        # another process has unpacked the same version at the same time
+        if not pip_dir.exists():
+            raise
+    finally:
+        shutil.rmtree(str(temp), ignore_errors=True)
+    return pip_dir
+
+
+def shared_pip_env(pip_dir: Path, env: Dict) -> Dict:
+    result = dict(env)
+    old = result.get("PYTHONPATH")
+    result["PYTHONPATH"] = str(pip_dir) if not old \
+        else f"{pip_dir}{os.pathsep}{old}"
+    return result
+
+
+def pip_wrapper_text(pip_dir: Path, python_exe: Path) -> str:
+    """Returns the text of a POSIX sh script that runs the shared pip for
+    the environment. It is placed to bin/pip, so `pip install` works in
+    `vien shell` and `vien run` as usual."""
+    import shlex
+    return "\n".join([
+        "#!/bin/sh",
+        "# Created by vien. Runs the pip shared between environments.",
+        f'PYTHONPATH={shlex.quote(str(pip_dir))}'
+        f'"${{PYTHONPATH:+{os.pathsep}$PYTHONPATH}}"',
+        "export PYTHONPATH",
+        f'exec {shlex.quote(str(python_exe))} -m pip "$@"',
+        ""])
+
+
+def write_pip_wrappers(bin_dir: Path, pip_dir: Path, python_exe: Path):
+    text = pip_wrapper_text(pip_dir, python_exe)
+    for name in ("pip", "pip3"):
+        file = bin_dir / name
+        file.write_text(text, encoding="utf-8")
+        os.chmod(str(file), 0o755)
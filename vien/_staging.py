@@ -0,0 +1,71 @@
+# SPDX-FileCopyrightText: (c) 2021 Artëm IG <github.com/rtmigo>
+# SPDX-License-Identifier: BSD-3-Clause
+
+"""Creating the environments in a staging directory.
+
+The new environment is built in VIENDIR/.project_venv.PID.staging and is
+renamed to VIENDIR/project_venv only when complete. So an interrupted
+`create` never leaves a half-created environment in place, and `recreate`
+replaces the old environment with two renames.
+"""
+
+import os
+from pathlib import Path
+from typing import List, Optional
+
+from vien._trash import move_to_trash
+
+_SUFFIX = ".staging"
+
+
+def staging_dir(venv_dir: Path) -> Path:
+    return venv_dir.with_name(f".{venv_dir.name}.{os.getpid()}{_SUFFIX}")
+
+
+def _pid_alive(pid: int) -> bool:
+    if os.name != "posix":
+        # cannot tell cheaply. Assuming it is still running
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def abandoned_staging_dirs(venv_dir: Path) -> List[Path]:
+    """Returns the staging directories for the environment, left by the
+    processes that are not running anymore."""
+    prefix = f".{venv_dir.name}."
+    try:
+        names = os.listdir(str(venv_dir.parent))
+    except OSError:
+        return []
+    result = []
+    for name in names:
+        if not (name.startswith(prefix) and name.endswith(_SUFFIX)):
+            continue
+        try:
+            pid = int(name[len(prefix):-len(_SUFFIX)])
+        except ValueError:
+            continue
+        if not _pid_alive(pid):
+            result.append(venv_dir.parent / name)
+    return result
+
+
+def swap_in(staging: Path, venv_dir: Path, trash: Path,
+            replace: bool) -> Optional[Path]:
+    """Renames the `staging` to `venv_dir`. With `replace`, the existing
+    `venv_dir` is moved to the `trash` right before that, and its new path
+    is returned. Otherwise OSError is raised if the `venv_dir` exists."""
+    old: Optional[Path] = None
+    if replace:
+        try:
+            old = move_to_trash(venv_dir, trash)
+        except FileNotFoundError:
+            pass
+    os.rename(str(staging), str(venv_dir))
+    return old
@@ -0,0 +1,111 @@
+# SPDX-FileCopyrightText: (c) 2021 Artëm IG <github.com/rtmigo>
+# SPDX-License-Identifier: BSD-3-Clause
+
+"""Measuring where the time of a vien command goes.
+
+With `vien --timings ...` or the VIEN_TIMINGS environment variable, vien
+notes the time when each phase of the command ends: importing, parsing the
+arguments, finding the project and the environment, building the
+environment variables, starting the child process and running it. When the
+command finishes, the phases are printed to stderr. If VIEN_TIMINGS is a
+file path, they are written to the file as JSON instead.
+
+The time is counted from the start of `vien.main_entry_point`. The start
+of the interpreter is not included.
+
+When the timings are off, `mark` does nothing.
+"""
+
+import os
+import sys
+import time
+
+# imported by each `vien` command, see __init__.py
+TYPE_CHECKING = False
+if TYPE_CHECKING:
+    from typing import List, Optional, Tuple, Union
+
+FLAG = "--timings"
+
+_STDERR_VALUES = ("1", "-", "stderr")
+_OFF_VALUES = ("", "0")
+
+_started = time.perf_counter()
+_marks: "Optional[List[Tuple[str, float]]]" = None
+
+
+def split_flag(args: "List[str]") -> "Tuple[List[str], bool]":
+    """Removes the flag from the options before the command. Returns the
+    other arguments and whether the flag was there."""
+    i = 0
+    while i < len(args) and args[i].startswith('-'):
+        if args[i] == FLAG:
+            return args[:i] + args[i + 1:], True
+        # the only option before the command that takes a value
+        i += 2 if args[i] in ('-p', '--project-dir') else 1
+    return args, False
+
+
+def requested(args: "List[str]") -> bool:
+    """Whether the timings are turned on by the arguments or by the
+    environment variable."""
+    return os.environ.get("VIEN_TIMINGS", "") not in _OFF_VALUES \
+        or split_flag(args)[1]
+
+
+def start():
+    global _marks, _started
+    _started = time.perf_counter()
+    _marks = []
+
+
+def enabled() -> bool:
+    return _marks is not None
+
+
+def mark(phase: str):
+    """Notes the end of the phase."""
+    if _marks is not None:
+        _marks.append((phase, time.perf_counter()))
+
+
+def phases() -> "List[Tuple[str, float]]":
+    """Returns the names and durations of the phases in seconds."""
+    result = []
+    previous = _started
+    for phase, at in _marks or []:
+        result.append((phase, at - previous))
+        previous = at
+    return result
+
+
+def _exit_code(code: "Union[int, str, None]") -> int:
+    # the same as the interpreter does with SystemExit.code
+    if code is None:
+        return 0
+    return code if isinstance(code, int) else 1
+
+
+def report(args: "List[str]", exit_code: "Union[int, str, None]"):
+    """Prints the phases to stderr or writes them to the file from
+    VIEN_TIMINGS. Then turns the timings off."""
+    global _marks
+    total = time.perf_counter() - _started
+    target = os.environ.get("VIEN_TIMINGS", "")
+    if target in _OFF_VALUES or target in _STDERR_VALUES:
+        lines = ["vien timings, ms:"]
+        lines.extend(f"{seconds * 1000:10.2f}  {phase}"
+                     for phase, seconds in phases())
+        lines.append(f"{total * 1000:10.2f}  total")
+        sys.stderr.flush()
+        print("\n".join(lines), file=sys.stderr, flush=True)
+    else:
+        from pathlib import Path
+        from vien._cache import save_json
+        save_json(Path(target),
+                  {"args": args,
+                   "exit_code": _exit_code(exit_code),
+                   "phases": [{"phase": phase, "ms": seconds * 1000}
+                              for phase, seconds in phases()],
+                   "total_ms": total * 1000})
+    _marks = None
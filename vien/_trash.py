@@ -0,0 +1,127 @@
+# SPDX-FileCopyrightText: (c) 2021 Artëm IG <github.com/rtmigo>
+# SPDX-License-Identifier: BSD-3-Clause
+
+"""Deleting the environments.
+
+The environment is first renamed to VIENDIR/.trash. It frees the name of the
+environment at once, so `recreate` does not wait for the removal. The
+renamed directory is then removed by several threads, possibly in a
+background process.
+
+If the removal was interrupted, the directory stays in the trash. Such
+stale entries are removed by the next `delete`.
+"""
+
+import os
+import time
+from pathlib import Path
+from typing import List
+
+# an entry that is older is not being removed by anyone
+STALE_SECONDS = 60
+
+
+def trash_dir(vien_dir: Path) -> Path:
+    return vien_dir / ".trash"
+
+
+def move_to_trash(path: Path, trash: Path) -> Path:
+    """Renames the directory to a unique name in the trash. Raises OSError
+    if it cannot be renamed (for example, on Windows, when it is in use)."""
+    trash.mkdir(parents=True, exist_ok=True)
+    entry = trash / f"{path.name}.{int(time.time())}.{os.getpid()}"
+    os.rename(str(path), str(entry))
+    return entry
+
+
+def stale_entries(trash: Path) -> List[Path]:
+    try:
+        names = os.listdir(str(trash))
+    except OSError:
+        return []
+    result = []
+    now = time.time()
+    for name in names:
+        try:
+            timestamp = int(name.split(".")[-2])
+        except (IndexError, ValueError):
+            continue
+        if now - timestamp > STALE_SECONDS:
+            result.append(trash / name)
+    return result
+
+
+def _unlink(path: str):
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        # removed by another process
+        pass
+    except PermissionError:
+        # Windows does not delete the read-only files
+        import stat
+        os.chmod(path, stat.S_IWRITE)
+        os.unlink(path)
+
+
+def _clear_dir(path: str) -> List[str]:
+    """Removes the files in the directory and returns its subdirectories."""
+    subdirs = []
+    try:
+        with os.scandir(path) as it:
+            for entry in it:
+                if entry.is_dir(follow_symlinks=False):
+                    subdirs.append(entry.path)
+                else:
+                    _unlink(entry.path)
+    except FileNotFoundError:
+        pass
+    return subdirs
+
+
+def remove_tree(root: Path, workers: int = 8):
+    """Removes the directory like `shutil.rmtree`, but the directories
+    are scanned and cleared by several threads at once.
+
+    The removal tolerates other processes removing the same tree."""
+    from concurrent.futures import ThreadPoolExecutor, wait, \
+        FIRST_COMPLETED
+
+    all_dirs = [str(root)]
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = {executor.submit(_clear_dir, str(root))}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                for subdir in future.result():
+                    all_dirs.append(subdir)
+                    pending.add(executor.submit(_clear_dir, subdir))
+
+    # the deepest directories first
+    all_dirs.sort(key=lambda d: d.count(os.sep), reverse=True)
+    for d in all_dirs:
+        try:
+            os.rmdir(d)
+        except FileNotFoundError:
+            pass
+
+
+def remove_in_background(paths: List[Path]):
+    """Removes the directories in a forked process, that is not waited
+    for. POSIX only."""
+    if os.fork() != 0:
+        return
+    # The child. It must not keep the stdout of the parent open: the
+    # programs capturing the output of `vien delete` would wait for it
+    try:
+        os.setsid()
+        devnull = os.open(os.devnull, os.O_RDWR)
+        for fd in (0, 1, 2):
+            os.dup2(devnull, fd)
+        # the inherited files include the lock of the environment, that
+        # would stay locked until the removal is complete
+        os.closerange(3, os.sysconf("SC_OPEN_MAX"))
+        for path in paths:
+            remove_tree(path)
+    finally:
+        os._exit(0)
@@ -0,0 +1,136 @@
+# SPDX-FileCopyrightText: (c) 2021 Artëm IG <github.com/rtmigo>
+# SPDX-License-Identifier: BSD-3-Clause
+
+"""The client side of `vien call --warm`. See _warm_server.py for the
+server and the protocol. The requests are sent by the functions of the
+daemon client (_client.py), because the daemon uses the same protocol."""
+
+import os
+import socket
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from vien._client import MAX_SOCKET_PATH, exchange, forward_signals, \
+    restore_signals
+
+START_TIMEOUT = 120.0
+
+
+def preload_from_env() -> str:
+    """The comma-separated names of the modules to import in the server,
+    from $VIEN_WARM_PRELOAD."""
+    names = os.environ.get("VIEN_WARM_PRELOAD", "").replace(" ", "")
+    return ",".join(n for n in names.split(",") if n)
+
+
+def warm_dir(vien_dir: Path) -> Path:
+    return vien_dir / ".warm"
+
+
+def make_private_dir(path: Path):
+    """Creates the directory for the sockets, that only the user can
+    enter."""
+    path.mkdir(mode=0o700, parents=True, exist_ok=True)
+    os.chmod(str(path), 0o700)
+
+
+def socket_path(vien_dir: Path, venv_dir: Path) -> Optional[Path]:
+    """Returns the socket path for the environment, or None if the path
+    is too long for a Unix socket."""
+    path = warm_dir(vien_dir) / (venv_dir.name + ".sock")
+    if len(os.fsencode(str(path))) > MAX_SOCKET_PATH:
+        return None
+    return path
+
+
+def connect(path: Path) -> Optional[socket.socket]:
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(str(path))
+        return sock
+    except OSError:
+        sock.close()
+        return None
+
+
+def _start_server(path: Path, venv_dir: Path, python_exe: Path,
+                  preload: str, env: Dict[str, str]):
+    import subprocess
+    server_script = Path(__file__).parent / "_warm_server.py"
+    with (path.parent / (venv_dir.name + ".log")).open("ab") as log:
+        return subprocess.Popen(
+            [str(python_exe), str(server_script), str(path), str(venv_dir),
+             preload],
+            env=env, cwd=str(path.parent),
+            stdin=subprocess.DEVNULL, stdout=log, stderr=log,
+            start_new_session=True)
+
+
+def wait_connect(path: Path, server, timeout: float,
+                 what: str = "warm server") -> socket.socket:
+    """Connects to the socket of the server process started by Popen."""
+    started = time.monotonic()
+    delay = 0.005
+    while True:
+        sock = connect(path)
+        if sock is not None:
+            return sock
+        if server.poll() is not None:
+            raise ConnectionError(f"The {what} exited with code "
+                                  f"{server.returncode}. See the log in "
+                                  f"{path.parent}")
+        if time.monotonic() - started > timeout:
+            raise TimeoutError(f"The {what} did not start in "
+                               f"{timeout:g} s. See the log in {path.parent}")
+        time.sleep(delay)
+        delay = min(delay * 2, 0.1)
+
+
+def _start_and_connect(path: Path, venv_dir: Path, python_exe: Path,
+                       preload: str, env: Dict[str, str]) -> socket.socket:
+    import fcntl
+    make_private_dir(path.parent)
+    # the clients starting at the same time start only one server
+    with (path.parent / (venv_dir.name + ".start.lock")).open("w") as lock:
+        fcntl.flock(lock.fileno(), fcntl.LOCK_EX)
+        sock = connect(path)
+        if sock is None:
+            server = _start_server(path, venv_dir, python_exe, preload, env)
+            sock = wait_connect(path, server, START_TIMEOUT)
+        return sock
+
+
+def call_warm(python_exe: Path, venv_dir: Path, sock_path: Path,
+              file: Optional[str], module: Optional[str], args: List[str],
+              env: Dict[str, str]) -> int:
+    """Runs the file or module in a child of the warm server, starting the
+    server if needed. Returns the exit code."""
+    preload = preload_from_env()
+    request = {"file": file, "module": module, "args": args,
+               "cwd": os.getcwd(), "env": env, "preload": preload}
+    sys.stdout.flush()
+    sys.stderr.flush()
+
+    old_handlers: Dict = dict()
+    try:
+        for _ in range(3):
+            sock = connect(sock_path)
+            if sock is None:
+                sock = _start_and_connect(sock_path, venv_dir, python_exe,
+                                          preload, env)
+            with sock:
+                for reply in exchange(sock, request):
+                    if "pid" in reply:
+                        old_handlers = forward_signals(reply["pid"])
+                    elif "exit" in reply:
+                        return reply["exit"]
+                    elif reply.get("restart"):
+                        break
+                else:
+                    raise ConnectionError("The warm server closed the "
+                                          "connection unexpectedly")
+        raise ConnectionError("The warm server keeps restarting")
+    finally:
+        restore_signals(old_handlers)
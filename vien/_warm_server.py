@@ -0,0 +1,344 @@
+# SPDX-FileCopyrightText: (c) 2021 Artëm IG <github.com/rtmigo>
+# SPDX-License-Identifier: BSD-3-Clause
+
+"""The warm server for `vien call --warm`.
+
+This file is run as a script by the interpreter of the virtual environment,
+not by the interpreter running vien. So it imports nothing but the standard
+library, and must work with any Python 3 version the environment may have.
+
+The server imports the modules listed in its arguments and listens on a
+Unix socket. For each connection it forks a child, that takes the argv,
+cwd, environment and stdio file descriptors of the client and runs the
+script. The preloaded modules are shared by the children copy-on-write.
+
+Protocol. The client sends a 4-byte big-endian length and a JSON request,
+with the stdin, stdout and stderr descriptors attached as SCM_RIGHTS.
+The server answers with JSON lines:
+  {"restart": true}   the environment has changed, the server exits
+  {"refused": true}   the server cannot run the request, the client runs
+                      it itself
+  {"pid": 123}        the child is started
+  {"exit": 0}         the child has exited with this code
+
+The fork loop is also used by the vien daemon (see _daemon.py), that is
+why it is parameterized.
+"""
+
+import array
+import json
+import os
+import select
+import signal
+import socket
+import struct
+import sys
+import time
+from typing import Dict, List, Optional, Union
+
+IDLE_SECONDS = float(os.environ.get("VIEN_WARM_IDLE", "900"))
+
+
+def venv_stamp(venv_dir: str) -> list:
+    """Changes when the environment is recreated or the packages are
+    installed or removed. Or when vien is updated."""
+    result: List[Union[List[int], int, None]] = []
+    for path in (os.path.join(venv_dir, "pyvenv.cfg"), sys.executable,
+                 __file__):
+        try:
+            st = os.lstat(path)
+            result.append([st.st_ino, st.st_mtime_ns])
+        except OSError:
+            result.append(None)
+    import site
+    for path in site.getsitepackages():
+        try:
+            result.append(os.stat(path).st_mtime_ns)
+        except OSError:
+            result.append(None)
+    return result
+
+
+def _recv_exactly(conn: socket.socket, size: int, data: bytes) -> bytes:
+    while len(data) < size:
+        chunk = conn.recv(size - len(data))
+        if not chunk:
+            raise ConnectionError("unexpected end of request")
+        data += chunk
+    return data
+
+
+def recv_request(conn: socket.socket):
+    fds = array.array("i")
+    data, ancdata, _, _ = conn.recvmsg(
+        65536, socket.CMSG_LEN(3 * fds.itemsize))
+    for level, kind, cmsg_data in ancdata:
+        if level == socket.SOL_SOCKET and kind == socket.SCM_RIGHTS:
+            fds.frombytes(cmsg_data[:len(cmsg_data)
+                                    - (len(cmsg_data) % fds.itemsize)])
+    data = _recv_exactly(conn, 4, data)
+    (length,) = struct.unpack(">I", data[:4])
+    data = _recv_exactly(conn, 4 + length, data)
+    return json.loads(data[4:].decode("utf-8")), list(fds)
+
+
+def send_line(conn: socket.socket, obj: dict):
+    conn.sendall(json.dumps(obj).encode("utf-8") + b"\n")
+
+
+def _exit_code(status: int) -> int:
+    if os.WIFSIGNALED(status):
+        # the same as subprocess returns
+        return -os.WTERMSIG(status)
+    return os.WEXITSTATUS(status)
+
+
+def _print_exception(e: BaseException):
+    """Prints the traceback without the frames of the server and runpy,
+    as if the script was run by the interpreter directly."""
+    tb = e.__traceback__
+    while tb is not None and (
+            tb.tb_frame.f_code.co_filename == __file__
+            or tb.tb_frame.f_globals.get("__name__") == "runpy"):
+        tb = tb.tb_next
+    # the hook prints the traceback of the exception itself
+    sys.excepthook(type(e), e.with_traceback(tb), tb)
+
+
+def adopt_client(request: dict, fds: list):
+    """Makes the forked child use the stdio descriptors, the working
+    directory and the environment variables of the client."""
+    signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+    for target, fd in enumerate(fds):
+        os.dup2(fd, target)
+        os.close(fd)
+    buffering = 1 if os.isatty(1) else -1
+    sys.stdin = open(0, "r", closefd=False)
+    sys.stdout = open(1, "w", buffering=buffering, closefd=False)
+    sys.stderr = open(2, "w", buffering=1, closefd=False)
+
+    os.chdir(request["cwd"])
+    os.environ.clear()
+    os.environ.update(request["env"])
+
+
+def run_in_child(func):
+    """Calls the function in the forked child and exits the same way the
+    interpreter exits after running a program. Never returns."""
+    code = 1
+    try:
+        try:
+            func()
+            code = 0
+        except SystemExit as e:
+            if e.code is None:
+                code = 0
+            elif isinstance(e.code, int):
+                code = e.code
+            else:
+                print(e.code, file=sys.stderr)
+                code = 1
+        except BaseException as e:
+            _print_exception(e)
+            if isinstance(e, KeyboardInterrupt):
+                # Python exits the same way on the unhandled Ctrl+C
+                sys.stdout.flush()
+                sys.stderr.flush()
+                signal.signal(signal.SIGINT, signal.SIG_DFL)
+                os.kill(os.getpid(), signal.SIGINT)
+            code = 1
+        import atexit
+        atexit._run_exitfuncs()
+    finally:
+        try:
+            sys.stdout.flush()
+            sys.stderr.flush()
+        finally:
+            os._exit(code)
+
+
+def run_script(conn: socket.socket, request: dict, fds: list):
+    """Runs the script in the forked child. Never returns."""
+    conn.close()
+    adopt_client(request, fds)
+
+    pythonpath = [p for p in request["env"].get("PYTHONPATH", "")
+                  .split(os.pathsep) if p]
+    module = request.get("module")
+    first = os.getcwd() if module \
+        else os.path.dirname(os.path.abspath(request["file"]))
+    sys.path[:0] = [first] + [p for p in pythonpath if p not in sys.path]
+    sys.argv = [module or request["file"]] + request["args"]
+
+    import runpy
+
+    def run():
+        if module:
+            runpy.run_module(module, run_name="__main__", alter_sys=True)
+        else:
+            runpy.run_path(request["file"], run_name="__main__")
+
+    run_in_child(run)
+
+
+def peer_uid(conn: socket.socket) -> Optional[int]:
+    """Returns the user id of the client process, or None if the system
+    does not tell it."""
+    if not hasattr(socket, "SO_PEERCRED"):
+        return None
+    creds = conn.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED,
+                            struct.calcsize("3i"))
+    _, uid, _ = struct.unpack("3i", creds)
+    return uid
+
+
+def serve_forking(sock_path: str, is_current, run_child,
+                  idle_seconds: float, is_accepted=None):
+    """Accepts the requests on the socket and calls
+    `run_child(conn, request, fds)` in a forked child for each one.
+
+    When `is_current(request)` is False, the server stops accepting: the
+    new clients will start a new server. This one exits when its children
+    exit. It also exits after `idle_seconds` without requests.
+
+    When `is_accepted(request)` is False, the server refuses the request
+    and keeps running.
+
+    Only the processes of the same user are served. The socket is created
+    with the 0600 mode, and the server checks the user of each client
+    where the system tells it."""
+    # binding to a temporary name and renaming, so the clients never
+    # connect to a socket that does not accept yet
+    temp_path = f"{sock_path}.{os.getpid()}"
+    listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    old_umask = os.umask(0o177)
+    try:
+        listener.bind(temp_path)
+    finally:
+        os.umask(old_umask)
+    listener.listen(64)
+    os.rename(temp_path, sock_path)
+
+    # SIGCHLD wakes up the select
+    wakeup_r, wakeup_w = os.pipe()
+    os.set_blocking(wakeup_w, False)
+    signal.set_wakeup_fd(wakeup_w)
+    signal.signal(signal.SIGCHLD, lambda signum, frame: None)
+
+    sock_ino = os.stat(sock_path).st_ino
+
+    def stop_listening():
+        listener.close()
+        try:
+            # another server could replace the socket
+            if os.stat(sock_path).st_ino == sock_ino:
+                os.unlink(sock_path)
+        except OSError:
+            pass
+
+    children: Dict[int, socket.socket] = {}  # pid -> connection
+    last_activity = time.monotonic()
+    retiring = False
+
+    while True:
+        if retiring and not children:
+            return
+        waitables: List[Union[socket.socket, int]] = \
+            [wakeup_r] if retiring else [listener, wakeup_r]
+        readable, _, _ = select.select(waitables, [], [], 5.0)
+
+        if wakeup_r in readable:
+            os.read(wakeup_r, 4096)
+        while children:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+            if pid == 0:
+                break
+            conn = children.pop(pid, None)
+            if conn is not None:
+                try:
+                    send_line(conn, {"exit": _exit_code(status)})
+                except OSError:
+                    pass
+                conn.close()
+            last_activity = time.monotonic()
+
+        if listener in readable:
+            conn, _ = listener.accept()
+            try:
+                if peer_uid(conn) not in (None, os.getuid()):
+                    raise PermissionError("the client is another user")
+                request, fds = recv_request(conn)
+            except (OSError, ValueError):
+                conn.close()
+                continue
+            last_activity = time.monotonic()
+            if is_accepted is not None and not is_accepted(request):
+                for fd in fds:
+                    os.close(fd)
+                send_line(conn, {"refused": True})
+                conn.close()
+                continue
+            if not is_current(request):
+                stop_listening()
+                retiring = True
+                for fd in fds:
+                    os.close(fd)
+                send_line(conn, {"restart": True})
+                conn.close()
+                continue
+
+            # the child waits until the client gets its pid. So the pid
+            # line is not mixed with the lines the child sends
+            started_r, started_w = os.pipe()
+            pid = os.fork()
+            if pid == 0:
+                listener.close()
+                for other in children.values():
+                    other.close()
+                signal.set_wakeup_fd(-1)
+                os.close(wakeup_r)
+                os.close(wakeup_w)
+                os.close(started_w)
+                os.read(started_r, 1)
+                os.close(started_r)
+                run_child(conn, request, fds)
+            os.close(started_r)
+            for fd in fds:
+                os.close(fd)
+            children[pid] = conn
+            try:
+                send_line(conn, {"pid": pid})
+            except OSError:
+                pass
+            os.close(started_w)
+
+        if not children and time.monotonic() - last_activity > idle_seconds:
+            stop_listening()
+            return
+
+
+def serve(sock_path: str, venv_dir: str, preload: str):
+    # the dir of this script is not the place to import modules from
+    if sys.path and os.path.abspath(sys.path[0]) == \
+            os.path.dirname(os.path.abspath(__file__)):
+        del sys.path[0]
+
+    import importlib
+    for name in preload.split(","):
+        if name:
+            try:
+                importlib.import_module(name)
+            except Exception as e:
+                print(f"Cannot preload {name}: {e!r}", file=sys.stderr)
+
+    stamp = venv_stamp(venv_dir)
+
+    def is_current(request: dict) -> bool:
+        return venv_stamp(venv_dir) == stamp \
+            and request.get("preload") == preload
+
+    serve_forking(sock_path, is_current, run_script, IDLE_SECONDS)
+
+
+if __name__ == "__main__":
+    serve(sys.argv[1], sys.argv[2], sys.argv[3])
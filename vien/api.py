@@ -0,0 +1,196 @@
+# SPDX-FileCopyrightText: (c) 2021 Artëm IG <github.com/rtmigo>
+# SPDX-License-Identifier: BSD-3-Clause
+
+"""The Python API of vien.
+
+    from vien.api import Env
+
+    env = Env("/abc/myProject")
+    if not env.exists():
+        env.create()
+    print(env.path, env.python)
+    result = env.call("main.py", ["arg1"], capture_output=True)
+    print(result.returncode, result.stdout)
+
+The functions work in the calling process and never exit it. The errors
+are raised as `VienError`. The results of the programs are returned as
+`subprocess.CompletedProcess`.
+
+The environments are in the same place as for the command line: the
+VIENDIR environment variable or ~/.vien.
+"""
+
+import asyncio
+import functools
+import os
+import shutil
+from pathlib import Path
+from subprocess import CompletedProcess
+from typing import Dict, Optional, Sequence, Union
+
+from vien._activation import Activation
+from vien._exceptions import VienExit, CommandNotFoundExit, \
+    PyFileNotFoundExit
+from vien._locks import VenvLock
+from vien._main import Dirs, child_env, activated_env, create_venv, \
+    delete_venv
+from vien._call_funcs import relative_fn_to_module_name, relative_inner_path
+
+__all__ = ["Env", "VienError"]
+
+
+class VienError(Exception):
+    """An error that the command line would report before exiting. The
+    message is the same."""
+
+
+def _wrapped(func):
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        try:
+            return func(*args, **kwargs)
+        except VienExit as e:
+            raise VienError(str(e.code)) from e
+
+    return wrapper
+
+
+class Env:
+    """The virtual environment of the project."""
+
+    def __init__(self, project_dir: Union[str, Path] = '.'):
+        self._dirs = Dirs(project_dir)
+
+    def __repr__(self):
+        return f"Env({str(self.project_dir)!r})"
+
+    @property
+    def project_dir(self) -> Path:
+        return self._dirs.project_dir
+
+    @property
+    def path(self) -> Path:
+        """The directory of the environment. It may not exist."""
+        return self._dirs.venv_dir
+
+    @property
+    @_wrapped
+    def python(self) -> Path:
+        """The interpreter of the environment."""
+        return self._activation().python
+
+    def exists(self) -> bool:
+        return self.path.exists()
+
+    def _activation(self) -> Activation:
+        # waiting while the environment is created, replaced or deleted
+        with VenvLock(self.path, exclusive=False):
+            return self._dirs.activation()
+
+    @_wrapped
+    def create(self, python: Optional[str] = None, replace: bool = False,
+               template: bool = False, shared_pip: bool = False) -> 'Env':
+        """Creates the environment. `python` is an interpreter executable
+        or a version like "3.11", as for `vien create`. With `replace`, an
+        existing environment is replaced by the new one."""
+        with VenvLock(self.path, exclusive=True):
+            create_venv(self._dirs, python, use_template=template,
+                        shared_pip=shared_pip, replace=replace)
+        return self
+
+    @_wrapped
+    def delete(self):
+        with VenvLock(self.path, exclusive=True):
+            delete_venv(self.path)
+
+    def _base_env(self, env: Optional[Dict[str, str]]) -> Optional[Dict]:
+        # the variables given by the caller override the inherited ones
+        base = child_env(self.project_dir)
+        if env is not None:
+            base = {**(base or os.environ), **env}
+        return base
+
+    def _run_args(self, command: Sequence[str],
+                  env: Optional[Dict[str, str]]) -> Dict:
+        self._activation()
+        env_vars = activated_env(self.path, self._base_env(env))
+        executable = shutil.which(command[0], path=env_vars['PATH'])
+        if executable is None:
+            raise CommandNotFoundExit(command[0])
+        return dict(args=list(command), executable=executable, env=env_vars)
+
+    def _call_args(self, file: Union[str, Path], args: Sequence[str],
+                   module: bool, env: Optional[Dict[str, str]]) -> Dict:
+        python = self._activation().python
+        if not os.path.exists(str(file)):
+            raise PyFileNotFoundExit(Path(file))
+        if module:
+            name = relative_fn_to_module_name(
+                relative_inner_path(str(file), self.project_dir))
+            python_args = ["-m", name]
+        else:
+            python_args = [str(file)]
+        return dict(args=[str(python)] + python_args + list(args),
+                    env=self._base_env(env))
+
+    @_wrapped
+    def run(self, command: Sequence[str],
+            env: Optional[Dict[str, str]] = None,
+            **kwargs) -> CompletedProcess:
+        """Runs the command in the activated environment, like `vien run`.
+        The `env` variables are added to the inherited ones. The other
+        arguments are the same as for `subprocess.run`, plus
+        `input_delay`, `on_stdout` and `on_stderr` (see `run_async` in
+        vien._bash_runner)."""
+        from vien._bash_runner import run_process
+        return run_process(**self._run_args(command, env), **kwargs)
+
+    @_wrapped
+    def call(self, file: Union[str, Path], args: Sequence[str] = (),
+             module: bool = False,
+             env: Optional[Dict[str, str]] = None,
+             **kwargs) -> CompletedProcess:
+        """Runs the .py file with the interpreter of the environment, like
+        `vien call`. With `module`, the file is run as a module of the
+        project, like `vien call -m`."""
+        from vien._bash_runner import run_process
+        return run_process(**self._call_args(file, args, module, env),
+                           **kwargs)
+
+    async def exists_async(self) -> bool:
+        return await _in_thread(self.exists)
+
+    async def create_async(self, *args, **kwargs) -> 'Env':
+        return await _in_thread(self.create, *args, **kwargs)
+
+    async def delete_async(self):
+        return await _in_thread(self.delete)
+
+    async def run_async(self, command: Sequence[str],
+                        env: Optional[Dict[str, str]] = None,
+                        **kwargs) -> CompletedProcess:
+        from vien._bash_runner import run_async
+        # the lock may wait, so not on the event loop
+        try:
+            run_args = await _in_thread(self._run_args, command, env)
+        except VienExit as e:
+            raise VienError(str(e.code)) from e
+        return await run_async(**run_args, **kwargs)
+
+    async def call_async(self, file: Union[str, Path],
+                         args: Sequence[str] = (), module: bool = False,
+                         env: Optional[Dict[str, str]] = None,
+                         **kwargs) -> CompletedProcess:
+        from vien._bash_runner import run_async
+        try:
+            call_args = await _in_thread(self._call_args, file, args,
+                                         module, env)
+        except VienExit as e:
+            raise VienError(str(e.code)) from e
+        return await run_async(**call_args, **kwargs)
+
+
+async def _in_thread(func, *args, **kwargs):
+    loop = asyncio.get_event_loop()
+    return await loop.run_in_executor(
+        None, functools.partial(func, *args, **kwargs))